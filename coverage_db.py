@@ -0,0 +1,402 @@
+import argparse
+import fnmatch
+import hashlib
+import sqlite3
+import sys
+import time
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from rtl_line_branch_coverage import Probe
+
+# Each run stores one bitmap over probe row ids (bit i = probe id i), so
+# merging N runs is N big-int ORs and never touches per-probe rows. Runs
+# also record the fingerprint of the probe set they were taken with: bits
+# only mean the same probes across runs of one probe set.
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS probes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    file TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    detail TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    source TEXT NOT NULL,
+    n_hit INTEGER NOT NULL,
+    hits BLOB NOT NULL,
+    counts BLOB,
+    probe_set TEXT NOT NULL DEFAULT ''
+);
+"""
+
+
+class ProbeSetError(RuntimeError):
+    pass
+
+
+@dataclass
+class RunInfo:
+    id: int
+    name: str
+    created: float
+    source: str
+    n_hit: int
+    probe_set: str
+
+
+def _to_blob(bits: int) -> bytes:
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def _from_blob(blob: bytes) -> int:
+    return int.from_bytes(blob, "little")
+
+
+def probe_set_fingerprint(probes: "Iterable[Probe]") -> str:
+    # Changes whenever a probe is added, removed, renamed or moved.
+    h = hashlib.sha256()
+    for p in sorted(probes, key=lambda p: p.name):
+        h.update(f"{p.name}\t{p.file}\t{p.line}\t{p.kind}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _matches(name: str, patterns: list[str] | None) -> bool:
+    return not patterns or any(fnmatch.fnmatchcase(name, p) for p in patterns)
+
+
+def _set_bits(bits: int) -> Iterable[int]:
+    # Walks the set bits a byte at a time; bitmaps are sparse in the tail.
+    data = _to_blob(bits)
+    for byte_idx, b in enumerate(data):
+        while b:
+            low = b & -b
+            yield byte_idx * 8 + low.bit_length() - 1
+            b ^= low
+
+
+class CoverageDb:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.executescript(_SCHEMA)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta VALUES ('schema', ?)", (str(SCHEMA_VERSION),))
+            self.conn.commit()
+        elif row[0] == "1":
+            # Runs recorded before probe sets were fingerprinted keep ''.
+            self.conn.execute("ALTER TABLE runs ADD COLUMN probe_set TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'schema'", (str(SCHEMA_VERSION),))
+            self.conn.commit()
+        elif int(row[0]) != SCHEMA_VERSION:
+            raise RuntimeError(f"{path}: versão de schema {row[0]} não suportada (esperado {SCHEMA_VERSION})")
+        self._ids: dict[str, int] | None = None
+        self._names: dict[int, str] | None = None
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "CoverageDb":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    # --- probes ---------------------------------------------------------
+
+    def probe_ids(self) -> dict[str, int]:
+        if self._ids is None:
+            self._ids = dict(self.conn.execute("SELECT name, id FROM probes"))
+        return self._ids
+
+    def probe_names(self) -> dict[int, str]:
+        if self._names is None:
+            self._names = {i: n for n, i in self.probe_ids().items()}
+        return self._names
+
+    def add_probes(self, probes: "Iterable[Probe]") -> str:
+        # A name keeps its id (and its bit) forever; only the definition is
+        # refreshed. Returns the fingerprint runs taken with `probes` record,
+        # since a name may not mean the same probe in another probe set.
+        probes = list(probes)
+        self.conn.executemany(
+            "INSERT INTO probes (name, kind, file, line, detail) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET kind = excluded.kind, file = excluded.file, "
+            "line = excluded.line, detail = excluded.detail",
+            [(p.name, p.kind, p.file, p.line, p.detail) for p in probes],
+        )
+        self.conn.commit()
+        self._ids = None
+        self._names = None
+        return probe_set_fingerprint(probes)
+
+    def probe_rows(self) -> list[tuple[int, str, str, str, int, str]]:
+        return self.conn.execute("SELECT id, name, kind, file, line, detail FROM probes ORDER BY id").fetchall()
+
+    def bitmap_of(self, names: Iterable[str]) -> int:
+        ids = self.probe_ids()
+        buf = bytearray((max(ids.values(), default=0) >> 3) + 1)
+        for n in names:
+            i = ids.get(n)
+            if i is not None:
+                buf[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(buf, "little")
+
+    def names_of(self, bits: int) -> list[str]:
+        names = self.probe_names()
+        return [names[i] for i in _set_bits(bits) if i in names]
+
+    # --- runs -----------------------------------------------------------
+
+    def add_run(
+        self,
+        name: str,
+        hit_names: Iterable[str],
+        *,
+        source: str = "",
+        probe_stats: dict[str, dict[str, int]] | None = None,
+        probe_set: str = "",
+    ) -> int:
+        # Re-recording a run name replaces it. Hit counts, when known, are
+        # stored in set-bit order next to the bitmap.
+        bits = self.bitmap_of(hit_names)
+        counts = None
+        if probe_stats is not None:
+            names = self.probe_names()
+            counts = array("Q", (probe_stats.get(names[i], {}).get("hits", 1) for i in _set_bits(bits))).tobytes()
+        cur = self.conn.execute(
+            "INSERT OR REPLACE INTO runs (name, created, source, n_hit, hits, counts, probe_set) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, time.time(), source, bits.bit_count(), _to_blob(bits), counts, probe_set),
+        )
+        self.conn.commit()
+        return int(cur.lastrowid or 0)
+
+    def runs(self, patterns: list[str] | None = None) -> list[RunInfo]:
+        rows = self.conn.execute("SELECT id, name, created, source, n_hit, probe_set FROM runs ORDER BY id").fetchall()
+        return [RunInfo(*r) for r in rows if _matches(r[1], patterns)]
+
+    def check_probe_set(self, patterns: list[str] | None = None) -> None:
+        # Bitmaps of different probe sets cannot be OR-ed nor compared.
+        by_set: dict[str, list[str]] = {}
+        for r in self.runs(patterns):
+            by_set.setdefault(r.probe_set, []).append(r.name)
+        if len(by_set) > 1:
+            groups = "; ".join(f"{ps or '(desconhecido)'}: {', '.join(names)}" for ps, names in by_set.items())
+            raise ProbeSetError(f"runs de conjuntos de probes diferentes ({groups}); selecione runs de um só conjunto")
+
+    def bitmaps(self, patterns: list[str] | None = None) -> dict[str, int]:
+        self.check_probe_set(patterns)
+        rows = self.conn.execute("SELECT name, hits FROM runs ORDER BY id").fetchall()
+        return {name: _from_blob(blob) for name, blob in rows if _matches(name, patterns)}
+
+    def hit_counts(self, run: str) -> dict[str, int]:
+        row = self.conn.execute("SELECT hits, counts FROM runs WHERE name = ?", (run,)).fetchone()
+        if row is None:
+            raise KeyError(run)
+        names = self.names_of(_from_blob(row[0]))
+        if row[1] is None:
+            return {n: 1 for n in names}
+        return dict(zip(names, array("Q", row[1])))
+
+    def delete_runs(self, patterns: list[str]) -> int:
+        names = [r.name for r in self.runs(patterns)]
+        self.conn.executemany("DELETE FROM runs WHERE name = ?", [(n,) for n in names])
+        self.conn.commit()
+        return len(names)
+
+    # --- merge / diff / rank --------------------------------------------
+
+    def merged(self, patterns: list[str] | None = None) -> int:
+        bits = 0
+        for b in self.bitmaps(patterns).values():
+            bits |= b
+        return bits
+
+    def import_db(self, other_path: Path, *, prefix: str = "") -> int:
+        # Pulls every run of another database in. Bitmaps are copied as-is
+        # when both sides numbered the probes the same way and remapped bit
+        # by bit otherwise.
+        with CoverageDb(other_path) as other:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO probes (name, kind, file, line, detail) VALUES (?, ?, ?, ?, ?)",
+                [row[1:] for row in other.probe_rows()],
+            )
+            self._ids = None
+            self._names = None
+            mine = self.probe_ids()
+            remap = {i: mine[n] for n, i in other.probe_ids().items()}
+            identity = all(i == j for i, j in remap.items())
+            rows = other.conn.execute(
+                "SELECT name, created, source, n_hit, hits, counts, probe_set FROM runs ORDER BY id"
+            ).fetchall()
+        for name, created, source, n_hit, blob, counts, probe_set in rows:
+            if not identity:
+                old = _from_blob(blob)
+                order = sorted((remap[i], k) for k, i in enumerate(_set_bits(old)))
+                bits = self.bitmap_of(self.probe_names()[j] for j, _k in order)
+                blob = _to_blob(bits)
+                if counts is not None:
+                    src = array("Q", counts)
+                    counts = array("Q", (src[k] for _j, k in order)).tobytes()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runs (name, created, source, n_hit, hits, counts, probe_set) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (prefix + name, created, source, n_hit, blob, counts, probe_set),
+            )
+        self.conn.commit()
+        return len(rows)
+
+    def diff(self, a: list[str], b: list[str]) -> tuple[list[str], list[str]]:
+        # Probes hit only by the runs matching `a`, and only by those matching `b`.
+        self.check_probe_set(a + b)
+        bits_a = self.merged(a)
+        bits_b = self.merged(b)
+        return self.names_of(bits_a & ~bits_b), self.names_of(bits_b & ~bits_a)
+
+    def rank(self, patterns: list[str] | None = None) -> list[tuple[str, int, int]]:
+        # (run, probes hit, probes no other selected run hits), most unique first.
+        maps = self.bitmaps(patterns)
+        seen_once = 0
+        seen_more = 0
+        for b in maps.values():
+            seen_more |= seen_once & b
+            seen_once |= b
+        unique_mask = seen_once & ~seen_more
+        out = [(name, b.bit_count(), (b & unique_mask).bit_count()) for name, b in maps.items()]
+        out.sort(key=lambda t: (-t[2], -t[1], t[0]))
+        return out
+
+    def minimal_set(self, patterns: list[str] | None = None) -> list[tuple[str, int]]:
+        # Greedy set cover: repeatedly take the run adding the most probes not
+        # yet covered until the selection reaches the merged coverage of all
+        # selected runs. Ties go to the run hitting fewer probes in total (the
+        # narrower test), then to the alphabetically first name.
+        maps = self.bitmaps(patterns)
+        target = 0
+        for b in maps.values():
+            target |= b
+        covered = 0
+        picked: list[tuple[str, int]] = []
+        remaining = dict(maps)
+        while covered != target:
+            # Smallest (-new probes, probes hit, name) wins.
+            neg_gain, _nhits, name = min(
+                (-(b & ~covered).bit_count(), b.bit_count(), n) for n, b in remaining.items()
+            )
+            covered |= remaining.pop(name)
+            picked.append((name, -neg_gain))
+        return picked
+
+    def contributors(self, probe_name: str, patterns: list[str] | None = None) -> list[str]:
+        i = self.probe_ids().get(probe_name)
+        if i is None:
+            return []
+        return [name for name, b in self.bitmaps(patterns).items() if b >> i & 1]
+
+
+def _pct(a: int, b: int) -> str:
+    if b == 0:
+        return "n/a"
+    return f"{(100.0 * a / b):.2f}%"
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description="Banco de cobertura (SQLite): runs, merge, diff e rank.")
+    ap.add_argument("--db", default="coverage.db", help="Arquivo do banco de cobertura")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_list = sub.add_parser("list", help="Lista runs gravados")
+    p_list.add_argument("runs", nargs="*", help="Nomes de runs (aceita glob)")
+
+    p_merge = sub.add_parser("merge", help="Importa outros bancos e/ou mostra a cobertura mesclada")
+    p_merge.add_argument("--from", dest="sources", nargs="*", default=[], help="Bancos a importar")
+    p_merge.add_argument("--prefix", default="", help="Prefixo para os nomes dos runs importados")
+    p_merge.add_argument("runs", nargs="*", help="Runs a mesclar (aceita glob; padrão: todos)")
+
+    p_diff = sub.add_parser("diff", help="Probes cobertos só por um dos lados")
+    p_diff.add_argument("-a", nargs="+", required=True, help="Runs do lado A (aceita glob)")
+    p_diff.add_argument("-b", nargs="+", required=True, help="Runs do lado B (aceita glob)")
+    p_diff.add_argument("--max", type=int, default=50, help="Máximo de probes listados por lado")
+
+    p_rank = sub.add_parser("rank", help="Ordena runs por probes exclusivos")
+    p_rank.add_argument("runs", nargs="*", help="Runs a considerar (aceita glob; padrão: todos)")
+
+    p_sel = sub.add_parser("select", help="Menor conjunto de runs (guloso) com a mesma cobertura mesclada")
+    p_sel.add_argument("runs", nargs="*", help="Runs candidatos (aceita glob; padrão: todos)")
+    p_sel.add_argument("--out", default="", help="Grava os nomes selecionados, um por linha")
+
+    p_who = sub.add_parser("who", help="Quais runs cobriram um probe")
+    p_who.add_argument("probe", help="Nome do probe (ex.: __cov_L172580001)")
+
+    p_drop = sub.add_parser("drop", help="Remove runs")
+    p_drop.add_argument("runs", nargs="+", help="Runs a remover (aceita glob)")
+
+    args = ap.parse_args(argv)
+
+    db_path = Path(args.db)
+    if args.cmd != "merge" and not db_path.exists():
+        print(f"Banco não encontrado: {db_path}", file=sys.stderr)
+        return 2
+
+    try:
+        with CoverageDb(db_path) as db:
+            total = len(db.probe_ids())
+            if args.cmd == "list":
+                for r in db.runs(args.runs or None):
+                    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r.created))
+                    print(f"- {r.name}: {r.n_hit}/{total} ({_pct(r.n_hit, total)}) {stamp} {r.probe_set} {r.source}")
+            elif args.cmd == "merge":
+                for src in args.sources:
+                    n = db.import_db(Path(src), prefix=args.prefix)
+                    print(f"Importados {n} runs de {src}", file=sys.stderr)
+                total = len(db.probe_ids())
+                selected = db.runs(args.runs or None)
+                hit = db.merged(args.runs or None).bit_count()
+                print(f"Mesclado ({len(selected)} runs): {hit}/{total} probes ({_pct(hit, total)})")
+            elif args.cmd == "diff":
+                only_a, only_b = db.diff(args.a, args.b)
+                for label, names in (("A", only_a), ("B", only_b)):
+                    print(f"Só em {label}: {len(names)} probes")
+                    for n in names[: args.max]:
+                        print(f"  {n}")
+            elif args.cmd == "rank":
+                for name, hit, unique in db.rank(args.runs or None):
+                    print(f"- {name}: {hit} probes ({_pct(hit, total)}), {unique} exclusivos")
+            elif args.cmd == "select":
+                picked = db.minimal_set(args.runs or None)
+                candidates = len(db.runs(args.runs or None))
+                hit = 0
+                for name, gain in picked:
+                    hit += gain
+                    print(f"- {name}: +{gain} probes (acumulado {hit}/{total}, {_pct(hit, total)})")
+                print(f"Selecionados {len(picked)} de {candidates} runs")
+                if args.out:
+                    Path(args.out).write_text("".join(f"{name}\n" for name, _gain in picked), encoding="utf-8")
+            elif args.cmd == "who":
+                if args.probe not in db.probe_ids():
+                    print(f"Probe desconhecido: {args.probe}", file=sys.stderr)
+                    return 2
+                for name in db.contributors(args.probe):
+                    print(f"- {name}")
+            elif args.cmd == "drop":
+                print(f"Removidos {db.delete_runs(args.runs)} runs", file=sys.stderr)
+    except ProbeSetError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
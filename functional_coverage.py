@@ -0,0 +1,298 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from vcd_reader import VcdConsumer, VcdHeader, find_signal_code
+
+try:
+    import yaml
+except ImportError:  # only needed for .yaml/.yml specs
+    yaml = None
+
+
+_EDGES = ("posedge", "negedge", "both")
+_AUTO_BINS_MAX_WIDTH = 16  # auto bins report a total only up to this width
+_UNSET = object()
+
+
+@dataclass
+class Coverpoint:
+    # `bins` maps a label to an inclusive (lo, hi) range; None means one bin
+    # per sampled value.
+    name: str
+    signal: str
+    msb: int | None = None
+    lsb: int = 0
+    bins: dict[str, tuple[int, int]] | None = None
+
+
+@dataclass
+class Cross:
+    name: str
+    points: tuple[str, ...]
+
+
+@dataclass
+class Covergroup:
+    name: str
+    clock: str = ".clk"
+    edge: str = "posedge"
+    iff: str | None = None
+    coverpoints: list[Coverpoint] = field(default_factory=list)
+    crosses: list[Cross] = field(default_factory=list)
+
+
+class SpecError(ValueError):
+    pass
+
+
+def _parse_bins(cp_name: str, raw: object) -> dict[str, tuple[int, int]] | None:
+    if raw is None or raw == "auto":
+        return None
+    if not isinstance(raw, dict):
+        raise SpecError(f"coverpoint {cp_name}: 'bins' deve ser 'auto' ou um objeto")
+    bins: dict[str, tuple[int, int]] = {}
+    for label, rng in raw.items():
+        if isinstance(rng, int):
+            bins[str(label)] = (rng, rng)
+        elif isinstance(rng, list) and len(rng) == 2 and all(isinstance(v, int) for v in rng):
+            bins[str(label)] = (min(rng), max(rng))
+        else:
+            raise SpecError(f"coverpoint {cp_name}: bin {label} deve ser um inteiro ou [lo, hi]")
+    return bins
+
+
+def parse_spec(doc: dict) -> list[Covergroup]:
+    raw_groups = doc.get("covergroups")
+    if raw_groups is None:
+        raw_groups = [doc]
+    groups: list[Covergroup] = []
+    for i, g in enumerate(raw_groups):
+        name = g.get("name", f"group{i}")
+        edge = g.get("edge", "posedge")
+        if edge not in _EDGES:
+            raise SpecError(f"covergroup {name}: edge deve ser um de {', '.join(_EDGES)}")
+        cps: list[Coverpoint] = []
+        for cp_name, cp in g.get("coverpoints", {}).items():
+            if isinstance(cp, str):
+                cp = {"signal": cp}
+            if "signal" not in cp:
+                raise SpecError(f"coverpoint {cp_name}: falta 'signal'")
+            msb: int | None = None
+            lsb = 0
+            if "bits" in cp:
+                bits = cp["bits"]
+                if isinstance(bits, int):
+                    msb = lsb = bits
+                else:
+                    msb, lsb = max(bits), min(bits)
+            cps.append(
+                Coverpoint(name=cp_name, signal=cp["signal"], msb=msb, lsb=lsb, bins=_parse_bins(cp_name, cp.get("bins")))
+            )
+        names = {cp.name for cp in cps}
+        crosses: list[Cross] = []
+        for cross_name, points in g.get("crosses", {}).items():
+            unknown = [p for p in points if p not in names]
+            if unknown or len(points) < 2:
+                raise SpecError(f"cross {cross_name}: coverpoints inválidos {unknown or points}")
+            crosses.append(Cross(name=cross_name, points=tuple(points)))
+        groups.append(
+            Covergroup(
+                name=name,
+                clock=g.get("clock", ".clk"),
+                edge=edge,
+                iff=g.get("iff"),
+                coverpoints=cps,
+                crosses=crosses,
+            )
+        )
+    return groups
+
+
+def load_spec(path: Path) -> list[Covergroup]:
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in (".yaml", ".yml"):
+        if yaml is None:
+            raise SpecError("spec YAML requer o módulo PyYAML; use JSON ou instale pyyaml")
+        doc = yaml.safe_load(text)
+    else:
+        doc = json.loads(text)
+    return parse_spec(doc or {})
+
+
+@dataclass
+class _CompiledPoint:
+    # Everything needed to bin one coverpoint at a sample, resolved once.
+    code: str
+    shift: int
+    mask: int | None
+    ranges: list[tuple[int, int, str]] | None
+    counts: dict[object, int] = field(default_factory=dict)
+    bin_of: dict[int, object | None] = field(default_factory=dict)
+
+    def bin(self, value: int) -> object | None:
+        if self.mask is not None:
+            value = (value >> self.shift) & self.mask
+        if self.ranges is None:
+            return value
+        label = self.bin_of.get(value, _UNSET)
+        if label is _UNSET:
+            # Ranges may overlap: the first one in spec order wins. The
+            # answer is memoized per value.
+            label = next((name for lo, hi, name in self.ranges if lo <= value <= hi), None)
+            self.bin_of[value] = label
+        return label
+
+
+@dataclass
+class _CompiledGroup:
+    group: Covergroup
+    points: list[_CompiledPoint | None]
+    crosses: list[tuple[list[int], dict[tuple, int]]]
+    iff_code: str | None
+    samples: int = 0
+
+
+class FunctionalCoverage(VcdConsumer):
+    # Samples the signals named by one or more covergroups on their clock
+    # edges, in the same pass as the other consumers. Signals are resolved
+    # once in `begin`; every edge then only bins integers.
+    def __init__(self, groups: list[Covergroup]) -> None:
+        self.groups = groups
+        self.compiled: list[_CompiledGroup] = []
+        self.values: dict[str, int | None] = {}
+        self.levels: dict[str, str | None] = {}
+        self.edge_groups: dict[str, list[tuple[str, _CompiledGroup]]] = {}
+        self.missing: list[str] = []
+        self.widths: dict[str, int] = {}
+
+    def begin(self, header: VcdHeader) -> None:
+        vars_by_code = header.vars_by_code
+        codes: set[str] = set()
+        self.compiled = []
+        self.edge_groups = {}
+        self.missing = []
+        for g in self.groups:
+            clk = find_signal_code(vars_by_code, g.clock)
+            if clk is None:
+                self.missing.append(f"{g.name}: clock {g.clock}")
+            points: list[_CompiledPoint | None] = []
+            for cp in g.coverpoints:
+                code = find_signal_code(vars_by_code, cp.signal)
+                if code is None:
+                    self.missing.append(f"{g.name}.{cp.name}: {cp.signal}")
+                    points.append(None)
+                    continue
+                width = vars_by_code[code].width
+                mask = None
+                shift = 0
+                if cp.msb is not None:
+                    shift = cp.lsb
+                    mask = (1 << (cp.msb - cp.lsb + 1)) - 1
+                    width = cp.msb - cp.lsb + 1
+                self.widths[f"{g.name}.{cp.name}"] = width
+                ranges = None
+                if cp.bins is not None:
+                    ranges = [(lo, hi, label) for label, (lo, hi) in cp.bins.items()]
+                points.append(_CompiledPoint(code=code, shift=shift, mask=mask, ranges=ranges))
+                codes.add(code)
+            index = {cp.name: i for i, cp in enumerate(g.coverpoints)}
+            crosses = [([index[p] for p in x.points], {}) for x in g.crosses]
+            iff_code = None
+            if g.iff is not None:
+                iff_code = find_signal_code(vars_by_code, g.iff)
+                if iff_code is None:
+                    # No enable signal means no sample is known to be valid.
+                    self.missing.append(f"{g.name}: iff {g.iff}")
+                    clk = None
+                else:
+                    codes.add(iff_code)
+            cg = _CompiledGroup(group=g, points=points, crosses=crosses, iff_code=iff_code)
+            self.compiled.append(cg)
+            if clk is not None:
+                codes.add(clk)
+                self.edge_groups.setdefault(clk, []).append((g.edge, cg))
+        self.codes = codes
+        self.initial_codes = codes
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        groups = self.edge_groups.get(code)
+        if groups is not None:
+            ch = ch.lower()
+            prev = self.levels.get(code)
+            self.levels[code] = ch
+            rising = prev == "0" and ch == "1"
+            falling = prev == "1" and ch == "0"
+            if rising or falling:
+                for edge, cg in groups:
+                    if edge == "both" or (edge == "posedge") == rising:
+                        self._sample(cg)
+        self.values[code] = 1 if ch == "1" else 0 if ch == "0" else None
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        try:
+            self.values[code] = int(value, 2)
+        except ValueError:
+            self.values[code] = None
+
+    def _sample(self, cg: _CompiledGroup) -> None:
+        values = self.values
+        if cg.iff_code is not None and values.get(cg.iff_code) != 1:
+            return
+        cg.samples += 1
+        labels: list[object | None] = []
+        for p in cg.points:
+            label = None
+            if p is not None:
+                v = values.get(p.code)
+                if v is not None:
+                    label = p.bin(v)
+                    if label is not None:
+                        p.counts[label] = p.counts.get(label, 0) + 1
+            labels.append(label)
+        for idx, counts in cg.crosses:
+            key = tuple(labels[i] for i in idx)
+            if None not in key:
+                counts[key] = counts.get(key, 0) + 1
+
+    def merge(self, other: "FunctionalCoverage") -> None:
+        for mine, theirs in zip(self.compiled, other.compiled):
+            mine.samples += theirs.samples
+            for p, q in zip(mine.points, theirs.points):
+                if p is None or q is None:
+                    continue
+                for label, cnt in q.counts.items():
+                    p.counts[label] = p.counts.get(label, 0) + cnt
+            for (_idx, counts), (_idx2, other_counts) in zip(mine.crosses, theirs.crosses):
+                for key, cnt in other_counts.items():
+                    counts[key] = counts.get(key, 0) + cnt
+        self.values.update(other.values)
+        self.levels.update(other.levels)
+
+    def report(self) -> dict[str, object]:
+        groups: dict[str, object] = {}
+        for cg in self.compiled:
+            g = cg.group
+            points: dict[str, object] = {}
+            totals: dict[str, int | None] = {}
+            for cp, p in zip(g.coverpoints, cg.points):
+                if p is None:
+                    points[cp.name] = {"hit": 0, "total": None, "bins": {}}
+                    totals[cp.name] = None
+                    continue
+                if cp.bins is not None:
+                    total: int | None = len(cp.bins)
+                else:
+                    width = self.widths[f"{g.name}.{cp.name}"]
+                    total = 1 << width if width <= _AUTO_BINS_MAX_WIDTH else None
+                totals[cp.name] = total
+                points[cp.name] = {"hit": len(p.counts), "total": total, "bins": dict(p.counts)}
+            crosses: dict[str, object] = {}
+            for x, (_idx, counts) in zip(g.crosses, cg.crosses):
+                total = 1
+                for name in x.points:
+                    t = totals[name]
+                    total = None if total is None or t is None else total * t
+                crosses[x.name] = {"hit": len(counts), "total": total, "bins": dict(counts)}
+            groups[g.name] = {"samples": cg.samples, "coverpoints": points, "crosses": crosses}
+        return groups
@@ -0,0 +1,228 @@
+import argparse
+import sys
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from mips_asm import AsmError, disassemble
+from mips_model import MipsModel, Step
+from vcd_coverage import InstructionSampler, decode_u32
+from vcd_reader import VcdHeader, find_signal_code
+from vcd_trace import read_dump
+
+
+@dataclass
+class Divergence:
+    cycle: int  # rising edges since reset was released
+    time: int
+    field: str
+    expected: int
+    actual: int | None
+    history: list[Step]
+
+
+def _hex(v: int | None) -> str:
+    return "xxxxxxxx" if v is None else f"{v:08x}"
+
+
+def format_divergence(d: Divergence) -> list[str]:
+    lines = [
+        f"Divergência no ciclo {d.cycle} (t={d.time}): {d.field} esperado {_hex(d.expected)}, RTL {_hex(d.actual)}",
+        "Últimas instruções do modelo:",
+    ]
+    for s, text in zip(d.history, disassemble([s.instruction for s in d.history])):
+        wr = f"${s.dest} = {s.writeback:08x}" if s.reg_write and s.dest else "-"
+        lines.append(f"  {s.pc:4d}: {s.instruction:08x} {text:<24} {wr}")
+    return lines
+
+
+class LockstepChecker(InstructionSampler):
+    # Steps the reference model once per rising clock edge of the RTL and
+    # compares, as the dump streams by, the PC/instruction/dest the RTL
+    # shows before the edge and the PC/writeback it settles to after it.
+    # Values are taken at timestamp boundaries, so the order of changes
+    # within one timestamp does not matter. Stops at the first divergence
+    # or when the program ends, which ends the read early.
+    def __init__(self, make_model: Callable[[], MipsModel], *, context: int = 8, max_cycles: int = 0) -> None:
+        super().__init__()
+        self.make_model = make_model
+        self.max_cycles = max_cycles
+        self.model: MipsModel | None = None
+        self.history: deque[Step] = deque(maxlen=context)
+        self.wb_code: str | None = None
+        self.dest_code: str | None = None
+        self.reset_code: str | None = None
+        self.missing: list[str] = []
+        self.wb: int | None = None
+        self.dest: int | None = None
+        self.reset: str | None = None
+        self.time = -1
+        # Settled (pc, instr, dest, reset) at the end of the last timestamp.
+        self.settled: tuple[int | None, int | None, int | None, str | None] = (None, None, None, None)
+        self.pending: Step | None = None
+        self.cycles = 0
+        self.x_writebacks = 0
+        self.finished = False
+        self.divergence: Divergence | None = None
+
+    def begin(self, header: VcdHeader) -> None:
+        super().begin(header)
+        vars_by_code = header.vars_by_code
+        if self.clk_code is None:
+            # The testbench clock may only be dumped under its port alias.
+            self.clk_code = find_signal_code(vars_by_code, ".uut.clock")
+        self.wb_code = find_signal_code(vars_by_code, ".uut.writeback")
+        self.dest_code = find_signal_code(vars_by_code, ".uut.dest")
+        self.reset_code = find_signal_code(vars_by_code, ".uut.reset")
+        signals = {
+            "clk": self.clk_code,
+            "uut.program_counter": self.pc_code,
+            "uut.instruction": self.instr_code,
+            "uut.writeback": self.wb_code,
+            "uut.dest": self.dest_code,
+            "uut.reset": self.reset_code,
+        }
+        self.missing = [name for name, code in signals.items() if code is None]
+        if self.missing:
+            self.finished = True
+        self.codes = {c for c in signals.values() if c is not None}
+        self.initial_codes = self.codes
+
+    def on_time(self, t: int) -> None:
+        self._check_pending()
+        self.time = t
+        self.settled = (self.pc, self.instr, self.dest, self.reset)
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        if code == self.reset_code:
+            self.reset = ch.lower()
+            return
+        super().on_scalar(code, ch)
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        if code == self.wb_code:
+            self.wb = decode_u32(value)
+        elif code == self.dest_code:
+            self.dest = decode_u32(value)
+        else:
+            super().on_vector(code, value)
+
+    def sample_on_rising_edge(self) -> None:
+        if self.done():
+            return
+        pc, instr, dest, reset = self.settled
+        if reset != "1":
+            # Held in reset: the RTL (re)starts at PC 0 once it is released.
+            self.model = None
+            self.pending = None
+            return
+        if self.model is None:
+            self.model = self.make_model()
+        step = self.model.step()
+        if step is None:
+            self.finished = True
+            return
+        self.cycles += 1
+        self.history.append(step)
+        if (
+            self._compare("program_counter", step.pc, pc)
+            and self._compare("instruction", step.instruction, instr)
+            and self._compare("dest", step.dest, dest)
+        ):
+            self.pending = step
+        if step.next_pc == step.pc or (self.max_cycles and self.cycles >= self.max_cycles):
+            # A jump to itself is the end-of-test loop.
+            self.finished = True
+
+    def finish(self) -> None:
+        # Called once the read is over: a dump that ends right after the last
+        # edge settled it without a further timestamp.
+        self._check_pending()
+
+    def _check_pending(self) -> None:
+        if self.pending is None:
+            return
+        step = self.pending
+        self.pending = None
+        self._compare("program_counter (próximo)", step.next_pc, self.pc)
+        if self.wb is None:
+            # x in the RTL (e.g. a register or data word never written,
+            # which the model holds as zero): nothing to compare.
+            self.x_writebacks += 1
+        else:
+            self._compare("writeback", step.writeback, self.wb)
+
+    def _compare(self, field: str, expected: int, actual: int | None) -> bool:
+        if actual == expected:
+            return True
+        if self.divergence is None:
+            self.divergence = Divergence(
+                cycle=self.cycles,
+                time=self.time,
+                field=field,
+                expected=expected,
+                actual=actual,
+                history=list(self.history),
+            )
+        return False
+
+    def done(self) -> bool:
+        # The comparison of the last edge waits for the next timestamp.
+        return self.divergence is not None or (self.finished and self.pending is None)
+
+
+def check_dump(
+    dump_path: Path,
+    program_hex: Path,
+    data_hex: Path | None = None,
+    *,
+    context: int = 8,
+    max_cycles: int = 0,
+) -> LockstepChecker:
+    checker = LockstepChecker(
+        lambda: MipsModel.from_hex(program_hex, data_hex), context=context, max_cycles=max_cycles
+    )
+    read_dump(dump_path, lambda: [checker])
+    checker.finish()
+    return checker
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description="Compara o VCD do MIPS, ciclo a ciclo, com o modelo de referência")
+    ap.add_argument("--vcd", default="tb_mips_top.vcd", help="VCD (ou trace binário) da simulação")
+    ap.add_argument("--program", default="intruction.hex", help="Programa executado pela simulação")
+    ap.add_argument("--data", default="", help="Imagem inicial da memória de dados do modelo ($readmemh)")
+    ap.add_argument("--context", type=int, default=8, help="Instruções mostradas antes da divergência")
+    ap.add_argument("--max-cycles", type=int, default=0, help="Para após N ciclos (0 = até o fim do programa)")
+    args = ap.parse_args(argv)
+
+    dump = Path(args.vcd)
+    program = Path(args.program)
+    for p in (dump, program):
+        if not p.exists():
+            print(f"Arquivo não encontrado: {p}", file=sys.stderr)
+            return 2
+    try:
+        checker = check_dump(
+            dump,
+            program,
+            Path(args.data) if args.data else None,
+            context=args.context,
+            max_cycles=args.max_cycles,
+        )
+    except AsmError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    if checker.missing:
+        print(f"Sinais não encontrados no dump: {', '.join(checker.missing)}", file=sys.stderr)
+        return 2
+    if checker.divergence is not None:
+        print("\n".join(format_divergence(checker.divergence)))
+        return 1
+    print(f"OK: {checker.cycles} ciclos conferidos ({checker.x_writebacks} writebacks x no RTL ignorados)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
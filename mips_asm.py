@@ -0,0 +1,434 @@
+import argparse
+import re
+import sys
+from array import array
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # words are then encoded, decoded and formatted one by one
+    np = None
+
+# MIPS assembly <-> instruction words <-> $readmemh text, for the programs and
+# memory images of rtl/. Words travel as array("I"), which numpy views without
+# a copy (as_uint32); the bulk conversions are vectorized when numpy is there.
+
+# Instruction -> (format, opcode, funct or REGIMM rt), as decoder_mips.v implements them.
+INSTRUCTIONS: dict[str, tuple[str, int, int]] = {
+    "ADD": ("alu", 0, 0b100000),
+    "ADDU": ("alu", 0, 0b100001),
+    "SUB": ("alu", 0, 0b100010),
+    "SUBU": ("alu", 0, 0b100011),
+    "AND": ("alu", 0, 0b100100),
+    "OR": ("alu", 0, 0b100101),
+    "XOR": ("alu", 0, 0b100110),
+    "NOR": ("alu", 0, 0b100111),
+    "SLT": ("alu", 0, 0b101010),
+    "SLTU": ("alu", 0, 0b101011),
+    "SLL": ("shift", 0, 0b000000),
+    "SRL": ("shift", 0, 0b000010),
+    "SRA": ("shift", 0, 0b000011),
+    "SLLV": ("shiftv", 0, 0b000100),
+    "SRLV": ("shiftv", 0, 0b000110),
+    "SRAV": ("shiftv", 0, 0b000111),
+    "JR": ("jr", 0, 0b001000),
+    "JALR": ("jr", 0, 0b001001),
+    "ADDI": ("imm", 0b001000, 0),
+    "ADDIU": ("imm", 0b001001, 0),
+    "SLTI": ("imm", 0b001010, 0),
+    "SLTIU": ("imm", 0b001011, 0),
+    "ANDI": ("imm", 0b001100, 0),
+    "ORI": ("imm", 0b001101, 0),
+    "XORI": ("imm", 0b001110, 0),
+    "LUI": ("lui", 0b001111, 0),
+    "LW": ("mem", 0b100011, 0),
+    "SW": ("mem", 0b101011, 0),
+    "BEQ": ("branch", 0b000100, 0),
+    "BNE": ("branch", 0b000101, 0),
+    "BLEZ": ("branch", 0b000110, 0),
+    "BGTZ": ("branch", 0b000111, 0),
+    "BLTZ": ("branch", 0b000001, 0),
+    "BGEZ": ("branch", 0b000001, 1),
+    "J": ("jump", 0b000010, 0),
+    "JAL": ("jump", 0b000011, 0),
+}
+_ZERO_EXT = frozenset(("ANDI", "ORI", "XORI"))
+
+_RS = 31 << 21
+_RT = 31 << 16
+_RD = 31 << 11
+_SA = 31 << 6
+# Fields an instruction leaves at zero; a word with any of them set has no
+# assembly form that encodes back to it.
+_UNUSED = {
+    name: _SA if fmt in ("alu", "shiftv") else _RS if fmt == "shift" else 0
+    for name, (fmt, _op, _sel) in INSTRUCTIONS.items()
+}
+_UNUSED.update({"LUI": _RS, "BLEZ": _RT, "BGTZ": _RT, "JR": _RT | _RD | _SA, "JALR": _RT | _SA})
+
+_NAMES = list(INSTRUCTIONS)
+
+
+def _key_names() -> list[int]:
+    # (opcode << 6 | funct for SPECIAL, rt for REGIMM) -> index into _NAMES, -1 if none.
+    out = [-1] * 4096
+    for i, (_fmt, op, sel) in enumerate(INSTRUCTIONS.values()):
+        out[op << 6 | sel] = i
+    return out
+
+
+_KEY_NAME = _key_names()
+
+_REGS = (
+    "zero", "at", "v0", "v1", "a0", "a1", "a2", "a3", "t0", "t1", "t2", "t3", "t4", "t5", "t6", "t7",
+    "s0", "s1", "s2", "s3", "s4", "s5", "s6", "s7", "t8", "t9", "k0", "k1", "gp", "sp", "fp", "ra",
+)
+REG_NAMES = {name: i for i, name in enumerate(_REGS)} | {"s8": 30}
+
+
+class AsmError(ValueError):
+    pass
+
+
+def encode_r(rs: int, rt: int, rd: int, sa: int, funct: int) -> int:
+    return rs << 21 | rt << 16 | rd << 11 | sa << 6 | funct
+
+
+def encode_i(opcode: int, rs: int, rt: int, imm: int) -> int:
+    return opcode << 26 | rs << 21 | rt << 16 | imm & 0xFFFF
+
+
+def encode_j(opcode: int, target: int) -> int:
+    return opcode << 26 | target & 0x03FFFFFF
+
+
+def as_uint32(words: array | list[int]) -> "np.ndarray":
+    if isinstance(words, array):
+        return np.frombuffer(words, dtype=np.uint32)
+    return np.asarray(words, dtype=np.uint32)
+
+
+def _encode_columns(cols: list[list[int]]) -> array:
+    # cols: opcode, rs, rt, rd, sa, funct, imm, target per instruction. Each
+    # format leaves the fields it does not use at zero, so one OR of all the
+    # shifted fields encodes every format.
+    if np is not None and cols[0]:
+        op, rs, rt, rd, sa, funct, imm, target = (np.asarray(c, dtype=np.int64) for c in cols)
+        w = op << 26 | rs << 21 | rt << 16 | rd << 11 | sa << 6 | funct | imm & 0xFFFF | target & 0x03FFFFFF
+        return array("I", w.astype(np.uint32).tobytes())
+    return array(
+        "I",
+        (
+            op << 26 | rs << 21 | rt << 16 | rd << 11 | sa << 6 | funct | imm & 0xFFFF | target & 0x03FFFFFF
+            for op, rs, rt, rd, sa, funct, imm, target in zip(*cols)
+        ),
+    )
+
+
+_LABEL_RE = re.compile(r"^\s*([A-Za-z_.]\w*)\s*:")
+_MEM_OPERAND_RE = re.compile(r"^(.*)\(\s*(\$\w+)\s*\)$")
+
+
+def _reg(tok: str) -> int:
+    if tok.startswith("$"):
+        name = tok[1:]
+        if name.isdigit() and int(name) < 32:
+            return int(name)
+        if name in REG_NAMES:
+            return REG_NAMES[name]
+    raise ValueError(f"registrador inválido: {tok!r}")
+
+
+def _int(tok: str, lo: int, hi: int) -> int:
+    try:
+        v = int(tok, 0)
+    except ValueError:
+        raise ValueError(f"número inválido: {tok!r}") from None
+    if not lo <= v <= hi:
+        raise ValueError(f"{tok} fora de [{lo}, {hi}]")
+    return v
+
+
+def assemble(text: str) -> array:
+    # One instruction per line, in the syntax of the comments of
+    # intruction.hex: "ADDI $1, $0, 5", "LW $2, 4($0)", "BEQ $1, $2, label".
+    # Labels end with ':'; branch and jump operands are a label or, as in the
+    # encoding, a word offset from PC+1 (branches) or a word address (jumps).
+    # ".word N" places a raw word. Comments start with //, # or ;.
+    lines: list[tuple[int, str, list[str]]] = []
+    labels: dict[str, int] = {}
+    for lineno, raw in enumerate(text.splitlines(), 1):
+        line = raw
+        for mark in ("//", "#", ";"):
+            line = line.partition(mark)[0]
+        while m := _LABEL_RE.match(line):
+            if m.group(1) in labels:
+                raise AsmError(f"linha {lineno}: label repetido {m.group(1)!r}")
+            labels[m.group(1)] = len(lines)
+            line = line[m.end() :]
+        parts = line.split(None, 1)
+        if parts:
+            ops = [o.strip() for o in parts[1].split(",")] if len(parts) > 1 else []
+            lines.append((lineno, parts[0].upper(), ops))
+
+    cols: list[list[int]] = [[] for _ in range(8)]
+    for pc, (lineno, mnem, ops) in enumerate(lines):
+        op = rs = rt = rd = sa = funct = imm = target = 0
+        try:
+            if mnem == ".WORD":
+                nops = 1
+                if len(ops) == 1:
+                    v = _int(ops[0], -(1 << 31), (1 << 32) - 1) & 0xFFFFFFFF
+                    op, target = v >> 26, v & 0x03FFFFFF
+            elif mnem == "NOP":
+                nops = 0
+            elif mnem not in INSTRUCTIONS:
+                raise ValueError(f"instrução desconhecida: {mnem}")
+            else:
+                fmt, op, sel = INSTRUCTIONS[mnem]
+
+                def dest(tok: str) -> int:
+                    # Branch/jump operand: a label or a number.
+                    if tok in labels:
+                        return labels[tok] - (pc + 1 if fmt == "branch" else 0)
+                    return _int(tok, -(1 << 15) if fmt == "branch" else 0, (1 << (15 if fmt == "branch" else 26)) - 1)
+
+                if fmt in ("alu", "shiftv", "shift"):
+                    nops = 3
+                    if len(ops) == 3:
+                        funct = sel
+                        rd = _reg(ops[0])
+                        if fmt == "alu":
+                            rs, rt = _reg(ops[1]), _reg(ops[2])
+                        elif fmt == "shiftv":
+                            rt, rs = _reg(ops[1]), _reg(ops[2])
+                        else:
+                            rt, sa = _reg(ops[1]), _int(ops[2], 0, 31)
+                elif fmt == "imm":
+                    nops = 3
+                    if len(ops) == 3:
+                        rt, rs, imm = _reg(ops[0]), _reg(ops[1]), _int(ops[2], -(1 << 15), 0xFFFF)
+                elif fmt == "lui":
+                    nops = 2
+                    if len(ops) == 2:
+                        rt, imm = _reg(ops[0]), _int(ops[1], -(1 << 15), 0xFFFF)
+                elif fmt == "mem":
+                    nops = 2
+                    if len(ops) == 2:
+                        m = _MEM_OPERAND_RE.match(ops[1])
+                        if m is None:
+                            raise ValueError(f"endereço inválido: {ops[1]!r} (use off($rs))")
+                        rt, rs = _reg(ops[0]), _reg(m.group(2))
+                        imm = _int(m.group(1).strip() or "0", -(1 << 15), (1 << 15) - 1)
+                elif fmt == "branch":
+                    nops = 3 if mnem in ("BEQ", "BNE") else 2
+                    if len(ops) == nops:
+                        rs = _reg(ops[0])
+                        rt = _reg(ops[1]) if nops == 3 else sel
+                        imm = dest(ops[-1])
+                elif fmt == "jump":
+                    nops = 1
+                    if len(ops) == 1:
+                        target = dest(ops[0])
+                else:
+                    # JALR takes an optional rd, $31 by default.
+                    nops = 2 if mnem == "JALR" and len(ops) == 2 else 1
+                    if len(ops) == nops:
+                        funct = sel
+                        rs = _reg(ops[-1])
+                        rd = _reg(ops[0]) if nops == 2 else 31 if mnem == "JALR" else 0
+            if len(ops) != nops:
+                raise ValueError(f"{mnem} espera {nops} operando(s), recebeu {len(ops)}")
+        except ValueError as e:
+            raise AsmError(f"linha {lineno}: {e}") from None
+        for col, v in zip(cols, (op, rs, rt, rd, sa, funct, imm, target)):
+            col.append(v)
+    return _encode_columns(cols)
+
+
+def _fields(words: array | list[int]) -> tuple[list[int], ...]:
+    # (opcode, rs, rt, rd, sa, funct, imm, target, instruction index or -1).
+    if np is not None and len(words):
+        w = as_uint32(words).astype(np.int64)
+        op = w >> 26
+        rt = w >> 16 & 31
+        funct = w & 63
+        key = op << 6 | np.where(op == 0, funct, np.where(op == 1, rt, 0))
+        names = np.asarray(_KEY_NAME, dtype=np.int64)[key]
+        return tuple(
+            c.tolist() for c in (op, w >> 21 & 31, rt, w >> 11 & 31, w >> 6 & 31, funct, w & 0xFFFF, w & 0x03FFFFFF, names)
+        )
+    cols: tuple[list[int], ...] = tuple([] for _ in range(9))
+    for w in words:
+        op, rt, funct = w >> 26, w >> 16 & 31, w & 63
+        key = op << 6 | (funct if op == 0 else rt if op == 1 else 0)
+        for col, v in zip(cols, (op, w >> 21 & 31, rt, w >> 11 & 31, w >> 6 & 31, funct, w & 0xFFFF, w & 0x03FFFFFF)):
+            col.append(v)
+        cols[8].append(_KEY_NAME[key])
+    return cols
+
+
+def disassemble(words: array | list[int]) -> list[str]:
+    # Each word in the syntax assemble() reads, so the text assembles back to
+    # the same words; words with no such form (other opcodes, or fields the
+    # instruction does not use set) come out as ".word".
+    out: list[str] = []
+    for w, op, rs, rt, rd, sa, funct, imm, target, idx in zip(words, *_fields(words)):
+        name = _NAMES[idx] if idx >= 0 else ""
+        if not name or w & _UNUSED.get(name, 0):
+            out.append(f".word 0x{w:08x}")
+            continue
+        fmt = INSTRUCTIONS[name][0]
+        simm = imm - 0x10000 if imm & 0x8000 else imm
+        if fmt == "alu":
+            out.append(f"{name} ${rd}, ${rs}, ${rt}")
+        elif fmt == "shiftv":
+            out.append(f"{name} ${rd}, ${rt}, ${rs}")
+        elif fmt == "shift":
+            out.append(f"{name} ${rd}, ${rt}, {sa}")
+        elif fmt == "imm":
+            out.append(f"{name} ${rt}, ${rs}, {f'0x{imm:04x}' if name in _ZERO_EXT else simm}")
+        elif fmt == "lui":
+            out.append(f"LUI ${rt}, 0x{imm:04x}")
+        elif fmt == "mem":
+            out.append(f"{name} ${rt}, {simm}(${rs})")
+        elif fmt == "branch":
+            out.append(f"{name} ${rs}, ${rt}, {simm}" if name in ("BEQ", "BNE") else f"{name} ${rs}, {simm}")
+        elif fmt == "jump":
+            out.append(f"{name} {target}")
+        else:
+            out.append(f"JALR ${rd}, ${rs}" if name == "JALR" else f"JR ${rs}")
+    return out
+
+
+_MEMH_COMMENT_RE = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_MEMH_ADDR_RE = re.compile(r"@([0-9A-Fa-f]+)")
+if np is not None:
+    # ASCII -> hex digit value, 16 for anything else (x, z, ...).
+    _HEX_VALUE = np.full(256, 16, dtype=np.uint8)
+    _HEX_VALUE[np.frombuffer(b"0123456789abcdefABCDEF", dtype=np.uint8)] = [*range(16), *range(10, 16)]
+    _HEX_DIGIT = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+    _NIBBLE_SHIFT = np.arange(28, -4, -4, dtype=np.uint32)
+
+
+def _hex_words(tokens: list[str]) -> tuple[array, bytes]:
+    # Hex tokens -> (words, defined flags). Tokens with x/z digits are not defined.
+    if np is not None:
+        buf = "".join(t[-8:].rjust(8, "0") for t in tokens).encode("ascii", "replace")
+        nib = _HEX_VALUE[np.frombuffer(buf, dtype=np.uint8)].reshape(-1, 8)
+        ok = (nib < 16).all(axis=1)
+        w = (nib.astype(np.uint32) << _NIBBLE_SHIFT).sum(axis=1, dtype=np.uint32)
+        w[~ok] = 0
+        return array("I", w.tobytes()), ok.astype(np.uint8).tobytes()
+    words = array("I")
+    defined = bytearray()
+    for t in tokens:
+        try:
+            words.append(int(t, 16) & 0xFFFFFFFF)
+            defined.append(1)
+        except ValueError:
+            words.append(0)
+            defined.append(0)
+    return words, bytes(defined)
+
+
+def parse_memh(text: str, depth: int) -> tuple[array, bytearray]:
+    # Same input as $readmemh: hex words separated by whitespace, // and /* */
+    # comments and @addr directives. Returns the words and, per word, whether
+    # it was loaded with a defined value (unloaded and x/z words are not).
+    words = array("I", bytes(4 * depth))
+    defined = bytearray(depth)
+    tokens = _MEMH_COMMENT_RE.sub(" ", text).replace("_", "").split()
+    # Runs of words between @addr directives, each converted in bulk.
+    runs: list[tuple[int, list[str]]] = [(0, [])]
+    for t in tokens:
+        if t.startswith("@"):
+            m = _MEMH_ADDR_RE.fullmatch(t)
+            if m is None:
+                raise AsmError(f"endereço inválido: {t!r}")
+            runs.append((int(m.group(1), 16), []))
+        else:
+            runs[-1][1].append(t)
+    for addr, toks in runs:
+        n = min(len(toks), depth - addr)
+        if n > 0:
+            words[addr : addr + n], defined[addr : addr + n] = _hex_words(toks[:n])
+    return words, defined
+
+
+def read_memh(path: Path, depth: int) -> tuple[array, bytearray]:
+    try:
+        return parse_memh(path.read_text(encoding="utf-8", errors="replace"), depth)
+    except AsmError as e:
+        raise AsmError(f"{path}: {e}") from None
+
+
+def format_memh(
+    words: array | list[int], defined: bytearray | None = None, comments: list[str] | None = None
+) -> str:
+    # $readmemh text: with `comments`, each word follows its "// comment"
+    # line (the layout of intruction.hex); otherwise an address comment every
+    # 16 words, as $writememh writes data.hex. Undefined words are xxxxxxxx.
+    if comments is not None and len(comments) != len(words):
+        raise ValueError(f"{len(comments)} comentários para {len(words)} palavras")
+    if np is not None and len(words):
+        chars = _HEX_DIGIT[as_uint32(words)[:, None] >> _NIBBLE_SHIFT & 15]
+        if defined is not None:
+            chars[np.frombuffer(bytes(defined), dtype=np.uint8) == 0] = ord("x")
+        hexes = chars.tobytes().decode("ascii")
+        lines = [hexes[i : i + 8] for i in range(0, len(hexes), 8)]
+    else:
+        lines = [f"{w:08x}" if defined is None or defined[i] else "xxxxxxxx" for i, w in enumerate(words)]
+    out: list[str] = []
+    for addr, h in enumerate(lines):
+        if comments is not None:
+            out.append(f"// {comments[addr]}")
+        elif addr % 16 == 0:
+            out.append(f"// 0x{addr:08x}")
+        out.append(h)
+    return "\n".join(out) + "\n"
+
+
+def write_memh(
+    path: Path, words: array | list[int], defined: bytearray | None = None, comments: list[str] | None = None
+) -> None:
+    path.write_text(format_memh(words, defined, comments), encoding="utf-8")
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description="Montador/desmontador MIPS e E/S de arquivos $readmemh")
+    ap.add_argument("input", help="Assembly (.s/.asm) a montar, ou .hex a desmontar com --dis")
+    ap.add_argument("--dis", action="store_true", help="Desmonta um arquivo $readmemh")
+    ap.add_argument("-o", "--out", default="", help="Arquivo .hex de saída (padrão: stdout)")
+    ap.add_argument("--depth", type=int, default=256, help="Palavras lidas com --dis (MEM_DEPTH de intr_mem_model.v)")
+    args = ap.parse_args(argv)
+
+    src = Path(args.input)
+    if not src.exists():
+        print(f"Arquivo não encontrado: {src}", file=sys.stderr)
+        return 2
+    if args.dis:
+        try:
+            words, defined = read_memh(src, args.depth)
+        except AsmError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        n = max((i + 1 for i, d in enumerate(defined) if d), default=0)
+        for addr, text in enumerate(disassemble(words[:n])):
+            print(f"{addr:4d}: {words[addr]:08x}  {text}" if defined[addr] else f"{addr:4d}: xxxxxxxx")
+        return 0
+    try:
+        words = assemble(src.read_text(encoding="utf-8"))
+    except AsmError as e:
+        print(f"{src}: {e}", file=sys.stderr)
+        return 1
+    text = format_memh(words, comments=disassemble(words))
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
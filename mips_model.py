@@ -0,0 +1,331 @@
+import argparse
+import sys
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+
+from mips_asm import AsmError, disassemble, read_memh, write_memh
+
+# Instruction-set model of rtl/mips.v: executes the instructions decoder_mips.v
+# decodes, with the same datapath (word-addressed PC and data memory, the same
+# ALU operations and the same quirks), one call per clock cycle.
+
+INSTR_MEM_DEPTH = 256  # intr_mem_model.v: MEM2[0:MEM_DEPTH-1]
+DATA_MEM_WORDS = 33  # data_memory_model.v: MEM1[0:MEM_WORD]
+MASK32 = 0xFFFFFFFF
+
+# alu.v control codes
+ALU_ADD = 0
+ALU_SUB = 1
+ALU_AND = 2
+ALU_OR = 3
+ALU_XOR = 4
+ALU_SLLV = 5
+ALU_SRLV = 6
+ALU_SLT = 7
+ALU_NOR = 8
+ALU_SLTU = 9
+ALU_SLL = 10
+ALU_COMP = 11
+ALU_SRAV = 12
+ALU_SUBU = 13
+ALU_ADDU = 14
+ALU_SRL = 15
+
+
+def alu(op: int, a: int, b: int) -> tuple[int, bool]:
+    # alu.v on 32-bit operands: (out_alu, overflow).
+    if op == ALU_ADD:
+        out = (a + b) & MASK32
+        return out, bool(~(a ^ b) & (out ^ a) & 0x80000000)
+    if op == ALU_SUB:
+        out = (a - b) & MASK32
+        return out, bool((a ^ b) & (out ^ a) & 0x80000000)
+    if op == ALU_AND:
+        return a & b, False
+    if op == ALU_OR:
+        return a | b, False
+    if op == ALU_XOR:
+        return a ^ b, False
+    if op == ALU_SLLV or op == ALU_SLL:
+        return (a << (b & 31)) & MASK32, False
+    if op == ALU_SRLV or op == ALU_SRL:
+        return a >> (b & 31), False
+    if op == ALU_SLT:
+        return int((a ^ 0x80000000) < (b ^ 0x80000000)), False
+    if op == ALU_NOR:
+        return ~(a | b) & MASK32, False
+    if op == ALU_SLTU:
+        return int(a < b), False
+    if op == ALU_SRAV:
+        return ((a - ((a & 0x80000000) << 1)) >> (b & 31)) & MASK32, False
+    if op == ALU_SUBU:
+        return (a - b) & MASK32, False
+    if op == ALU_ADDU:
+        return (a + b) & MASK32, False
+    return 0, False  # COMP
+
+
+@dataclass(frozen=True)
+class Control:
+    # decoder_mips.v outputs for one (opcode, funct), plus the datapath
+    # selections mips.v derives from the opcode/funct alone.
+    name: str
+    aluop: int = ALU_ADD
+    rori: bool = False  # ALU b = rt (else the extended immediate)
+    instype: bool = False  # destination rt (else rd)
+    reoral: bool = True  # writeback ALU (else data memory)
+    reg_write: bool = False
+    mem_write: bool = False
+    zero_ext: bool = False
+    slt_imm: bool = False  # slt_mux: writeback rs < imm from the decoder
+    jump: str = ""  # "", "beq", "bne", "blez", "bgtz", "regimm", "j", "jr"
+    shift: str = ""  # "", "imm", "var"
+    trap: bool = False  # overflow disables the register write
+    link: bool = False  # jal
+    lui: bool = False
+
+
+_IMM_OPS = {
+    0b000: ("ADDI", ALU_ADD),
+    0b001: ("ADDIU", ALU_ADDU),
+    0b010: ("SLTI", ALU_ADD),
+    0b011: ("SLTIU", ALU_ADD),
+    0b100: ("ANDI", ALU_AND),
+    0b101: ("ORI", ALU_OR),
+    0b110: ("XORI", ALU_XOR),
+    0b111: ("LUI", ALU_ADD),
+}
+_BRANCHES = {0b00: "beq", 0b01: "bne", 0b10: "blez", 0b11: "bgtz"}
+_SHIFTS = {
+    0b000000: ("SLL", ALU_SLL, "imm"),
+    0b000010: ("SRL", ALU_SRL, "imm"),
+    0b000011: ("SRA", ALU_SRAV, "imm"),
+    0b000100: ("SLLV", ALU_SLLV, "var"),
+    0b000110: ("SRLV", ALU_SRLV, "var"),
+    0b000111: ("SRAV", ALU_SRAV, "var"),
+}
+_R_OPS = {
+    0b100000: ("ADD", ALU_ADD),
+    0b100001: ("ADDU", ALU_ADDU),
+    0b100010: ("SUB", ALU_SUB),
+    0b100011: ("SUBU", ALU_SUBU),
+    0b100100: ("AND", ALU_AND),
+    0b100101: ("OR", ALU_OR),
+    0b100110: ("XOR", ALU_XOR),
+    0b100111: ("NOR", ALU_NOR),
+    0b101010: ("SLT", ALU_SLT),
+    0b101011: ("SLTU", ALU_SLTU),
+}
+
+
+def _decode(opcode: int, funct: int) -> Control:
+    # Follows the if/case structure of decoder_mips.v, so opcodes it does not
+    # name decode the way the RTL decodes them (e.g. LB as LW).
+    if opcode & 0b100000:
+        if opcode & 0b001000:
+            return Control("SW", reoral=False, mem_write=True)
+        return Control("LW", instype=True, reoral=False, reg_write=True)
+    if opcode & 0b001000:
+        name, op = _IMM_OPS[opcode & 0b111]
+        return Control(
+            name,
+            aluop=op,
+            instype=True,
+            reg_write=True,
+            zero_ext=name in ("ANDI", "ORI", "XORI"),
+            slt_imm=name in ("SLTI", "SLTIU"),
+            trap=opcode == 0b001000,
+            lui=opcode == 0b001111,
+        )
+    if opcode & 0b000100:
+        kind = _BRANCHES[opcode & 0b11]
+        return Control(kind.upper(), aluop=ALU_COMP, rori=True, instype=True, jump=kind)
+    if opcode == 0b000001:
+        return Control("REGIMM", aluop=ALU_COMP, rori=True, instype=True, jump="regimm")
+    if opcode & 0b11 == 0:
+        if funct == 0b001000:
+            return Control("JR", reoral=False, jump="jr")
+        if funct == 0b001001:
+            # No link: the decoder leaves ref_w_ena low for JALR.
+            return Control("JALR", reoral=False, jump="jr")
+        if funct in _SHIFTS:
+            name, op, kind = _SHIFTS[funct]
+            return Control(name, aluop=op, rori=True, reg_write=True, shift=kind)
+        name, op = _R_OPS.get(funct, ("SPECIAL?", ALU_ADD))
+        return Control(
+            name,
+            aluop=op,
+            rori=True,
+            reg_write=True,
+            trap=opcode == 0 and funct in (0b100000, 0b100010),
+        )
+    jal = opcode == 0b000011
+    return Control("JAL" if jal else "J", reoral=False, jump="j", link=jal)
+
+
+# Indexed by opcode << 6 | funct.
+DECODE: list[Control] = [_decode(i >> 6, i & 63) for i in range(64 * 64)]
+
+
+def decode(instr: int) -> Control:
+    return DECODE[(instr >> 20) & 0xFC0 | instr & 63]
+
+
+@dataclass
+class Step:
+    # One executed instruction as the RTL shows it during its cycle; after
+    # the next rising edge `program_counter` is `next_pc` and `writeback`
+    # holds `writeback`.
+    pc: int
+    instruction: int
+    dest: int
+    writeback: int
+    reg_write: bool
+    next_pc: int
+
+
+class MipsModel:
+    def __init__(self, program: array, data: array | None = None, program_defined: bytearray | None = None) -> None:
+        self.imem = array("I", program)
+        # Words past the end of the loaded program are x in the RTL; the
+        # model stops when the PC reaches one.
+        self.imem_defined = program_defined if program_defined is not None else bytearray(b"\x01" * len(self.imem))
+        # The RTL's register file and data memory start as x; the model uses
+        # zeros (or `data`).
+        self.dmem = array("I", data if data is not None else bytes(4 * DATA_MEM_WORDS))
+        self.regs = array("I", bytes(4 * 32))
+        self.pc = 0
+        self.steps = 0
+        self.halted = False
+
+    @classmethod
+    def from_hex(cls, program_hex: Path, data_hex: Path | None = None) -> "MipsModel":
+        program, defined = read_memh(program_hex, INSTR_MEM_DEPTH)
+        data = read_memh(data_hex, DATA_MEM_WORDS)[0] if data_hex is not None else None
+        return cls(program, data, defined)
+
+    def step(self) -> Step | None:
+        pc = self.pc
+        if self.halted or pc >= len(self.imem) or not self.imem_defined[pc]:
+            self.halted = True
+            return None
+        instr = self.imem[pc]
+        c = DECODE[(instr >> 20) & 0xFC0 | instr & 63]
+        regs = self.regs
+        rs_idx = (instr >> 21) & 31
+        rt_idx = (instr >> 16) & 31
+        rs = regs[rs_idx]
+        rt = regs[rt_idx]
+        imm = instr & 0xFFFF
+        if c.lui:
+            ext = imm << 16
+        elif c.zero_ext:
+            ext = imm
+        else:
+            ext = imm | 0xFFFF0000 if imm & 0x8000 else imm
+
+        if c.shift == "imm":
+            a, b = rt, (instr >> 6) & 31
+        elif c.shift == "var":
+            a, b = rt, rs
+        else:
+            a, b = rs, rt if c.rori else ext
+        alu_out, overflow = alu(c.aluop, a, b)
+
+        new_pc = (pc + 1) & MASK32
+        dmem = self.dmem
+        readmem = dmem[alu_out] if alu_out < len(dmem) else 0
+        if c.link:
+            wb = new_pc
+        elif c.slt_imm:
+            wb = int(rs < ext)
+        elif c.reoral:
+            wb = alu_out
+        else:
+            wb = readmem
+        dest = 31 if c.link else rt_idx if c.instype else (instr >> 11) & 31
+        write = (c.reg_write or c.link) and not (c.trap and overflow)
+
+        jump = c.jump
+        if not jump:
+            taken = False
+        elif jump == "beq":
+            taken = rs == rt
+        elif jump == "bne":
+            taken = rs != rt
+        elif jump == "blez":
+            taken = rs == rt or rs >= 0x80000000
+        elif jump == "bgtz":
+            taken = rs != rt and rs < 0x80000000
+        elif jump == "regimm":
+            taken = (rs >= 0x80000000) == (rt_idx == 0)
+        else:
+            taken = True
+        if not taken:
+            next_pc = new_pc
+        elif jump == "j":
+            next_pc = instr & 0x03FFFFFF
+        elif jump == "jr":
+            next_pc = rs
+        else:
+            next_pc = (new_pc + ext) & MASK32
+
+        if write and dest:
+            regs[dest] = wb
+        if c.mem_write and alu_out < len(dmem):
+            dmem[alu_out] = rt
+        self.pc = next_pc
+        self.steps += 1
+        return Step(pc=pc, instruction=instr, dest=dest, writeback=wb, reg_write=write, next_pc=next_pc)
+
+    def run(self, max_steps: int) -> list[Step]:
+        # Runs until the PC leaves the program, a jump to itself (the usual
+        # end-of-test loop) or `max_steps`.
+        trace: list[Step] = []
+        for _ in range(max_steps):
+            s = self.step()
+            if s is None:
+                break
+            trace.append(s)
+            if s.next_pc == s.pc:
+                self.halted = True
+                break
+        return trace
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description="Modelo de referência (ISA) do MIPS de rtl/")
+    ap.add_argument("--program", default="intruction.hex", help="Programa no formato $readmemh")
+    ap.add_argument("--data", default="", help="Imagem inicial da memória de dados ($readmemh)")
+    ap.add_argument("--max-steps", type=int, default=10000, help="Máximo de instruções executadas")
+    ap.add_argument("--trace", action="store_true", help="Mostra cada instrução executada")
+    ap.add_argument("--dump-data", default="", help="Grava a memória de dados final no formato $writememh")
+    args = ap.parse_args(argv)
+
+    program = Path(args.program)
+    if not program.exists():
+        print(f"Programa não encontrado: {program}", file=sys.stderr)
+        return 2
+    try:
+        model = MipsModel.from_hex(program, Path(args.data) if args.data else None)
+    except AsmError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    trace = model.run(args.max_steps)
+
+    if args.trace:
+        for s, text in zip(trace, disassemble([s.instruction for s in trace])):
+            wr = f"${s.dest} = {s.writeback:08x}" if s.reg_write and s.dest else "-"
+            print(f"{s.pc:4d}: {s.instruction:08x} {text:<24} {wr}")
+    end = "fim do programa" if model.halted else f"limite de {args.max_steps} instruções"
+    print(f"{model.steps} instruções executadas ({end}), PC final {model.pc}")
+    for i in range(0, 32, 4):
+        print("  " + "  ".join(f"${r:<2} {model.regs[r]:08x}" for r in range(i, i + 4)))
+    if args.dump_data:
+        write_memh(Path(args.dump_data), model.dmem)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,402 @@
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from mips_asm import INSTRUCTIONS, disassemble, encode_i, encode_j, encode_r, format_memh
+from mips_model import DATA_MEM_WORDS, DECODE, INSTR_MEM_DEPTH, MipsModel, decode
+from regression import JobResult, plan_jobs, run_job
+from rtl_line_branch_coverage import (
+    Probe,
+    emitted_probe_names,
+    expand_block_stats,
+    instrument_rtl,
+    packed_probe_bits,
+    read_rtl_texts,
+    read_sources,
+)
+from vcd_coverage import analyze_vcd, format_percent
+
+# Constrained-random programs for rtl/mips.v: every instruction decoder_mips.v
+# implements, with legal operands and only forward control flow, so each
+# program runs straight to its end-of-test loop. Batches are simulated with
+# the regression flow and kept only when they hit probes no earlier program
+# hit; the instruction weights follow the holes.
+
+_FUNCT_KINDS = {funct: name for name, (_fmt, op, funct) in INSTRUCTIONS.items() if op == 0}
+
+DATA_REGS = range(1, 16)  # initialized by the prologue; the RTL's other registers start as x
+TARGET_REG = 28  # holds the JR/JALR target
+MAX_SKIP = 4  # instructions a branch or jump skips at most
+HOLE_BOOST = 1.0  # extra weight per uncovered branch attributed to an instruction
+HOLE_SCAN_LINES = 40
+PROLOGUE_WORDS = 2 * len(DATA_REGS) + DATA_MEM_WORDS  # register and data memory setup
+
+# Operand values that reach the ALU's sign, overflow and zero corners.
+_CORNER_WORDS = (0, 1, 0xFFFFFFFF, 0x7FFFFFFF, 0x80000000, 0x0000FFFF, 0xFFFF0000)
+_CORNER_IMMS = (0, 1, 0xFFFF, 0x7FFF, 0x8000)
+
+
+def kind_of(instr: int) -> str:
+    name = decode(instr).name
+    if name == "REGIMM":
+        # decoder_mips.v treats every rt other than 0 as BGEZ.
+        return "BLTZ" if (instr >> 16) & 31 == 0 else "BGEZ"
+    return name
+
+
+def counts_from_histograms(
+    opcode_hist: dict[int, int], funct_hist: dict[int, int], regimm_rt_hist: dict[int, int]
+) -> Counter[str]:
+    # Executed instructions per kind, from the histograms of vcd_coverage.py.
+    counts: Counter[str] = Counter()
+    for op, n in opcode_hist.items():
+        if op not in (0, 1):
+            counts[DECODE[op << 6].name] += n
+    for funct, n in funct_hist.items():
+        counts[DECODE[funct].name] += n
+    for rt, n in regimm_rt_hist.items():
+        counts["BLTZ" if rt == 0 else "BGEZ"] += n
+    return counts
+
+
+def write_program(path: Path, words: array, title: str) -> None:
+    path.write_text(f"// {title}\n" + format_memh(words, comments=disassemble(words)), encoding="utf-8")
+
+
+class ProgramGenerator:
+    # Prologue: random (often corner) values in $1..$15 and every data
+    # memory word, so nothing the body reads is x in the RTL. Body: `length`
+    # instructions drawn by weight. Epilogue: a jump to itself.
+    def __init__(self, rng: random.Random, length: int) -> None:
+        self.rng = rng
+        self.length = length
+
+    def _word(self) -> int:
+        rng = self.rng
+        return rng.choice(_CORNER_WORDS) if rng.random() < 0.3 else rng.getrandbits(32)
+
+    def _imm(self) -> int:
+        rng = self.rng
+        r = rng.random()
+        if r < 0.25:
+            return rng.choice(_CORNER_IMMS)
+        if r < 0.6:
+            return rng.randint(-8, 8) & 0xFFFF
+        return rng.getrandbits(16)
+
+    def generate(self, weights: dict[str, float]) -> array:
+        rng = self.rng
+        words = array("I")
+        for r in DATA_REGS:
+            v = self._word()
+            words.append(encode_i(INSTRUCTIONS["LUI"][1], 0, r, v >> 16))
+            words.append(encode_i(INSTRUCTIONS["ORI"][1], r, r, v))
+        for addr in range(DATA_MEM_WORDS):
+            r = rng.choice(DATA_REGS)
+            words.append(encode_i(INSTRUCTIONS["SW"][1], 0, r, addr))
+
+        # Pick the instructions first: a JR/JALR takes two slots, the load of
+        # its target register and the jump, and no branch may land on the jump.
+        start = len(words)
+        end = start + self.length
+        names = [k for k, w in weights.items() if w > 0]
+        cum = [weights[k] for k in names]
+        if not names:
+            names, cum = ["SLL"], [1.0]
+        slots: list[str] = []
+        no_land: set[int] = set()
+        while len(slots) < self.length:
+            name = rng.choices(names, cum)[0]
+            if INSTRUCTIONS[name][0] == "jr":
+                if self.length - len(slots) < 2:
+                    name = "ADDU"
+                else:
+                    slots.append("")
+                    no_land.add(start + len(slots))
+            slots.append(name)
+
+        def target(first: int) -> int:
+            # A forward target in [first, first + MAX_SKIP], inside the body.
+            return rng.choice([t for t in range(first, min(first + MAX_SKIP, end) + 1) if t not in no_land])
+
+        for pc, name in enumerate(slots, start):
+            if not name:
+                # The target register is loaded right before the jump.
+                dest = target(pc + 2)
+                words.append(encode_i(INSTRUCTIONS["ADDI"][1], 0, TARGET_REG, dest))
+                continue
+            fmt, opcode, funct = INSTRUCTIONS[name]
+            rs = rng.choice((0, *DATA_REGS))
+            rt = rng.choice((0, *DATA_REGS))
+            rd = rng.choice(DATA_REGS)
+            if fmt in ("alu", "shiftv"):
+                words.append(encode_r(rs, rt, rd, 0, funct))
+            elif fmt == "shift":
+                sa = rng.randrange(32)
+                words.append(encode_r(0, rt, rd, sa, funct))
+            elif fmt == "imm":
+                imm = self._imm()
+                words.append(encode_i(opcode, rs, rd, imm))
+            elif fmt == "lui":
+                imm = self._imm()
+                words.append(encode_i(opcode, 0, rd, imm))
+            elif fmt == "mem":
+                addr = rng.randrange(DATA_MEM_WORDS)
+                reg = rd if name == "LW" else rt
+                words.append(encode_i(opcode, 0, reg, addr))
+            elif fmt == "branch":
+                skip = target(pc + 1) - pc - 1
+                if opcode == 0b000001:
+                    rt = funct
+                elif name in ("BLEZ", "BGTZ"):
+                    rt = 0
+                words.append(encode_i(opcode, rs, rt, skip))
+            elif fmt == "jump":
+                dest = target(pc + 1)
+                words.append(encode_j(opcode, dest))
+            else:
+                words.append(encode_r(TARGET_REG, 0, 31 if name == "JALR" else 0, 0, funct))
+        words.append(encode_j(INSTRUCTIONS["J"][1], end))
+        return words
+
+
+def run_model(words: array) -> tuple[Counter[str], bool]:
+    # Executed body instructions per kind (not the prologue nor the
+    # end-of-test loop), and whether the program reached that loop.
+    model = MipsModel(words)
+    trace = model.run(4 * len(words))
+    end = len(words) - 1
+    done = bool(trace) and trace[-1].next_pc == trace[-1].pc == end
+    return Counter(kind_of(s.instruction) for s in trace if PROLOGUE_WORDS <= s.pc < end), done
+
+
+_LABEL_RE = re.compile(r"^\s*`?(\w+)\s*:")
+_FUNCT_RE = re.compile(r"(?:funct\s*==\s*|^\s*)6'b([01]{6})")
+_COMMENT_RE = re.compile(r"^\s*([A-Z][A-Z]+)\b")
+
+
+def hole_kind(probe: Probe, sources: dict[str, list[str]]) -> str | None:
+    # The instruction an uncovered branch belongs to: the nearest case label,
+    # funct comparison or comment starting with one, at or above the branch
+    # line. A branch on the opcode group or on another label, or one past the
+    # end of a case, names none.
+    lines = sources.get(probe.file, [])
+    for ln in range(min(probe.line, len(lines)), max(0, probe.line - HOLE_SCAN_LINES), -1):
+        code, _sep, comment = lines[ln - 1].partition("//")
+        label = _LABEL_RE.match(code)
+        if label and label.group(1) in INSTRUCTIONS:
+            return label.group(1)
+        for m in _FUNCT_RE.finditer(code):
+            name = _FUNCT_KINDS.get(int(m.group(1), 2))
+            if name is not None:
+                return name
+        m = _COMMENT_RE.match(comment)
+        if m and m.group(1) in INSTRUCTIONS:
+            return m.group(1)
+        if ln == probe.line and (label or "opcode" in code) or ln != probe.line and "endcase" in code:
+            return None
+    return None
+
+
+def steer_weights(
+    base: dict[str, float], executed: Counter[str], holes: Counter[str]
+) -> dict[str, float]:
+    # Rarely executed instructions weigh up to twice their base weight; each
+    # uncovered branch attributed to an instruction adds HOLE_BOOST more.
+    active = [k for k, w in base.items() if w > 0]
+    mean = sum(executed[k] for k in active) / len(active) if active else 0
+    out: dict[str, float] = {}
+    for k, w in base.items():
+        rarity = 2.0 / (1.0 + executed[k] / mean) if mean else 1.0
+        out[k] = w * rarity * (1.0 + HOLE_BOOST * holes[k])
+    return out
+
+
+def _parse_weights(items: list[str]) -> dict[str, float]:
+    weights = {k: 1.0 for k in INSTRUCTIONS}
+    for item in items:
+        name, sep, value = item.partition("=")
+        name = name.strip().upper()
+        if not sep or name not in INSTRUCTIONS:
+            raise ValueError(f"peso inválido: {item!r} (use INSTR=PESO, ex.: LW=3)")
+        w = float(value)
+        if not w >= 0:
+            raise ValueError(f"peso inválido: {item!r} (o peso deve ser um número >= 0)")
+        weights[name] = w
+    if not any(weights.values()):
+        raise ValueError("todos os pesos são 0: nenhuma instrução pode ser gerada")
+    return weights
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        description="Gera programas MIPS aleatórios e guarda os que aumentam a cobertura line/branch do RTL"
+    )
+    ap.add_argument("--tb", default=str(Path("tb") / "tb_mips_top.v"), help="Testbench que executa os programas")
+    ap.add_argument("--rtl-dir", default=str(Path("rtl")), help="Diretório com RTL (.v)")
+    ap.add_argument("--out", default=str(Path("programs") / "gen"), help="Onde gravar os programas guardados")
+    ap.add_argument("--rounds", type=int, default=10, help="Máximo de lotes")
+    ap.add_argument("--batch", type=int, default=8, help="Programas por lote")
+    ap.add_argument("--patience", type=int, default=3, help="Para após N lotes seguidos sem cobertura nova")
+    ap.add_argument("--length", type=int, default=96, help="Instruções aleatórias por programa")
+    ap.add_argument("--seed", type=int, default=None, help="Semente (padrão: aleatória, mostrada no início)")
+    ap.add_argument(
+        "--weight", action="append", default=[], help="Peso base de uma instrução, ex.: LW=3 ou JALR=0 (repetível)"
+    )
+    ap.add_argument("--vcd", default="", help="VCD de uma simulação anterior: histogramas iniciais (vcd_coverage.py)")
+    ap.add_argument("--report", default="", help="JSON de rtl_line_branch_coverage.py/regression.py: cobertura inicial")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Simulações em paralelo")
+    ap.add_argument("--work", default="", help="Diretório de trabalho (mantém um subdiretório por simulação)")
+    ap.add_argument("--cache-dir", default=".cov_cache", help="Cache de instrumentação e de .vvp")
+    ap.add_argument("--no-cache", action="store_true", help="Sempre re-instrumenta e recompila tudo")
+    ap.add_argument(
+        "--readout",
+        action="store_true",
+        help="Sem VCD: hits lidos do arquivo de hits no fim de cada simulação (mais rápido, sem --lockstep)",
+    )
+    ap.add_argument("--lockstep", action="store_true", help="Confere cada simulação com o modelo de referência")
+    args = ap.parse_args(argv)
+
+    repo_root = Path(__file__).resolve().parent
+    rtl_files = sorted([p for p in (repo_root / args.rtl_dir).resolve().glob("*.v") if p.is_file()])
+    if not rtl_files:
+        print(f"Nenhum .v encontrado em {args.rtl_dir}", file=sys.stderr)
+        return 2
+    tb = (repo_root / args.tb).resolve()
+    if not tb.exists():
+        print(f"Testbench não encontrado: {tb}", file=sys.stderr)
+        return 2
+    if args.length < 1 or 2 * len(DATA_REGS) + DATA_MEM_WORDS + args.length + 1 > INSTR_MEM_DEPTH:
+        print(f"--length fora da memória de instruções ({INSTR_MEM_DEPTH} palavras)", file=sys.stderr)
+        return 2
+    try:
+        base = _parse_weights(args.weight)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    executed: Counter[str] = Counter()
+    if args.vcd:
+        r = analyze_vcd(Path(args.vcd), include_tb=False)
+        executed = counts_from_histograms(r["opcode_hist"], r["funct_hist"], r["regimm_rt_hist"])  # type: ignore[arg-type]
+    covered: set[str] = set()
+    if args.report:
+        report = json.loads(Path(args.report).read_text(encoding="utf-8"))
+        covered = set(report.get("probes", {}))
+
+    seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+    print(f"Semente: {seed}", file=sys.stderr)
+    gen = ProgramGenerator(random.Random(seed), args.length)
+    out_dir = (repo_root / args.out).resolve()
+    cache_root = None if args.no_cache else (repo_root / args.cache_dir).resolve()
+    rtl_texts = read_rtl_texts(rtl_files)
+    sources = read_sources(rtl_files, rtl_texts)
+
+    def run_in(work_root: Path) -> int:
+        probes, inst_rtl_files, _reused = instrument_rtl(
+            rtl_files,
+            work_root / "rtl",
+            cache_root / "instrument" if cache_root is not None else None,
+            readout=args.readout,
+            jobs=args.jobs,
+            texts=rtl_texts,
+        )
+        branches = [p for p in probes if p.kind == "branch"]
+        kind_by_branch = {p.name: hole_kind(p, sources) for p in branches}
+        covered.intersection_update(p.name for p in probes)
+        start_hit = sum(1 for p in branches if p.name in covered)
+        kept: list[Path] = []
+        failed = 0
+        idle = 0
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            for rnd in range(args.rounds):
+                holes = Counter(kind_by_branch[p.name] for p in branches if p.name not in covered)
+                holes.pop(None, None)
+                weights = steer_weights(base, executed, holes)
+                round_dir = work_root / f"round_{rnd:03d}"
+                round_dir.mkdir(parents=True, exist_ok=True)
+                paths: list[Path] = []
+                for i in range(args.batch):
+                    prog = gen.generate(weights)
+                    counts, done = run_model(prog)
+                    executed.update(counts)
+                    if not done:
+                        continue  # cannot happen with forward-only control flow
+                    path = round_dir / f"gen_{seed}_{rnd:03d}_{i:02d}.hex"
+                    write_program(path, prog, f"program_gen.py --seed {seed}: lote {rnd}, programa {i}")
+                    paths.append(path)
+                jobs = plan_jobs(
+                    repo_root=repo_root,
+                    work_root=round_dir,
+                    testbenches=[tb],
+                    programs=paths,
+                    program_tbs={tb},
+                    rtl_paths=inst_rtl_files,
+                    probe_names=emitted_probe_names(probes),
+                    probe_bits=packed_probe_bits(probes),
+                    vvp_cache_dir=cache_root / "vvp" if cache_root is not None else None,
+                    readout=args.readout,
+                    lockstep=args.lockstep and not args.readout,
+                )
+                gained = 0
+                for path, result in zip(paths, pool.map(run_job, jobs)):
+                    if not result.ok:
+                        failed += 1
+                        _keep_failure(out_dir / "falhas", path, result)
+                        continue
+                    hit = set(expand_block_stats(probes, result.probe_stats))
+                    new = hit - covered
+                    if not new:
+                        continue
+                    covered.update(new)
+                    gained += len(new)
+                    out_dir.mkdir(parents=True, exist_ok=True)
+                    kept.append(Path(shutil.copyfile(path, out_dir / path.name)))
+                n_hit = sum(1 for p in branches if p.name in covered)
+                print(
+                    f"Lote {rnd}: {len(paths)} programas, {gained} probes novos, "
+                    f"branches {n_hit}/{len(branches)} ({format_percent(n_hit, len(branches))})"
+                )
+                idle = 0 if gained else idle + 1
+                if n_hit == len(branches) or idle >= args.patience:
+                    break
+
+        n_hit = sum(1 for p in branches if p.name in covered)
+        print("")
+        print(f"Branches: {start_hit} -> {n_hit} de {len(branches)} ({format_percent(n_hit, len(branches))})")
+        print(f"Programas guardados em {out_dir}: {len(kept)}")
+        for p in kept:
+            print(f"  {p.name}")
+        if failed:
+            print(f"Simulações com falha: {failed} (programas em {out_dir / 'falhas'})")
+        left = Counter(kind_by_branch[p.name] or "?" for p in branches if p.name not in covered)
+        if left:
+            print("Branches não cobertos por instrução: " + ", ".join(f"{k} {n}" for k, n in left.most_common()))
+        return 1 if failed else 0
+
+    if args.work:
+        work = (repo_root / args.work).resolve()
+        work.mkdir(parents=True, exist_ok=True)
+        return run_in(work)
+    with tempfile.TemporaryDirectory(prefix="mips_gen_") as td:
+        return run_in(Path(td))
+
+
+def _keep_failure(fail_dir: Path, program: Path, result: JobResult) -> None:
+    # A failing program is a reproducer: keep it with the reason.
+    fail_dir.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(program, fail_dir / program.name)
+    (fail_dir / f"{program.stem}.txt").write_text(f"{result.name}: {result.message}\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,422 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+
+from coverage_db import CoverageDb
+from lockstep import LockstepChecker, format_divergence
+from mips_asm import AsmError
+from mips_model import MipsModel
+from rtl_line_branch_coverage import (
+    HITS_FILE,
+    Probe,
+    ProbeHits,
+    build_line_coverage,
+    build_report,
+    compile_vvp,
+    emitted_probe_names,
+    expand_block_stats,
+    instrument_rtl,
+    packed_probe_bits,
+    read_hits_file,
+    read_rtl_texts,
+    read_sources,
+    run_vvp,
+    strip_dump_calls,
+)
+from vcd_coverage import ToggleCoverage, format_percent, should_ignore_for_coverage
+from vcd_reader import VcdConsumer
+from vcd_trace import read_dump
+from verilog_parser import parse_modules, string_argument, tokenize
+
+_PROGRAM_NAME = "intruction.hex"  # what intr_mem_model.v loads with $readmemh
+
+
+@dataclass(frozen=True)
+class RegressionJob:
+    name: str
+    tb_path: Path
+    top: str
+    vcd_name: str
+    program: Path | None
+    work: Path
+    rtl_paths: tuple[Path, ...]
+    probe_names: frozenset[str]
+    probe_bits: dict[str, dict[int, str]]
+    vvp_cache_dir: Path | None
+    repo_root: Path
+    readout: bool = False
+    lockstep: bool = False
+
+
+@dataclass
+class JobResult:
+    name: str
+    ok: bool
+    message: str = ""
+    vcd: str = ""
+    probe_stats: dict[str, dict[str, int]] = field(default_factory=dict)
+    # Full signal name -> (width, seen0, seen1), so runs of different
+    # testbenches merge by hierarchy path.
+    toggle: dict[str, tuple[int, int, int]] = field(default_factory=dict)
+    scopes: dict[str, str] = field(default_factory=dict)
+    cached_build: bool = False
+
+
+def _expand(patterns: list[str], repo_root: Path) -> list[Path]:
+    out: list[Path] = []
+    for pat in patterns:
+        matches = sorted(glob.glob(str(repo_root / pat))) or [str(repo_root / pat)]
+        for m in matches:
+            p = Path(m).resolve()
+            if p not in out:
+                out.append(p)
+    return out
+
+
+def plan_jobs(
+    *,
+    repo_root: Path,
+    work_root: Path,
+    testbenches: list[Path],
+    programs: list[Path],
+    program_tbs: set[Path],
+    rtl_paths: list[Path],
+    probe_names: frozenset[str],
+    probe_bits: dict[str, dict[int, str]],
+    vvp_cache_dir: Path | None,
+    readout: bool = False,
+    lockstep: bool = False,
+) -> list[RegressionJob]:
+    # One job per testbench, times one per program for the testbenches that
+    # run a program.
+    jobs: list[RegressionJob] = []
+    for tb in testbenches:
+        text = tb.read_text(encoding="utf-8", errors="replace")
+        toks = tokenize(text)
+        modules = parse_modules(toks)
+        top = modules[0].name if modules else tb.stem
+        vcd_name = string_argument(toks, "$dumpfile") or f"{tb.stem}.vcd"
+        variants: list[Path | None] = list(programs) if programs and tb in program_tbs else [None]
+        for prog in variants:
+            name = tb.stem if prog is None else f"{tb.stem}@{prog.stem}"
+            jobs.append(
+                RegressionJob(
+                    name=name,
+                    tb_path=tb,
+                    top=top,
+                    vcd_name=vcd_name,
+                    program=prog,
+                    work=work_root / name.replace("@", "__"),
+                    rtl_paths=tuple(rtl_paths),
+                    probe_names=probe_names,
+                    probe_bits=probe_bits,
+                    vvp_cache_dir=vvp_cache_dir,
+                    repo_root=repo_root,
+                    readout=readout,
+                    lockstep=lockstep,
+                )
+            )
+    return jobs
+
+
+def run_job(job: RegressionJob) -> JobResult:
+    # Compile (or reuse) the simulation, run it in its own work dir and read
+    # its VCD once for probe hits and toggle coverage. Readout jobs run the
+    # testbench without dumping and read only the end-of-run hits file.
+    job.work.mkdir(parents=True, exist_ok=True)
+    for name in (_PROGRAM_NAME, "data.hex"):
+        src = job.repo_root / name
+        if src.exists():
+            shutil.copyfile(src, job.work / name)
+    if job.program is not None:
+        shutil.copyfile(job.program, job.work / _PROGRAM_NAME)
+
+    tb_path = job.tb_path
+    hits_path = job.work / HITS_FILE
+    if job.readout:
+        tb_path = job.work / job.tb_path.name
+        strip_dump_calls(job.tb_path, tb_path)
+        hits_path.unlink(missing_ok=True)
+
+    out_vvp = job.work / f"{job.top}.vvp"
+    try:
+        cached = compile_vvp(
+            repo_root=job.repo_root,
+            tb_path=tb_path,
+            rtl_paths=list(job.rtl_paths),
+            out_vvp=out_vvp,
+            cache_dir=job.vvp_cache_dir,
+            top=job.top,
+        )
+    except (OSError, RuntimeError) as e:
+        return JobResult(name=job.name, ok=False, message=f"compilação: {e}")
+
+    try:
+        rp = run_vvp(out_vvp, cwd=job.work)
+    except OSError as e:
+        return JobResult(name=job.name, ok=False, message=f"simulação: {e}", cached_build=cached)
+    (job.work / "sim.log").write_text(rp.stdout + rp.stderr, encoding="utf-8")
+    if job.readout:
+        if rp.returncode != 0 or not hits_path.exists():
+            msg = f"vvp retornou {rp.returncode}" if rp.returncode != 0 else f"{HITS_FILE} não gerado"
+            return JobResult(name=job.name, ok=False, message=msg, cached_build=cached)
+        # The hits file only says whether a probe was hit.
+        hit = read_hits_file(hits_path, job.probe_bits)
+        return JobResult(name=job.name, ok=True, probe_stats={n: {} for n in hit}, cached_build=cached)
+    vcd_path = job.work / job.vcd_name
+    if rp.returncode != 0 or not vcd_path.exists():
+        msg = f"vvp retornou {rp.returncode}" if rp.returncode != 0 else f"VCD não gerado: {job.vcd_name}"
+        return JobResult(name=job.name, ok=False, message=msg, cached_build=cached)
+
+    hits = ProbeHits(probe_names=set(job.probe_names), probe_bits=job.probe_bits, count_hits=True)
+    toggle = ToggleCoverage()
+    consumers: list[VcdConsumer] = [hits, toggle]
+    checker: LockstepChecker | None = None
+    if job.lockstep:
+        program = job.work / _PROGRAM_NAME
+        checker = LockstepChecker(partial(MipsModel.from_hex, program))
+        consumers.append(checker)
+    try:
+        header, _consumers = read_dump(vcd_path, lambda: consumers)
+    except AsmError as e:
+        return JobResult(name=job.name, ok=False, message=f"lockstep: {e}", vcd=str(vcd_path), cached_build=cached)
+    if checker is not None:
+        checker.finish()
+    if checker is not None and not checker.missing and checker.divergence is not None:
+        # Testbenches without the MIPS core (missing signals) are not checked.
+        lines = format_divergence(checker.divergence)
+        (job.work / "lockstep.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return JobResult(
+            name=job.name, ok=False, message=f"lockstep: {lines[0]}", vcd=str(vcd_path), cached_build=cached
+        )
+    cov = toggle.coverage_by_code()
+    return JobResult(
+        name=job.name,
+        ok=True,
+        vcd=str(vcd_path),
+        probe_stats=hits.probe_stats(),
+        toggle={v.name: (v.width, cov[c].seen0, cov[c].seen1) for c, v in header.vars_by_code.items()},
+        scopes={v.name: header.code_to_scope.get(c, "") for c, v in header.vars_by_code.items()},
+        cached_build=cached,
+    )
+
+
+@dataclass
+class MergedCoverage:
+    # Probe hits and toggle coverage OR-ed over every passing job; hit
+    # counts are summed for counter probes (--hit-counts).
+    probe_hits: dict[str, int] = field(default_factory=dict)
+    probe_tests: dict[str, list[str]] = field(default_factory=dict)
+    toggle: dict[str, tuple[int, int, int]] = field(default_factory=dict)
+    scopes: dict[str, str] = field(default_factory=dict)
+
+    def add(self, result: JobResult) -> None:
+        for name, st in result.probe_stats.items():
+            if "hits" in st:
+                self.probe_hits[name] = self.probe_hits.get(name, 0) + st["hits"]
+            self.probe_tests.setdefault(name, []).append(result.name)
+        for sig, (width, seen0, seen1) in result.toggle.items():
+            prev = self.toggle.get(sig)
+            if prev is not None:
+                seen0 |= prev[1]
+                seen1 |= prev[2]
+            self.toggle[sig] = (width, seen0, seen1)
+            self.scopes[sig] = result.scopes.get(sig, "")
+
+    def toggle_totals(self, include_tb: bool) -> tuple[int, int]:
+        covered = 0
+        total = 0
+        for sig, (width, seen0, seen1) in self.toggle.items():
+            # Each testbench is its own top; the scope path starts with it.
+            scope = self.scopes[sig]
+            if should_ignore_for_coverage(scope, sig, include_tb, top=scope.split(".")[0]):
+                continue
+            covered += (seen0 & seen1).bit_count()
+            total += width
+        return covered, total
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description="Regressão paralela: vários testbenches/programas, cobertura mesclada.")
+    ap.add_argument("--tb", nargs="+", default=["tb/*.v"], help="Testbenches (lista ou glob)")
+    ap.add_argument("--programs", nargs="*", default=[], help="Programas .hex (lista ou glob)")
+    ap.add_argument(
+        "--program-tb",
+        nargs="+",
+        default=["tb/tb_mips_top.v"],
+        help="Testbenches que executam os programas (um job por programa)",
+    )
+    ap.add_argument("--rtl-dir", default=str(Path("rtl")), help="Diretório com RTL (.v)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Processos em paralelo (instrumentação e simulações)")
+    ap.add_argument("--work", default="", help="Diretório de trabalho (mantém um subdiretório por job)")
+    ap.add_argument("--cache-dir", default=".cov_cache", help="Cache de instrumentação e de .vvp")
+    ap.add_argument("--no-cache", action="store_true", help="Sempre re-instrumenta e recompila tudo")
+    ap.add_argument("--packed", action="store_true", help="Probes de cada módulo num único reg vetor")
+    ap.add_argument(
+        "--readout",
+        action="store_true",
+        help=f"Sem VCD: hits lidos de {HITS_FILE} no fim de cada simulação (sem cobertura toggle)",
+    )
+    ap.add_argument(
+        "--hit-counts",
+        action="store_true",
+        help="Probes contadores com o total de hits de cada um (sem --packed/--readout)",
+    )
+    ap.add_argument(
+        "--lockstep",
+        action="store_true",
+        help="Confere cada simulação do MIPS, ciclo a ciclo, com o modelo de referência (mips_model.py)",
+    )
+    ap.add_argument("--include-tb", action="store_true", help="Inclui sinais do testbench na cobertura toggle")
+    ap.add_argument("--json", default="", help="Grava relatório JSON mesclado em arquivo")
+    ap.add_argument("--db", default="", help="Grava cada job como um run no banco de cobertura (SQLite)")
+    ap.add_argument("--run-prefix", default="", help="Prefixo dos nomes de run no banco (ex.: data/seed)")
+    args = ap.parse_args(argv)
+    if args.hit_counts and (args.packed or args.readout):
+        ap.error("--hit-counts não combina com --packed nem com --readout")
+
+    repo_root = Path(__file__).resolve().parent
+    rtl_dir = (repo_root / args.rtl_dir).resolve()
+    rtl_files = sorted([p for p in rtl_dir.glob("*.v") if p.is_file()])
+    if not rtl_files:
+        print(f"Nenhum .v encontrado em {rtl_dir}", file=sys.stderr)
+        return 2
+    testbenches = [p for p in _expand(args.tb, repo_root) if p.exists()]
+    if not testbenches:
+        print("Nenhum testbench encontrado", file=sys.stderr)
+        return 2
+    programs = [p for p in _expand(args.programs, repo_root) if p.exists()]
+    program_tbs = set(_expand(args.program_tb, repo_root))
+
+    cache_root = None if args.no_cache else (repo_root / args.cache_dir).resolve()
+
+    rtl_texts = read_rtl_texts(rtl_files)
+
+    def run_in(work_root: Path) -> int:
+        probes, inst_rtl_files, _reused = instrument_rtl(
+            rtl_files,
+            work_root / "rtl",
+            cache_root / "instrument" if cache_root is not None else None,
+            packed=args.packed,
+            readout=args.readout,
+            jobs=args.jobs,
+            texts=rtl_texts,
+            count=args.hit_counts,
+        )
+        jobs = plan_jobs(
+            repo_root=repo_root,
+            work_root=work_root,
+            testbenches=testbenches,
+            programs=programs,
+            program_tbs=program_tbs,
+            rtl_paths=inst_rtl_files,
+            probe_names=emitted_probe_names(probes),
+            probe_bits=packed_probe_bits(probes),
+            vvp_cache_dir=cache_root / "vvp" if cache_root is not None else None,
+            readout=args.readout,
+            lockstep=args.lockstep and not args.readout,
+        )
+        print(f"Regressão: {len(jobs)} jobs, {max(1, args.jobs)} em paralelo", file=sys.stderr)
+
+        merged = MergedCoverage()
+        results: list[JobResult] = []
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            for result in pool.map(run_job, jobs):
+                results.append(result)
+                if result.ok:
+                    result.probe_stats = expand_block_stats(probes, result.probe_stats)
+                    merged.add(result)
+
+        if args.db:
+            with CoverageDb((repo_root / args.db).resolve()) as db:
+                probe_set = db.add_probes(probes)
+                for r in results:
+                    if r.ok:
+                        db.add_run(
+                            args.run_prefix + r.name,
+                            set(r.probe_stats),
+                            source=r.vcd,
+                            probe_stats=r.probe_stats if args.hit_counts else None,
+                            probe_set=probe_set,
+                        )
+
+        return _print_report(args, repo_root, rtl_files, read_sources(rtl_files, rtl_texts), probes, results, merged)
+
+    if args.work:
+        work = (repo_root / args.work).resolve()
+        work.mkdir(parents=True, exist_ok=True)
+        return run_in(work)
+    with tempfile.TemporaryDirectory(prefix="mips_regr_") as td:
+        return run_in(Path(td))
+
+
+def _print_report(
+    args: argparse.Namespace,
+    repo_root: Path,
+    rtl_files: list[Path],
+    sources: dict[str, list[str]],
+    probes: list[Probe],
+    results: list[JobResult],
+    merged: MergedCoverage,
+) -> int:
+    print("=================================================================")
+    print("Regressão")
+    print("=================================================================")
+    for r in results:
+        status = "OK  " if r.ok else "FALHA"
+        extra = " (vvp do cache)" if r.cached_build else ""
+        print(f"- {status} {r.name}{extra}{': ' + r.message if r.message else ''}")
+
+    hit_names = set(merged.probe_tests)
+    stats: dict[str, dict[str, int]] = {name: {"tests": len(tests)} for name, tests in merged.probe_tests.items()}
+    for name, n in merged.probe_hits.items():
+        stats[name]["hits"] = n
+    report = build_report(probes, hit_names, stats)
+    files: dict[str, dict[str, object]] = report["files"]  # type: ignore[assignment]
+    line_cov = build_line_coverage(
+        repo_root=repo_root, rtl_files=rtl_files, probes=probes, hit_probe_names=hit_names, sources=sources
+    )
+    for f in rtl_files:
+        fp = str(f.resolve())
+        statuses = line_cov.get(fp, {})
+        agg = files.get(fp)
+        if agg is None:
+            continue
+        agg["lines_total"] = sum(1 for st in statuses.values() if st != "na")
+        agg["lines_hit"] = sum(1 for st in statuses.values() if st == "cov")
+        agg["uncovered_lines"] = [{"line": ln, "detail": "line"} for ln, st in sorted(statuses.items()) if st == "uncov"]
+
+    print("")
+    print("RTL line/branch coverage (mesclada)")
+    for file_path, agg in sorted(files.items(), key=lambda kv: kv[0]):
+        lt = int(agg["lines_total"])
+        lh = int(agg["lines_hit"])
+        bt = int(agg["branches_total"])
+        bh = int(agg["branches_hit"])
+        print(f"- {Path(file_path).name}: lines {lh}/{lt} ({format_percent(lh, lt)}), branches {bh}/{bt} ({format_percent(bh, bt)})")
+
+    covered, total = merged.toggle_totals(args.include_tb)
+    print("")
+    if args.readout:
+        print("Toggle: n/a (sem VCD no modo --readout)")
+    else:
+        print(f"Toggle (mesclado): {covered}/{total} bits ({format_percent(covered, total)})")
+
+    if args.json:
+        report["tests"] = [{"name": r.name, "ok": r.ok, "message": r.message, "vcd": r.vcd} for r in results]
+        report["toggle"] = {"covered": covered, "total": total}
+        out_json = (repo_root / args.json).resolve()
+        out_json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0 if all(r.ok for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -1,12 +1,34 @@
 import argparse
+import hashlib
 import json
-import re
+import os
+import shutil
 import subprocess
 import sys
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 
+from coverage_db import CoverageDb
+from vcd_reader import VcdConsumer, VcdHeader, read_vcd
+from vcd_trace import TraceColumn, is_trace, read_dump, read_trace
+from verilog_parser import (
+    Block,
+    CaseStmt,
+    IfStmt,
+    LoopStmt,
+    Module,
+    NullStmt,
+    SimpleStmt,
+    Stmt,
+    TimedStmt,
+    parse_modules,
+    system_calls,
+    tokenize,
+)
+
 
 @dataclass(frozen=True)
 class Probe:
@@ -15,102 +37,193 @@ class Probe:
     file: str
     line: int
     detail: str
+    # Line probes inside a straight-line run share the reg of the run's first
+    # probe (`block`); they get no reg of their own and are hit with it.
+    block: str | None = None
+    # Packed instrumentation: the probe is bit `bit` of the module's probe
+    # vector reg `vec` instead of a reg of its own.
+    vec: str | None = None
+    bit: int | None = None
 
 
-@dataclass(frozen=True)
-class VcdVar:
-    code: str
-    name: str
-    width: int
-
+_XZ_TO_ZERO = bytes.maketrans(b"xXzZ", b"0000")
 
-def _hier_join(stack: list[str], ref: str) -> str:
-    if not stack:
-        return ref
-    return ".".join(stack + [ref])
 
+def _vector_ones(value: "str | bytes") -> int:
+    # Bits that are 1 in a VCD vector value; x/z count as not hit.
+    if isinstance(value, str):
+        value = value.encode("ascii")
+    try:
+        return int(value.translate(_XZ_TO_ZERO), 2)
+    except ValueError:
+        return 0
 
-def parse_vcd_definitions(vcd_path: Path) -> dict[str, VcdVar]:
-    vars_by_code: dict[str, VcdVar] = {}
-    scope_stack: list[str] = []
 
-    with vcd_path.open("r", encoding="utf-8", errors="replace") as f:
-        for raw in f:
-            line = raw.strip()
-            if not line:
-                continue
-            if line.startswith("$scope"):
-                parts = line.split()
-                if len(parts) >= 3:
-                    scope_stack.append(parts[2])
+class ProbeHits(VcdConsumer):
+    # Records which probe regs were ever hit and when they first were.
+    # Probes are either given as VCD id codes or as reg names, resolved
+    # against the header in `begin`. Packed probes are given per vector reg
+    # name as {bit: probe name}; a hit is a bit rising to 1. Probes
+    # instrumented as counters (`count=True`, wider than one bit) also give
+    # their number of hits: the counter's last value. Without `count_hits`
+    # the read stops once every probe is hit, so counts would be partial.
+    timed = True
+
+    def __init__(
+        self,
+        *,
+        target_codes: set[str] | None = None,
+        probe_names: set[str] | None = None,
+        probe_bits: dict[str, dict[int, str]] | None = None,
+        count_hits: bool = False,
+    ) -> None:
+        self.target_codes: set[str] = set(target_codes or ())
+        self.probe_names: set[str] = set(probe_names or ())
+        self.probe_bits = probe_bits or {}
+        self.count_hits = count_hits
+        self.probe_code_by_name: dict[str, str] = {}
+        self.hit: set[str] = set()
+        self.first_hit_time: dict[str, int] = {}
+        # Counter probes, and the latest value of each.
+        self.counter_codes: set[str] = set()
+        self.hit_count: dict[str, int] = {}
+        # Packed vectors: per code, bit -> hit key ("<code> <bit>"), and the
+        # latest value seen.
+        self.vec_keys: dict[str, dict[int, str]] = {}
+        self.vec_last: dict[str, int] = {}
+        self.expected = 0
+
+    def begin(self, header: VcdHeader) -> None:
+        if self.probe_names or self.probe_bits:
+            for code, vv in header.vars_by_code.items():
+                leaf = vv.name.split(".")[-1]
+                if leaf in self.probe_names:
+                    self.probe_code_by_name[leaf] = code
+                    self.target_codes.add(code)
+                    if vv.width > 1:
+                        self.counter_codes.add(code)
+                bits = self.probe_bits.get(leaf)
+                if bits is not None:
+                    keys = self.vec_keys.setdefault(code, {})
+                    for bit, name in bits.items():
+                        keys[bit] = self.probe_code_by_name[name] = f"{code} {bit}"
+        self.expected = len(self.target_codes) + sum(len(k) for k in self.vec_keys.values())
+        self.codes = self.target_codes | set(self.vec_keys)
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        if ch == "1" and code not in self.hit:
+            self.hit.add(code)
+            self.first_hit_time[code] = self.now
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        self._vector_change(code, _vector_ones(value), self.now)
+
+    def _vector_change(self, code: str, ones: int, t: int) -> None:
+        if code in self.counter_codes:
+            if ones:
+                if code not in self.hit:
+                    self.hit.add(code)
+                    self.first_hit_time[code] = t
+                self.hit_count[code] = ones
+            return
+        keys = self.vec_keys.get(code)
+        if keys is None:
+            return
+        prev = self.vec_last.get(code, 0)
+        self.vec_last[code] = ones
+        rising = ones & ~prev
+        while rising:
+            low = rising & -rising
+            rising ^= low
+            key = keys.get(low.bit_length() - 1)
+            if key is None:
                 continue
-            if line.startswith("$upscope"):
-                if scope_stack:
-                    scope_stack.pop()
-                continue
-            if line.startswith("$var"):
-                parts = line.split()
-                if len(parts) < 5:
-                    continue
-                width = int(parts[2])
-                code = parts[3]
-                ref = parts[4]
-                full_name = _hier_join(scope_stack, ref)
-                vars_by_code[code] = VcdVar(code=code, name=full_name, width=width)
-                continue
-            if line.startswith("$enddefinitions"):
-                break
+            if key not in self.hit:
+                self.hit.add(key)
+                self.first_hit_time[key] = t
+
+    def on_signal(self, code: str, column: TraceColumn) -> None:
+        if code in self.vec_keys or code in self.counter_codes:
+            for t, v in zip(column.times, column.values):
+                self._vector_change(code, _vector_ones(v), t)
+            return
+        if "1" not in column.distinct_values():
+            return
+        self.hit.add(code)
+        self.first_hit_time[code] = column.times[column.values.index("1")]
+
+    def done(self) -> bool:
+        return not self.count_hits and len(self.hit) == self.expected
+
+    def hit_probe_names(self) -> set[str]:
+        return {name for name, code in self.probe_code_by_name.items() if code in self.hit}
+
+    def probe_stats(self) -> dict[str, dict[str, int]]:
+        # Per hit probe name: first-hit timestamp, and number of hits for
+        # counter probes.
+        out: dict[str, dict[str, int]] = {}
+        for name, code in self.probe_code_by_name.items():
+            if code in self.hit:
+                out[name] = {"first_hit": self.first_hit_time[code]}
+                if code in self.hit_count:
+                    out[name]["hits"] = self.hit_count[code]
+        return out
+
+    def merge(self, other: "ProbeHits") -> None:
+        # `other` covers a later chunk: earlier first hits win, and its
+        # counter values are the latest.
+        for code, t in other.first_hit_time.items():
+            self.first_hit_time.setdefault(code, t)
+        self.hit_count.update(other.hit_count)
+        self.vec_last.update(other.vec_last)
+        self.hit |= other.hit
+
+
+def emitted_probe_names(probes: list[Probe]) -> frozenset[str]:
+    # The probes that own a scalar reg in the instrumented RTL (and the VCD).
+    return frozenset(p.name for p in probes if p.block is None and p.vec is None)
+
+
+def packed_probe_bits(probes: list[Probe]) -> dict[str, dict[int, str]]:
+    # Probe vector reg name -> {bit: probe name}, for ProbeHits.
+    out: dict[str, dict[int, str]] = {}
+    for p in probes:
+        if p.vec is not None and p.bit is not None:
+            out.setdefault(p.vec, {})[p.bit] = p.name
+    return out
 
-    return vars_by_code
 
+def expand_block_hits(probes: list[Probe], hit_names: set[str]) -> set[str]:
+    return {p.name for p in probes if (p.block or p.name) in hit_names}
 
-def parse_vcd_scalar_ones(vcd_path: Path, target_codes: set[str]) -> set[str]:
-    hit: set[str] = set()
-    if not target_codes:
-        return hit
 
-    with vcd_path.open("r", encoding="utf-8", errors="replace") as f:
-        in_dump = False
-        for raw in f:
-            line = raw.strip()
-            if not line:
-                continue
-            if not in_dump:
-                if line.startswith("$enddefinitions"):
-                    in_dump = True
-                continue
-            if line.startswith("$") or line[0] == "#":
-                continue
-            if line[0] not in "01xXzZ":
-                continue
-            code = line[1:].strip()
-            if code not in target_codes or code in hit:
-                continue
-            ch = line[0]
-            if ch == "1":
-                hit.add(code)
-                if len(hit) == len(target_codes):
-                    return hit
-    return hit
+def expand_block_stats(probes: list[Probe], stats: dict[str, dict[str, int]]) -> dict[str, dict[str, int]]:
+    # Every probe of a block inherits the first hit and hit count of its reg.
+    return {p.name: stats[p.block or p.name] for p in probes if (p.block or p.name) in stats}
 
 
-_RE_MODULE = re.compile(r"^\s*module\s+([a-zA-Z_][a-zA-Z0-9_$]*)\b")
-_RE_ENDMODULE = re.compile(r"^\s*endmodule\b")
-_RE_ALWAYS_OR_INITIAL = re.compile(r"^\s*(always|initial)\b")
-_RE_BEGIN = re.compile(r"^\s*begin\b")
-_RE_END = re.compile(r"^\s*end\b")
-_RE_ELSE = re.compile(r"^\s*else\b")
-_RE_IF = re.compile(r"^\s*if\s*\(")
-_RE_CASE = re.compile(r"^\s*case(z|x)?\s*\(")
-_RE_ENDCASE = re.compile(r"^\s*endcase\b")
-_RE_CASE_ITEM = re.compile(r"^\s*(default\s*:|[^:\s][^:]*:)\s*(begin\b)?\s*$")
+def _probe_consumers(
+    probe_names: frozenset[str],
+    count_hits: bool = False,
+    probe_bits: dict[str, dict[int, str]] | None = None,
+) -> list[VcdConsumer]:
+    return [ProbeHits(probe_names=set(probe_names), probe_bits=probe_bits, count_hits=count_hits)]
+
+
+def parse_vcd_scalar_ones(vcd_path: Path, target_codes: set[str]) -> set[str]:
+    if not target_codes:
+        return set()
+    hits = ProbeHits(target_codes=target_codes)
+    if is_trace(vcd_path):
+        read_trace(vcd_path, [hits])
+    else:
+        read_vcd(vcd_path, [hits])
+    return hits.hit
 
 
-def _strip_inline_comment(s: str) -> str:
-    idx = s.find("//")
-    if idx == -1:
-        return s
-    return s[:idx]
+# Simple statements after which the next one is not guaranteed to run right
+# away: intra-assignment delays/event waits and anything that ends the process.
+_BLOCK_BREAK_TOKENS = frozenset(("#", "@", "disable", "$finish", "$stop"))
 
 
 def _escape_html(s: str) -> str:
@@ -123,437 +236,423 @@ def _escape_html(s: str) -> str:
     )
 
 
-def instrument_verilog_file(src_path: Path, dst_path: Path, *, probe_start_id: int) -> tuple[list[Probe], int]:
-    src_lines = src_path.read_text(encoding="utf-8", errors="replace").splitlines(keepends=True)
-
-    def indent_of(s: str) -> str:
-        m = re.match(r"^\s*", s)
-        return m.group(0) if m else ""
-
-    def child_indent(indent: str) -> str:
-        return indent + ("\t" if "\t" in indent else "    ")
-
-    def emit_probe_stmt(indent: str, probe_name: str) -> str:
-        return f"{indent}{probe_name} = 1'b1;\n"
-
-    def instrument_module_chunk(chunk_lines: list[str], *, start_line_no: int, probe_id_in: int) -> tuple[list[str], list[Probe], int]:
-        probe_id = probe_id_in
-        chunk_out: list[str] = []
-        chunk_probes: list[Probe] = []
-        
-        # Track artificial 'begin' blocks opened for 'else case' or 'if case'
-        # Maps case_depth -> number of 'end's to insert after endcase at that depth
-        pending_ends: dict[int, int] = {}
+def instrument_verilog_file(
+    src_path: Path,
+    dst_path: Path,
+    *,
+    probe_start_id: int,
+    packed: bool = False,
+    readout: bool = False,
+    count: bool = False,
+    text: str | None = None,
+) -> tuple[list[Probe], int]:
+    # `packed` makes each module's probes bits of one `__cov_vec_<module>`
+    # reg instead of one scalar reg each; probe ids and names do not change.
+    # `readout` (implies packed) also has every module instance append its
+    # vector to HITS_FILE from a final block, so no VCD is needed. `count`
+    # (not with packed) makes each probe a 32-bit counter incremented on
+    # every hit instead of a reg set to 1, for exact hit counts.
+    #
+    # The source is tokenized and parsed once (verilog_parser); probes and
+    # the begin/end they need are then inserted at token boundaries, on the
+    # lines of the statements they cover, so the instrumented file keeps the
+    # source's line numbers. `text` is the source when the caller already
+    # read it.
+    packed = packed or readout
+    if count and packed:
+        raise ValueError("probes contadores não podem ser empacotados")
+    if text is None:
+        text = src_path.read_text(encoding="utf-8", errors="replace")
+    toks = tokenize(text)
+    edits: list[tuple[int, str]] = []
+    all_probes: list[Probe] = []
+    probe_id = probe_start_id
 
+    def instrument_module(mod: Module) -> None:
+        nonlocal probe_id
         used_probe_names: list[str] = []
+        probe_targets: dict[str, str] = {}
+        vec_name = f"__cov_vec_{mod.name}" if packed else None
+        # One line probe per source line.
+        probed_lines: set[int] = set()
 
-        def new_probe(kind: str, abs_line_no: int, detail: str) -> str:
+        def new_probe(kind: str, line: int, detail: str, block: str | None = None) -> str:
             nonlocal probe_id
             probe_id += 1
-            name = f"__cov_{'L' if kind == 'line' else 'B'}{probe_id:06d}"
-            chunk_probes.append(Probe(name=name, kind=kind, file=str(src_path), line=abs_line_no, detail=detail))
-            used_probe_names.append(name)
+            name = f"__cov_{'L' if kind == 'line' else 'B'}{probe_id:09d}"
+            vec = bit = None
+            if block is None and vec_name is not None:
+                vec, bit = vec_name, len(used_probe_names)
+                probe_targets[name] = f"{vec}[{bit}]"
+            all_probes.append(
+                Probe(name=name, kind=kind, file=str(src_path), line=line, detail=detail, block=block, vec=vec, bit=bit)
+            )
+            if block is None:
+                used_probe_names.append(name)
             return name
 
-        mod_indent = indent_of(chunk_lines[0]) if chunk_lines else ""
-        port_end_idx: int | None = None
-        for k, raw in enumerate(chunk_lines):
-            s = _strip_inline_comment(raw).strip()
-            if ");" in s:
-                port_end_idx = k
-                break
-        if port_end_idx is None:
-            port_end_idx = 0
-
-        # Find safe insertion point for declarations (after params/ports, before procedures)
-        insertion_idx = port_end_idx + 1
-        
-        # Keywords that indicate we must stop scanning and insert before them
-        _STOP_KEYWORDS = (
-            "always", "initial", "assign", "module", "primitive", 
-            "task", "function", "generate", "endmodule"
-        )
-        # Keywords that allow us to continue (declarations)
-        _DECL_KEYWORDS = (
-            "parameter", "localparam", "defparam",
-            "input", "output", "inout",
-            "reg", "wire", "integer", "real", "time", "genvar",
-            "tri", "tri0", "tri1", "wand", "wor", "event"
-        )
-
-        scan_i = insertion_idx
-        while scan_i < len(chunk_lines):
-            raw_s = chunk_lines[scan_i]
-            s_stripped = _strip_inline_comment(raw_s).strip()
-            if not s_stripped:
-                scan_i += 1
-                continue
-            
-            # Check for stop keywords
-            first_word = s_stripped.split()[0] if s_stripped else ""
-            # Handle cases like "always @..." or "assign x = ..."
-            if first_word in _STOP_KEYWORDS:
-                break
-                
-            # If it's a declaration, we can skip past it (insert after)
-            if first_word in _DECL_KEYWORDS:
-                insertion_idx = scan_i + 1
-            
-            # If we see logic-like symbols not in a declaration context, maybe stop?
-            # But relying on keywords is safer for top-level module items.
-            
-            scan_i += 1
-
-        chunk_out.extend(chunk_lines[: insertion_idx])
-        chunk_out.append("__COV_DECLS__\n")
-
-        i = insertion_idx
-
-        in_proc = False
-        proc_depth = 0
-        awaiting_proc_begin = False
-        pending_then_branch_probe: str | None = None
-        pending_else_branch_probe: str | None = None
-        pending_case_item_probe: str | None = None
-        case_depth = 0
-
-        def next_stmt_index(from_idx: int) -> int | None:
-            k = from_idx
-            while k < len(chunk_lines):
-                s = _strip_inline_comment(chunk_lines[k]).strip()
-                if s:
-                    return k
-                k += 1
-            return None
-
-        while i < len(chunk_lines):
-            raw = chunk_lines[i]
-            abs_line = start_line_no + i
-            stripped = _strip_inline_comment(raw).strip()
-
-            if _RE_ENDMODULE.match(raw):
-                chunk_out.append(raw)
-                break
-
-            if (not in_proc) and stripped.startswith("assign"):
-                indent = indent_of(raw)
-                body_indent = child_indent(indent)
-                j = i
-                stmt_lines: list[tuple[int, str]] = []
-                while j < len(chunk_lines):
-                    rj = chunk_lines[j]
-                    sj = _strip_inline_comment(rj).strip()
-                    stmt_lines.append((start_line_no + j, rj))
-                    if ";" in sj:
-                        break
-                    j += 1
-                line_probe_names: list[str] = []
-                for abs_ln, rj in stmt_lines:
-                    if _strip_inline_comment(rj).strip():
-                        line_probe_names.append(new_probe("line", abs_ln, "assign"))
-                for _abs_ln, rj in stmt_lines:
-                    chunk_out.append(rj)
-                first_code = _strip_inline_comment(stmt_lines[0][1]).strip()
-                m_lhs = re.match(r"^\s*assign\s+(.*?)\s*=", first_code)
-                lhs_expr = m_lhs.group(1) if m_lhs else ""
-                toks = re.findall(r"[A-Za-z_][A-Za-z0-9_$]*", lhs_expr)
-                seen: set[str] = set()
-                uniq_toks: list[str] = []
-                for t in toks:
-                    if t not in seen:
-                        seen.add(t)
-                        uniq_toks.append(t)
-                if uniq_toks:
-                    ev = " or ".join(uniq_toks)
-                    chunk_out.append(f"{indent}always @({ev}) begin\n")
-                    for pn in line_probe_names:
-                        chunk_out.append(emit_probe_stmt(body_indent, pn))
-                    chunk_out.append(f"{indent}end\n")
+        def probe_stmt(name: str) -> str:
+            if count:
+                return f"{name} = {name} + 1;"
+            return f"{probe_targets.get(name, name)} = 1'b1;"
+
+        def insert_probe(tok_index: int, name: str) -> None:
+            edits.append((toks[tok_index].start, probe_stmt(name) + " "))
+
+        def line_probes(first: int, last: int, detail: str, head: str | None) -> str | None:
+            # Line probes for the lines of tokens first..last. They join the
+            # basic block of `head` when there is one; otherwise the first
+            # starts a new block, emitted in front of token `first`.
+            for i in range(first, last + 1):
+                line = toks[i].line
+                if line in probed_lines:
+                    continue
+                probed_lines.add(line)
+                if head is not None:
+                    new_probe("line", line, detail, block=head)
                 else:
-                    chunk_out.append(f"{indent}initial begin\n")
-                    for pn in line_probe_names:
-                        chunk_out.append(emit_probe_stmt(body_indent, pn))
-                    chunk_out.append(f"{indent}end\n")
-                i = j + 1
-                continue
-
-            if _RE_ALWAYS_OR_INITIAL.match(raw):
-                chunk_out.append(raw)
-                in_proc = True
-                proc_depth = 0
-                awaiting_proc_begin = True
-                if re.search(r"\bbegin\b", stripped) is not None:
-                    proc_depth = 1
-                    awaiting_proc_begin = False
-                i += 1
+                    head = new_probe("line", line, detail)
+                    insert_probe(first, head)
+            return head
+
+        def visit_branch(stmt: Stmt, probe: str | None) -> None:
+            # A statement in a position where only one statement may appear
+            # (branch, loop or process body), entered with its own probe.
+            if isinstance(stmt, Block) and not stmt.parallel:
+                if probe is not None:
+                    insert_probe(stmt.body_start, probe)
+                head = probe
+                for s in stmt.stmts:
+                    head = visit(s, head)
+                return
+            edits.append((toks[stmt.first].start, "begin " + (probe_stmt(probe) + " " if probe else "")))
+            visit(stmt, probe)
+            edits.append((toks[stmt.last].end, " end"))
+
+        def visit(stmt: Stmt, head: str | None) -> str | None:
+            # Instruments `stmt` inside the basic block of `head`; returns the
+            # block the next statement falls into (None when control joins).
+            if isinstance(stmt, NullStmt):
+                return head
+            if isinstance(stmt, SimpleStmt):
+                head = line_probes(stmt.first, stmt.last, "stmt", head)
+                if any(toks[i].text in _BLOCK_BREAK_TOKENS for i in range(stmt.first, stmt.last + 1)):
+                    return None
+                return head
+            if isinstance(stmt, Block):
+                if stmt.parallel:
+                    for s in stmt.stmts:
+                        visit_branch(s, None)
+                    return None
+                for s in stmt.stmts:
+                    head = visit(s, head)
+                return head
+            if isinstance(stmt, IfStmt):
+                line_probes(stmt.first, stmt.cond_last, "if", head)
+                visit_branch(stmt.then, new_probe("branch", toks[stmt.first].line, "if_true"))
+                if stmt.else_ is not None:
+                    visit_branch(stmt.else_, new_probe("branch", toks[stmt.else_tok].line, "else"))
+                return None
+            if isinstance(stmt, CaseStmt):
+                line_probes(stmt.first, stmt.expr_last, "case", head)
+                for item in stmt.items:
+                    visit_branch(item.stmt, new_probe("branch", toks[item.first].line, "case_item"))
+                return None
+            if isinstance(stmt, LoopStmt):
+                line_probes(stmt.first, stmt.header_last, "stmt", head)
+                visit_branch(stmt.body, None)
+                return None
+            if isinstance(stmt, TimedStmt):
+                line_probes(stmt.first, stmt.control_last, "stmt", head)
+                if not isinstance(stmt.body, NullStmt):
+                    visit_branch(stmt.body, None)
+                return None
+            raise TypeError(stmt)
+
+        # Declarations go right after the module header, on its last line.
+        decl_at = len(edits)
+        for a in mod.assigns:
+            # One continuous assignment is one block, hit whenever its
+            # left-hand side is (re)evaluated.
+            head: str | None = None
+            for i in range(a.first, a.last + 1):
+                line = toks[i].line
+                if line not in probed_lines:
+                    probed_lines.add(line)
+                    name = new_probe("line", line, "assign", block=head)
+                    head = head or name
+            if head is None:
                 continue
+            ev = f"always @({' or '.join(a.lhs)})" if a.lhs else "initial"
+            edits.append((toks[a.last].end, f" {ev} begin {probe_stmt(head)} end"))
+        for proc in mod.processes:
+            # The event control of an always block is not a statement of its own.
+            stmt = proc.stmt
+            if isinstance(stmt, TimedStmt):
+                stmt = stmt.body
+            visit_branch(stmt, None)
+
+        decls = ""
+        if used_probe_names:
+            if vec_name is not None:
+                decls = f" reg [{len(used_probe_names) - 1}:0] {vec_name};"
+                if readout:
+                    decls += (
+                        f' integer __cov_fd; final begin __cov_fd = $fopen("{HITS_FILE}", "a");'
+                        f' $fwrite(__cov_fd, "%m {vec_name} %b\\n", {vec_name}); $fclose(__cov_fd); end'
+                    )
+            elif count:
+                decls = "".join(f" reg [31:0] {p} = 0;" for p in used_probe_names)
+            else:
+                decls = "".join(f" reg {p};" for p in used_probe_names)
+        edits.insert(decl_at, (toks[mod.header_last].end, decls))
+
+    for mod in parse_modules(toks):
+        instrument_module(mod)
+
+    # Stable sort: insertions at one offset keep the order they were made in,
+    # which nests the begin/end pairs correctly.
+    edits.sort(key=lambda e: e[0])
+    out: list[str] = []
+    pos = 0
+    for offset, ins in edits:
+        out.append(text[pos:offset])
+        out.append(ins)
+        pos = offset
+    out.append(text[pos:])
+    dst_path.write_text("".join(out), encoding="utf-8", errors="replace")
+    return all_probes, probe_id
 
-            if in_proc and awaiting_proc_begin:
-                chunk_out.append(raw)
-                if _RE_BEGIN.match(stripped) or stripped.endswith("begin"):
-                    proc_depth = 1
-                    awaiting_proc_begin = False
-                i += 1
-                continue
-
-            if in_proc:
-                if _RE_BEGIN.match(stripped) or stripped == "begin":
-                    proc_depth += 1
-                    chunk_out.append(raw)
-                    begin_indent = child_indent(indent_of(raw))
-                    if pending_then_branch_probe is not None:
-                        chunk_out.append(emit_probe_stmt(begin_indent, pending_then_branch_probe))
-                        pending_then_branch_probe = None
-                    elif pending_else_branch_probe is not None:
-                        chunk_out.append(emit_probe_stmt(begin_indent, pending_else_branch_probe))
-                        pending_else_branch_probe = None
-                    elif pending_case_item_probe is not None:
-                        chunk_out.append(emit_probe_stmt(begin_indent, pending_case_item_probe))
-                        pending_case_item_probe = None
-                    i += 1
-                    continue
-
-                if _RE_END.match(stripped) or stripped == "end":
-                    proc_depth = max(0, proc_depth - 1)
-                    chunk_out.append(raw)
-                    if proc_depth == 0:
-                        in_proc = False
-                        awaiting_proc_begin = False
-                        case_depth = 0
-                    i += 1
-                    continue
-
-                if _RE_ENDCASE.match(stripped):
-                    # We do NOT emit a probe before endcase because it would be inside the case statement
-                    # (between the last item and endcase), which is invalid syntax in Verilog.
-                    # line_probe = new_probe("line", abs_line, "endcase")
-                    # chunk_out.append(emit_probe_stmt(indent_of(raw), line_probe))
-                    
-                    chunk_out.append(raw)
-                    if case_depth > 0:
-                        case_depth -= 1
-                    
-                    pe = pending_ends.get(case_depth, 0)
-                    if pe > 0:
-                        chunk_out.append(f"{indent_of(raw)}end\n" * pe)
-                        pending_ends[case_depth] = 0
-
-                    i += 1
-                    continue
-
-                if proc_depth == 0:
-                    chunk_out.append(raw)
-                    i += 1
-                    continue
-
-                if _RE_ELSE.match(stripped):
-                    if re.search(r"\bbegin\b", stripped) is not None:
-                        pending_else_branch_probe = new_probe("branch", abs_line, "else")
-                        chunk_out.append(raw)
-                        i += 1
-                        continue
-                    nxt = next_stmt_index(i + 1)
-                    if nxt is not None:
-                        nxt_s = _strip_inline_comment(chunk_lines[nxt]).strip()
-                        if nxt_s and not _RE_BEGIN.match(nxt_s) and not _RE_IF.match(nxt_s):
-                            if _RE_CASE.match(nxt_s):
-                                raw_no_nl = raw[:-1] if raw.endswith("\n") else raw
-                                if "//" in raw_no_nl:
-                                    code_part, comment_part = raw_no_nl.split("//", 1)
-                                    comment_part = "//" + comment_part
-                                else:
-                                    code_part, comment_part = raw_no_nl, ""
-
-                                br = new_probe("branch", abs_line, "else")
-                                indent = indent_of(raw)
-                                chunk_out.append(f"{code_part.rstrip()} begin {comment_part}\n" if comment_part else f"{code_part.rstrip()} begin\n")
-                                body_indent = child_indent(indent)
-                                chunk_out.append(emit_probe_stmt(body_indent, br))
-                                
-                                pending_ends[case_depth] = pending_ends.get(case_depth, 0) + 1
-                                
-                                # Do NOT advance i to nxt. Let the loop handle the case statement.
-                                # But we MUST consume the else line.
-                                i += 1
-                                continue
-                            
-                            raw_no_nl = raw[:-1] if raw.endswith("\n") else raw
-                            if "//" in raw_no_nl:
-                                code_part, comment_part = raw_no_nl.split("//", 1)
-                                comment_part = "//" + comment_part
-                            else:
-                                code_part, comment_part = raw_no_nl, ""
-
-                            br = new_probe("branch", abs_line, "else")
-                            ln_body = new_probe("line", start_line_no + nxt, "stmt")
-                            indent = indent_of(raw)
-                            chunk_out.append(f"{code_part.rstrip()} begin {comment_part}\n" if comment_part else f"{code_part.rstrip()} begin\n")
-                            body_indent = child_indent(indent)
-                            chunk_out.append(emit_probe_stmt(body_indent, br))
-                            chunk_out.append(emit_probe_stmt(body_indent, ln_body))
-                            chunk_out.append(f"{body_indent}{_strip_inline_comment(chunk_lines[nxt]).strip()}\n")
-                            chunk_out.append(f"{indent}end\n")
-                            i = nxt + 1
-                            continue
-
-                    pending_else_branch_probe = new_probe("branch", abs_line, "else")
-                    chunk_out.append(raw)
-                    i += 1
-                    continue
-
-                if _RE_IF.match(stripped):
-                    line_probe = new_probe("line", abs_line, "if")
-                    chunk_out.append(emit_probe_stmt(indent_of(raw), line_probe))
-
-                    if "begin" not in stripped:
-                        nxt = next_stmt_index(i + 1)
-                        if nxt is not None:
-                            nxt_s = _strip_inline_comment(chunk_lines[nxt]).strip()
-                            if nxt_s and not _RE_BEGIN.match(nxt_s) and not _RE_ELSE.match(nxt_s):
-                                if _RE_CASE.match(nxt_s):
-                                    raw_no_nl = raw[:-1] if raw.endswith("\n") else raw
-                                    if "//" in raw_no_nl:
-                                        code_part, comment_part = raw_no_nl.split("//", 1)
-                                        comment_part = "//" + comment_part
-                                    else:
-                                        code_part, comment_part = raw_no_nl, ""
-
-                                    br = new_probe("branch", abs_line, "if_true")
-                                    indent = indent_of(raw)
-                                    chunk_out.append(f"{code_part.rstrip()} begin {comment_part}\n" if comment_part else f"{code_part.rstrip()} begin\n")
-                                    body_indent = child_indent(indent)
-                                    chunk_out.append(emit_probe_stmt(body_indent, br))
-                                    
-                                    pending_ends[case_depth] = pending_ends.get(case_depth, 0) + 1
-                                    
-                                    i += 1
-                                    continue
-                                
-                                raw_no_nl = raw[:-1] if raw.endswith("\n") else raw
-                                if "//" in raw_no_nl:
-                                    code_part, comment_part = raw_no_nl.split("//", 1)
-                                    comment_part = "//" + comment_part
-                                else:
-                                    code_part, comment_part = raw_no_nl, ""
-
-                                br = new_probe("branch", abs_line, "if_true")
-                                ln_body = new_probe("line", start_line_no + nxt, "stmt")
-                                indent = indent_of(raw)
-                                chunk_out.append(f"{code_part.rstrip()} begin {comment_part}\n" if comment_part else f"{code_part.rstrip()} begin\n")
-                                body_indent = child_indent(indent)
-                                chunk_out.append(emit_probe_stmt(body_indent, br))
-                                chunk_out.append(emit_probe_stmt(body_indent, ln_body))
-                                chunk_out.append(f"{body_indent}{_strip_inline_comment(chunk_lines[nxt]).strip()}\n")
-                                chunk_out.append(f"{indent}end\n")
-                                i = nxt + 1
-                                continue
-
-                    pending_then_branch_probe = new_probe("branch", abs_line, "if_true")
-                    chunk_out.append(raw)
-                    i += 1
-                    continue
-
-                if _RE_CASE.match(stripped):
-                    line_probe = new_probe("line", abs_line, "case")
-                    chunk_out.append(emit_probe_stmt(indent_of(raw), line_probe))
-                    chunk_out.append(raw)
-                    case_depth += 1
-                    i += 1
-                    continue
 
-                if case_depth > 0:
-                    raw_no_nl = raw[:-1] if raw.endswith("\n") else raw
-                    if "//" in raw_no_nl:
-                        code_part, comment_part = raw_no_nl.split("//", 1)
-                        comment_part = "//" + comment_part
-                    else:
-                        code_part, comment_part = raw_no_nl, ""
-
-                    m_ci = re.match(r"^(\s*)(default|[^:]+?)\s*:\s*(.*)$", code_part)
-                    if m_ci:
-                        indent, label, rest = m_ci.group(1), m_ci.group(2), m_ci.group(3)
-                        label_strip = label.strip()
-                        if "=" not in label_strip and "[" not in label_strip and "]" not in label_strip:
-                            rest_strip = rest.strip()
-                            if rest_strip and not rest_strip.startswith("begin"):
-                                br = new_probe("branch", abs_line, "case_item")
-                                ln = new_probe("line", abs_line, "case_item_stmt")
-                                chunk_out.append(f"{indent}{label_strip}: begin\n")
-                                body_indent = child_indent(indent)
-                                chunk_out.append(emit_probe_stmt(body_indent, br))
-                                chunk_out.append(emit_probe_stmt(body_indent, ln))
-                                chunk_out.append(f"{body_indent}{rest_strip} {comment_part}\n" if comment_part else f"{body_indent}{rest_strip}\n")
-                                chunk_out.append(f"{indent}end\n")
-                                i += 1
-                                continue
-
-                if _RE_CASE_ITEM.match(stripped):
-                    probe_name = new_probe("branch", abs_line, "case_item")
-                    if stripped.endswith("begin") or stripped.endswith("begin;") or " begin" in stripped:
-                        chunk_out.append(raw)
-                        chunk_out.append(emit_probe_stmt(child_indent(indent_of(raw)), probe_name))
-                        proc_depth += 1
-                    else:
-                        pending_case_item_probe = probe_name
-                        chunk_out.append(raw)
-                    i += 1
-                    continue
+# Bump whenever instrument_verilog_file changes what it emits, so cached
+# instrumented files are not reused across instrumenter versions.
+INSTRUMENTER_VERSION = 3
+# Each RTL file gets its own block of probe ids, picked by a hash of its
+# file name, so a file's probe names depend neither on how many probes other
+# files have nor on which other files are instrumented with it.
+PROBE_ID_BLOCK = 10000
+PROBE_ID_BLOCKS = 100000
+IVERILOG_FLAGS = ["-g2005-sv"]
+# Written (appended) by readout-instrumented RTL at the end of simulation,
+# relative to the simulator's cwd: one "<instance> <vector> <bits>" line per
+# module instance.
+HITS_FILE = "cov_hits.txt"
+# Loaded with $readmemh relative to the simulator's cwd.
+SIM_INPUT_FILES = ("intruction.hex", "data.hex")
+
+_DUMP_TASKS = frozenset(
+    ("$dumpfile", "$dumpvars", "$dumpon", "$dumpoff", "$dumpall", "$dumpflush", "$dumplimit")
+)
+
+
+def strip_dump_calls(tb_path: Path, dst_path: Path) -> None:
+    # Copy of a testbench with its $dump* calls turned into null statements,
+    # for readout runs that need no VCD.
+    text = tb_path.read_bytes().decode("utf-8", errors="replace")
+    out: list[str] = []
+    pos = 0
+    for start, end in system_calls(tokenize(text), _DUMP_TASKS):
+        out.append(text[pos:start])
+        out.append(";")
+        pos = end
+    out.append(text[pos:])
+    dst_path.write_bytes("".join(out).encode("utf-8"))
+
+
+def read_hits_file(path: Path, probe_bits: dict[str, dict[int, str]]) -> set[str]:
+    # Probe names hit in any instance listed in a HITS_FILE.
+    hit: set[str] = set()
+    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
+        parts = line.split()
+        if len(parts) != 3:
+            continue
+        bits = probe_bits.get(parts[1])
+        if bits is None:
+            continue
+        ones = _vector_ones(parts[2])
+        hit.update(name for bit, name in bits.items() if ones >> bit & 1)
+    return hit
 
-                if pending_then_branch_probe is not None:
-                    chunk_out.append(emit_probe_stmt(indent_of(raw), pending_then_branch_probe))
-                    pending_then_branch_probe = None
-                elif pending_else_branch_probe is not None:
-                    chunk_out.append(emit_probe_stmt(indent_of(raw), pending_else_branch_probe))
-                    pending_else_branch_probe = None
-                elif pending_case_item_probe is not None:
-                    chunk_out.append(emit_probe_stmt(indent_of(raw), pending_case_item_probe))
-                    pending_case_item_probe = None
-
-                if stripped and not _RE_ELSE.match(stripped) and not _RE_BEGIN.match(stripped) and not _RE_END.match(stripped):
-                    if not _RE_CASE_ITEM.match(stripped):
-                        line_probe = new_probe("line", abs_line, "stmt")
-                        chunk_out.append(emit_probe_stmt(indent_of(raw), line_probe))
-
-                chunk_out.append(raw)
-                i += 1
-                continue
 
-            chunk_out.append(raw)
-            i += 1
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Concurrent runs may fill the same cache entry; never expose a torn file.
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
 
-        decl_lines: list[str] = []
-        if used_probe_names:
-            decl_lines.extend([f"{mod_indent}reg {p};\n" for p in used_probe_names])
 
-        chunk_out = [ln if ln != "__COV_DECLS__\n" else "".join(decl_lines) for ln in chunk_out]
-        return chunk_out, chunk_probes, probe_id
+def instrument_cached(
+    src_path: Path,
+    dst_path: Path,
+    *,
+    probe_start_id: int,
+    cache_dir: Path | None,
+    packed: bool = False,
+    readout: bool = False,
+    count: bool = False,
+    text: str | None = None,
+) -> tuple[list[Probe], int, bool]:
+    # Instruments through a content-addressed cache keyed by the source
+    # text, its path, the probe id base, the packing/readout/count mode and
+    # INSTRUMENTER_VERSION. The source is read once, unless given in `text`,
+    # for both the key and the instrumenter. Returns
+    # (probes, next probe id, cache hit).
+    if text is None:
+        text = src_path.read_text(encoding="utf-8", errors="replace")
+    instrument = partial(
+        instrument_verilog_file,
+        src_path,
+        dst_path,
+        probe_start_id=probe_start_id,
+        packed=packed,
+        readout=readout,
+        count=count,
+        text=text,
+    )
+    if cache_dir is None:
+        probes, next_id = instrument()
+        return probes, next_id, False
+
+    h = hashlib.sha256()
+    h.update(f"v{INSTRUMENTER_VERSION}\0{src_path.resolve()}\0{probe_start_id}\0".encode("utf-8"))
+    h.update(f"{packed}\0{readout}\0{count}\0".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    key = h.hexdigest()
+    cached_v = cache_dir / f"{key}.v"
+    cached_meta = cache_dir / f"{key}.json"
+    try:
+        meta = json.loads(cached_meta.read_text(encoding="utf-8"))
+        shutil.copyfile(cached_v, dst_path)
+        probes = [Probe(**p) for p in meta["probes"]]
+        return probes, meta["next_id"], True
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    probes, next_id = instrument()
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(cached_v, dst_path.read_bytes())
+        meta = {"probes": [p.__dict__ for p in probes], "next_id": next_id}
+        _write_atomic(cached_meta, json.dumps(meta).encode("utf-8"))
+    except OSError:
+        # The cache is an optimization; a read-only location just disables it.
+        pass
+    return probes, next_id, False
+
+
+def probe_id_bases(rtl_files: list[Path]) -> list[int]:
+    # First probe id of each file's block. Colliding hashes move to the next
+    # free block in name order, which only depends on the colliding files.
+    # Instrumented files are named after their sources, so two sources may
+    # not share a name.
+    names = [src.name for src in rtl_files]
+    dups = sorted({n for n in names if names.count(n) > 1})
+    if dups:
+        raise RuntimeError(f"arquivos RTL com o mesmo nome: {', '.join(dups)}")
+    bases: dict[str, int] = {}
+    used: set[int] = set()
+    for name in sorted(names):
+        block = int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big") % PROBE_ID_BLOCKS
+        while block in used:
+            block = (block + 1) % PROBE_ID_BLOCKS
+        used.add(block)
+        bases[name] = block * PROBE_ID_BLOCK
+    return [bases[src.name] for src in rtl_files]
+
+
+def instrument_rtl(
+    rtl_files: list[Path],
+    inst_rtl_dir: Path,
+    cache_dir: Path | None,
+    packed: bool = False,
+    readout: bool = False,
+    jobs: int = 1,
+    texts: dict[str, str] | None = None,
+    count: bool = False,
+) -> tuple[list[Probe], list[Path], int]:
+    # Instruments every file into `inst_rtl_dir`, each in its own probe id
+    # block. Files share no state, so with `jobs` > 1 they are instrumented
+    # in a process pool; results are combined in file order either way.
+    # `texts` (see read_rtl_texts) saves reading the sources again.
+    # Returns (probes, instrumented files, files reused from cache).
+    inst_rtl_dir.mkdir(parents=True, exist_ok=True)
+    dsts = [inst_rtl_dir / src.name for src in rtl_files]
+    bases = probe_id_bases(rtl_files)
+    src_texts = [texts.get(str(src.resolve())) if texts is not None else None for src in rtl_files]
+    work = partial(instrument_cached, cache_dir=cache_dir, packed=packed, readout=readout, count=count)
+    tasks = list(zip(rtl_files, dsts, bases, src_texts))
+    if jobs <= 1 or len(rtl_files) <= 1:
+        results = [work(src, dst, probe_start_id=base, text=text) for src, dst, base, text in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(rtl_files))) as pool:
+            futures = [pool.submit(work, src, dst, probe_start_id=base, text=text) for src, dst, base, text in tasks]
+            results = [fut.result() for fut in futures]
+    probes: list[Probe] = []
+    reused = 0
+    for src, base, (p, next_id, hit) in zip(rtl_files, bases, results):
+        if next_id - base >= PROBE_ID_BLOCK:
+            raise RuntimeError(f"{src.name}: mais de {PROBE_ID_BLOCK - 1} probes, aumente PROBE_ID_BLOCK")
+        reused += hit
+        probes.extend(p)
+    return probes, dsts, reused
+
+
+def _vvp_cache_key(tb_path: Path, rtl_paths: list[Path], top: str | None) -> str:
+    # Content, not paths: instrumented RTL lives in a fresh work dir on every
+    # run. The compiler binary is part of the key so an upgrade recompiles.
+    h = hashlib.sha256()
+    compiler = shutil.which("iverilog") or "iverilog"
+    try:
+        compiler_mtime = os.stat(compiler).st_mtime_ns
+    except OSError:
+        compiler_mtime = 0
+    h.update(f"{compiler}\0{compiler_mtime}\0{' '.join(IVERILOG_FLAGS)}\0{top or ''}\0".encode("utf-8"))
+    for p in [tb_path, *rtl_paths]:
+        data = p.read_bytes()
+        h.update(f"{p.name}\0{len(data)}\0".encode("utf-8"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def compile_vvp(
+    *,
+    repo_root: Path,
+    tb_path: Path,
+    rtl_paths: list[Path],
+    out_vvp: Path,
+    cache_dir: Path | None = None,
+    top: str | None = None,
+) -> bool:
+    # Returns True when the compiled simulation came from the cache. `top`
+    # pins the root module (-s), so unit testbenches do not also elaborate
+    # every uninstantiated RTL module as an extra root.
+    cached = None
+    if cache_dir is not None:
+        cached = cache_dir / f"{_vvp_cache_key(tb_path, rtl_paths, top)}.vvp"
+        if cached.exists():
+            shutil.copyfile(cached, out_vvp)
+            return True
+
+    top_flags = ["-s", top] if top else []
+    cmd_compile = ["iverilog", *IVERILOG_FLAGS, *top_flags, "-o", str(out_vvp), str(tb_path)] + [str(p) for p in rtl_paths]
+    cp = subprocess.run(cmd_compile, cwd=str(repo_root), capture_output=True, text=True)
+    if cp.returncode != 0:
+        sys.stderr.write(cp.stdout)
+        sys.stderr.write(cp.stderr)
+        raise RuntimeError("Falha compilando com iverilog")
 
-    out_lines: list[str] = []
-    all_probes: list[Probe] = []
-    probe_id = probe_start_id
+    if cached is not None:
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            _write_atomic(cached, out_vvp.read_bytes())
+        except OSError:
+            pass
+    return False
 
-    i = 0
-    while i < len(src_lines):
-        if _RE_MODULE.match(src_lines[i]):
-            start = i
-            j = i + 1
-            while j < len(src_lines) and not _RE_ENDMODULE.match(src_lines[j]):
-                j += 1
-            if j >= len(src_lines):
-                out_lines.append(src_lines[i])
-                i += 1
-                continue
-            chunk = src_lines[start : j + 1]
-            inst_chunk, chunk_probes, probe_id = instrument_module_chunk(chunk, start_line_no=start + 1, probe_id_in=probe_id)
-            out_lines.extend(inst_chunk)
-            all_probes.extend(chunk_probes)
-            i = j + 1
-            continue
-        out_lines.append(src_lines[i])
-        i += 1
 
-    dst_path.write_text("".join(out_lines), encoding="utf-8", errors="replace")
-    return all_probes, probe_id
+def run_vvp(out_vvp: Path, *, cwd: Path) -> subprocess.CompletedProcess:
+    # The testbench's $dumpfile and $readmemh paths resolve against `cwd`.
+    return subprocess.run(["vvp", str(out_vvp)], cwd=str(cwd), capture_output=True, text=True)
 
 
 def run_iverilog_and_vvp(
@@ -562,23 +661,24 @@ def run_iverilog_and_vvp(
     tb_path: Path,
     rtl_paths: list[Path],
     out_vvp: Path,
+    cache_dir: Path | None = None,
+    cwd: Path | None = None,
 ) -> None:
-    cmd_compile = ["iverilog", "-g2005-sv", "-o", str(out_vvp), str(tb_path)] + [str(p) for p in rtl_paths]
-    cp = subprocess.run(cmd_compile, cwd=str(repo_root), capture_output=True, text=True)
-    if cp.returncode != 0:
-        sys.stderr.write(cp.stdout)
-        sys.stderr.write(cp.stderr)
-        raise RuntimeError("Falha compilando com iverilog")
+    if compile_vvp(repo_root=repo_root, tb_path=tb_path, rtl_paths=rtl_paths, out_vvp=out_vvp, cache_dir=cache_dir):
+        print("Compilação: vvp reaproveitado do cache", file=sys.stderr)
 
-    cmd_run = ["vvp", str(out_vvp)]
-    rp = subprocess.run(cmd_run, cwd=str(repo_root), capture_output=True, text=True)
+    rp = run_vvp(out_vvp, cwd=cwd or repo_root)
     sys.stdout.write(rp.stdout)
     sys.stderr.write(rp.stderr)
     if rp.returncode != 0:
         raise RuntimeError("Falha executando vvp")
 
 
-def build_report(probes: list[Probe], probe_hit: set[str]) -> dict[str, object]:
+def build_report(
+    probes: list[Probe],
+    probe_hit: set[str],
+    probe_stats: dict[str, dict[str, int]] | None = None,
+) -> dict[str, object]:
     by_file: dict[str, dict[str, object]] = {}
 
     for p in probes:
@@ -607,7 +707,14 @@ def build_report(probes: list[Probe], probe_hit: set[str]) -> dict[str, object]:
             else:
                 d["uncovered_branches"].append({"line": p.line, "detail": p.detail, "probe": p.name})
 
-    return {"files": by_file}
+    report: dict[str, object] = {"files": by_file}
+    if probe_stats is not None:
+        report["probes"] = {
+            p.name: {"file": p.file, "line": p.line, "kind": p.kind, **probe_stats[p.name]}
+            for p in probes
+            if p.name in probe_stats
+        }
+    return report
 
 
 def _pct(a: int, b: int) -> str:
@@ -616,22 +723,39 @@ def _pct(a: int, b: int) -> str:
     return f"{(100.0 * a / b):.2f}%"
 
 
+def read_rtl_texts(rtl_files: list[Path]) -> dict[str, str]:
+    # Source text by resolved path, read once per run and shared by the
+    # instrumenter, the line coverage and the HTML report.
+    return {str(f.resolve()): f.read_text(encoding="utf-8", errors="replace") for f in rtl_files}
+
+
+def read_sources(rtl_files: list[Path], texts: dict[str, str] | None = None) -> dict[str, list[str]]:
+    # Source lines by resolved path, from `texts` when already read.
+    if texts is None:
+        texts = read_rtl_texts(rtl_files)
+    return {str(f.resolve()): texts[str(f.resolve())].splitlines() for f in rtl_files}
+
+
 def build_line_coverage(
     *,
     repo_root: Path,
     rtl_files: list[Path],
     probes: list[Probe],
     hit_probe_names: set[str],
+    sources: dict[str, list[str]] | None = None,
 ) -> dict[str, dict[int, str]]:
     status_by_file: dict[str, dict[int, str]] = {}
     probe_by_file_line: dict[str, dict[int, set[str]]] = {}
+    if sources is None:
+        sources = read_sources(rtl_files)
 
     for p in probes:
-        probe_by_file_line.setdefault(p.file, {}).setdefault(p.line, set()).add(p.name)
+        # A line is covered when the block its probe belongs to was entered.
+        probe_by_file_line.setdefault(p.file, {}).setdefault(p.line, set()).add(p.block or p.name)
 
     for f in rtl_files:
         fp = str(f.resolve())
-        lines = f.read_text(encoding="utf-8", errors="replace").splitlines()
+        lines = sources[fp]
         per_line: dict[int, str] = {}
         per_line_probes = probe_by_file_line.get(fp, {})
         for idx in range(1, len(lines) + 1):
@@ -645,62 +769,110 @@ def build_line_coverage(
     return status_by_file
 
 
-def render_html_report(
+# Lines per page of a file's HTML report.
+HTML_PAGE_LINES = 2000
+
+_HTML_STYLE = (
+    "<style>"
+    "body{font-family:ui-sans-serif,system-ui,Segoe UI,Arial;margin:16px;}"
+    "h1,h2{margin:0 0 10px 0;}"
+    ".legend span{display:inline-block;padding:2px 8px;border-radius:6px;margin-right:8px;font-family:ui-monospace,Consolas,monospace;}"
+    ".cov{background:#e6ffed;}"
+    ".uncov{background:#ffeef0;}"
+    ".na{background:#f6f8fa;color:#6a737d;}"
+    "pre{margin:0;}"
+    ".file{border:1px solid #d0d7de;border-radius:10px;margin:16px 0;padding:12px;}"
+    ".src{border:1px solid #d0d7de;border-radius:10px;overflow:auto;}"
+    ".ln{display:inline-block;width:6ch;text-align:right;padding-right:1ch;color:#57606a;user-select:none;}"
+    ".code{white-space:pre;}"
+    "iframe{width:100%;height:70vh;border:1px solid #d0d7de;border-radius:10px;}"
+    "</style>"
+)
+_HTML_LEGEND = (
+    "<div class='legend'>"
+    "<span class='cov'>coberta</span>"
+    "<span class='uncov'>não coberta</span>"
+    "<span class='na'>n/a</span>"
+    "</div>"
+)
+
+
+def _html_head(title: str) -> str:
+    return (
+        f"<!doctype html>\n<html><head><meta charset='utf-8'><title>{_escape_html(title)}</title>\n"
+        f"{_HTML_STYLE}\n</head><body>\n"
+    )
+
+
+def write_html_report(
+    out_path: Path,
     *,
     repo_root: Path,
     rtl_files: list[Path],
     file_summaries: dict[str, dict[str, object]],
     line_cov: dict[str, dict[int, str]],
-) -> str:
-    parts: list[str] = []
-    parts.append("<!doctype html>")
-    parts.append("<html><head><meta charset='utf-8'>")
-    parts.append(
-        "<style>"
-        "body{font-family:ui-sans-serif,system-ui,Segoe UI,Arial;margin:16px;}"
-        "h1,h2{margin:0 0 10px 0;}"
-        ".legend span{display:inline-block;padding:2px 8px;border-radius:6px;margin-right:8px;font-family:ui-monospace,Consolas,monospace;}"
-        ".cov{background:#e6ffed;}"
-        ".uncov{background:#ffeef0;}"
-        ".na{background:#f6f8fa;color:#6a737d;}"
-        "pre{margin:0;}"
-        ".file{border:1px solid #d0d7de;border-radius:10px;margin:16px 0;padding:12px;}"
-        ".src{border:1px solid #d0d7de;border-radius:10px;overflow:auto;}"
-        ".ln{display:inline-block;width:6ch;text-align:right;padding-right:1ch;color:#57606a;user-select:none;}"
-        ".code{white-space:pre;}"
-        "</style>"
-    )
-    parts.append("</head><body>")
-    parts.append("<h1>RTL line/branch coverage</h1>")
-    parts.append("<div class='legend'>")
-    parts.append("<span class='cov'>coberta</span>")
-    parts.append("<span class='uncov'>não coberta</span>")
-    parts.append("<span class='na'>n/a</span>")
-    parts.append("</div>")
-
-    for f in rtl_files:
-        fp = str(f.resolve())
-        rel = str(f.relative_to(repo_root)) if repo_root in f.resolve().parents else fp
-        agg = file_summaries.get(fp, {})
-        lt = int(agg.get("lines_total", 0))
-        lh = int(agg.get("lines_hit", 0))
-        bt = int(agg.get("branches_total", 0))
-        bh = int(agg.get("branches_hit", 0))
-        parts.append("<div class='file'>")
-        parts.append(f"<h2>{_escape_html(rel)}</h2>")
-        parts.append(f"<div>lines {lh}/{lt} ({_pct(lh, lt)}), branches {bh}/{bt} ({_pct(bh, bt)})</div>")
-        parts.append("<div class='src'><pre>")
-        src_lines = f.read_text(encoding="utf-8", errors="replace").splitlines()
-        statuses = line_cov.get(fp, {})
-        for idx, line in enumerate(src_lines, start=1):
-            st = statuses.get(idx, "na")
-            parts.append(
-                f"<span class='{st}'><span class='ln'>{idx}</span><span class='code'>{_escape_html(line)}</span></span>\n"
+    sources: dict[str, list[str]],
+) -> None:
+    # `out_path` is a summary index; each file gets its own pages of
+    # HTML_PAGE_LINES lines in `<stem>_files/`, loaded by the index only
+    # when opened. Everything is written as it is generated.
+    page_dir = out_path.with_name(f"{out_path.stem}_files")
+    page_dir.mkdir(parents=True, exist_ok=True)
+    with out_path.open("w", encoding="utf-8") as index:
+        index.write(_html_head("RTL line/branch coverage"))
+        index.write("<h1>RTL line/branch coverage</h1>\n")
+        index.write(_HTML_LEGEND + "\n")
+        for k, f in enumerate(rtl_files):
+            fp = str(f.resolve())
+            rel = str(f.relative_to(repo_root)) if repo_root in f.resolve().parents else fp
+            agg = file_summaries.get(fp, {})
+            lt = int(agg.get("lines_total", 0))
+            lh = int(agg.get("lines_hit", 0))
+            bt = int(agg.get("branches_total", 0))
+            bh = int(agg.get("branches_hit", 0))
+            pages = _write_file_pages(
+                page_dir, f"{k:04d}_{f.stem}", rel, sources[fp], line_cov.get(fp, {}), index_href=f"../{out_path.name}"
             )
-        parts.append("</pre></div></div>")
-
-    parts.append("</body></html>")
-    return "\n".join(parts)
+            first = f"{page_dir.name}/{pages[0]}"
+            index.write("<div class='file'>")
+            index.write(f"<h2><a href='{first}'>{_escape_html(rel)}</a></h2>")
+            index.write(f"<div>lines {lh}/{lt} ({_pct(lh, lt)}), branches {bh}/{bt} ({_pct(bh, bt)})</div>")
+            # Closed <details> keep the lazy iframe from loading until asked.
+            index.write(
+                f"<details><summary>código ({len(pages)} página(s))</summary>"
+                f"<iframe loading='lazy' src='{first}'></iframe></details></div>\n"
+            )
+        index.write("</body></html>\n")
+
+
+def _write_file_pages(
+    page_dir: Path, base: str, title: str, lines: list[str], statuses: dict[int, str], *, index_href: str
+) -> list[str]:
+    n_pages = max(1, -(-len(lines) // HTML_PAGE_LINES))
+    names = [f"{base}.{p + 1}.html" for p in range(n_pages)]
+    for p, name in enumerate(names):
+        lo = p * HTML_PAGE_LINES
+        hi = min(len(lines), lo + HTML_PAGE_LINES)
+        nav = f"<div><a href='{index_href}' target='_top'>índice</a> | página {p + 1}/{n_pages}"
+        if p > 0:
+            nav += f" <a href='{names[p - 1]}'>&larr; anterior</a>"
+        if p + 1 < n_pages:
+            nav += f" <a href='{names[p + 1]}'>próxima &rarr;</a>"
+        nav += "</div>\n"
+        with (page_dir / name).open("w", encoding="utf-8") as fh:
+            fh.write(_html_head(title))
+            fh.write(f"<h2>{_escape_html(title)}</h2>\n{_HTML_LEGEND}\n{nav}")
+            fh.write("<div class='src'><pre>")
+            for idx in range(lo + 1, hi + 1):
+                st = statuses.get(idx, "na")
+                fh.write(
+                    f"<span class='{st}'><span class='ln'>{idx}</span>"
+                    f"<span class='code'>{_escape_html(lines[idx - 1])}</span></span>\n"
+                )
+            fh.write("</pre></div>\n")
+            fh.write(nav)
+            fh.write("</body></html>\n")
+    return names
 
 
 def main(argv: list[str]) -> int:
@@ -709,13 +881,40 @@ def main(argv: list[str]) -> int:
     )
     ap.add_argument("--tb", default=str(Path("tb") / "tb_mips_top.v"), help="Arquivo do testbench")
     ap.add_argument("--rtl-dir", default=str(Path("rtl")), help="Diretório com RTL (.v)")
-    ap.add_argument("--vcd", default="tb_mips_top.vcd", help="VCD gerado pelo testbench")
+    ap.add_argument("--vcd", default="tb_mips_top.vcd", help="VCD gerado pelo testbench (ou trace binário .vtrace)")
     ap.add_argument("--no-run", action="store_true", help="Não roda simulação, só analisa o VCD")
     ap.add_argument("--json", default="", help="Grava relatório JSON em arquivo")
     ap.add_argument("--top-uncovered", type=int, default=50, help="Máximo de itens uncovered por arquivo")
     ap.add_argument("--work", default="", help="Diretório de trabalho (mantém RTL instrumentado)")
-    ap.add_argument("--html", default="", help="Grava relatório HTML em arquivo")
+    ap.add_argument("--html", default="", help="Grava relatório HTML (índice + páginas por arquivo em <nome>_files/)")
+    ap.add_argument("--jobs", type=int, default=1, help="Processos para instrumentar o RTL e varrer o VCD em blocos paralelos")
+    ap.add_argument("--no-index", action="store_true", help="Não usa nem grava o índice <vcd>.idx")
+    ap.add_argument(
+        "--cache-dir",
+        default=".cov_cache",
+        help="Cache de RTL instrumentado e de .vvp compilado (por hash); relativo ao repositório",
+    )
+    ap.add_argument("--no-cache", action="store_true", help="Sempre re-instrumenta e recompila tudo")
+    ap.add_argument(
+        "--hit-counts",
+        action="store_true",
+        help="Probes contadores com o total de hits de cada um (lê o VCD inteiro; sem --packed/--readout)",
+    )
+    ap.add_argument(
+        "--packed",
+        action="store_true",
+        help="Agrupa os probes de cada módulo num único reg vetor (VCD menor)",
+    )
+    ap.add_argument(
+        "--readout",
+        action="store_true",
+        help=f"Sem VCD: cada módulo grava seus probes em {HITS_FILE} no fim da simulação (implica --packed)",
+    )
+    ap.add_argument("--db", default="", help="Acrescenta este run a um banco de cobertura (SQLite)")
+    ap.add_argument("--run-name", default="", help="Nome do run no banco (padrão: nome do testbench)")
     args = ap.parse_args(argv)
+    if args.hit_counts and (args.packed or args.readout):
+        ap.error("--hit-counts não combina com --packed nem com --readout")
 
     repo_root = Path(__file__).resolve().parent
     tb_path = (repo_root / args.tb).resolve()
@@ -730,55 +929,101 @@ def main(argv: list[str]) -> int:
         print(f"Testbench não encontrado: {tb_path}", file=sys.stderr)
         return 2
 
+    rtl_texts = read_rtl_texts(rtl_files)
     all_probes: list[Probe] = []
-    probe_id = 0
+    cache_root = None if args.no_cache else (repo_root / args.cache_dir).resolve()
+    cache_dir = cache_root / "instrument" if cache_root is not None else None
+    vvp_cache_dir = cache_root / "vvp" if cache_root is not None else None
 
     def run_in_workdir(work: Path) -> int:
-        nonlocal probe_id, all_probes
-        inst_rtl_dir = work / "rtl"
-        inst_rtl_dir.mkdir(parents=True, exist_ok=True)
-
-        inst_rtl_files: list[Path] = []
-        for src in rtl_files:
-            dst = inst_rtl_dir / src.name
-            p, probe_id = instrument_verilog_file(src, dst, probe_start_id=probe_id)
-            all_probes.extend(p)
-            inst_rtl_files.append(dst)
+        nonlocal all_probes
+        try:
+            probes, inst_rtl_files, reused = instrument_rtl(
+                rtl_files,
+                work / "rtl",
+                cache_dir,
+                packed=args.packed,
+                readout=args.readout,
+                jobs=args.jobs,
+                texts=rtl_texts,
+                count=args.hit_counts,
+            )
+        except RuntimeError as e:
+            print(str(e), file=sys.stderr)
+            return 2
+        all_probes.extend(probes)
+        if cache_dir is not None:
+            print(f"Instrumentação: {reused}/{len(rtl_files)} arquivos reaproveitados do cache", file=sys.stderr)
 
         out_vvp = work / "cov_tb.vvp"
+        sim_tb = tb_path
+        sim_cwd = repo_root
+        hits_path = work / HITS_FILE
+        if args.readout:
+            # The probes report themselves at $finish; skip the VCD entirely.
+            # The simulation runs in the work dir, so the hits file stays
+            # out of the source tree.
+            sim_tb = work / tb_path.name
+            strip_dump_calls(tb_path, sim_tb)
+            sim_cwd = work
+            for name in SIM_INPUT_FILES:
+                if (repo_root / name).exists():
+                    shutil.copyfile(repo_root / name, work / name)
 
         if not args.no_run:
-            run_iverilog_and_vvp(repo_root=repo_root, tb_path=tb_path, rtl_paths=inst_rtl_files, out_vvp=out_vvp)
-
-        if not vcd_path.exists():
-            print(f"VCD não encontrado: {vcd_path}", file=sys.stderr)
-            return 2
-
-        vcd_defs = parse_vcd_definitions(vcd_path)
-        probe_name_set = {p.name for p in all_probes}
+            if args.readout:
+                hits_path.unlink(missing_ok=True)
+            run_iverilog_and_vvp(
+                repo_root=repo_root,
+                tb_path=sim_tb,
+                rtl_paths=inst_rtl_files,
+                out_vvp=out_vvp,
+                cache_dir=vvp_cache_dir,
+                cwd=sim_cwd,
+            )
 
-        probe_code_by_name: dict[str, str] = {}
-        for code, vv in vcd_defs.items():
-            leaf = vv.name.split(".")[-1]
-            if leaf in probe_name_set:
-                probe_code_by_name[leaf] = code
+        probe_bits = packed_probe_bits(all_probes)
+        probe_stats: dict[str, dict[str, int]] | None = None
+        if args.readout:
+            if not hits_path.exists():
+                print(f"Arquivo de hits não encontrado: {hits_path}", file=sys.stderr)
+                return 2
+            hit_probe_names = expand_block_hits(all_probes, read_hits_file(hits_path, probe_bits))
+        else:
+            if not vcd_path.exists():
+                print(f"VCD não encontrado: {vcd_path}", file=sys.stderr)
+                return 2
+
+            probe_name_set = set(emitted_probe_names(all_probes))
+            _header, consumers = read_dump(
+                vcd_path,
+                partial(_probe_consumers, frozenset(probe_name_set), args.hit_counts, probe_bits),
+                jobs=args.jobs,
+                use_index=not args.no_index,
+            )
+            hits: ProbeHits = consumers[0]  # type: ignore[assignment]
 
-        missing = sorted(probe_name_set - set(probe_code_by_name.keys()))
-        if missing:
-            print(f"Aviso: {len(missing)} probes não encontrados no VCD (dumpvars limitado?)", file=sys.stderr)
+            expected = probe_name_set.union(*(bits.values() for bits in probe_bits.values()))
+            missing = sorted(expected - set(hits.probe_code_by_name.keys()))
+            if missing:
+                print(
+                    f"Aviso: {len(missing)} probes não encontrados no VCD (dumpvars limitado?)",
+                    file=sys.stderr,
+                )
 
-        target_codes = set(probe_code_by_name.values())
-        hit_codes = parse_vcd_scalar_ones(vcd_path, target_codes)
-        hit_probe_names = {name for name, code in probe_code_by_name.items() if code in hit_codes}
+            hit_probe_names = expand_block_hits(all_probes, hits.hit_probe_names())
+            probe_stats = expand_block_stats(all_probes, hits.probe_stats())
 
-        report = build_report(all_probes, hit_probe_names)
+        report = build_report(all_probes, hit_probe_names, probe_stats)
 
         files: dict[str, dict[str, object]] = report["files"]  # type: ignore[assignment]
+        sources = read_sources(rtl_files, rtl_texts)
         line_cov = build_line_coverage(
             repo_root=repo_root,
             rtl_files=rtl_files,
             probes=all_probes,
             hit_probe_names=hit_probe_names,
+            sources=sources,
         )
         for f in rtl_files:
             fp = str(f.resolve())
@@ -801,7 +1046,7 @@ def main(argv: list[str]) -> int:
             agg["uncovered_lines"] = [{"line": ln, "detail": "line"} for ln, st in sorted(statuses.items()) if st == "uncov"]
 
         print("=================================================================")
-        print("RTL line/branch coverage (instrumentado + VCD)")
+        print(f"RTL line/branch coverage (instrumentado + {HITS_FILE if args.readout else 'VCD'})")
         print("=================================================================")
         for file_path, agg in sorted(files.items(), key=lambda kv: kv[0]):
             lt = int(agg["lines_total"])
@@ -810,6 +1055,11 @@ def main(argv: list[str]) -> int:
             bh = int(agg["branches_hit"])
             print(f"- {Path(file_path).name}: lines {lh}/{lt} ({_pct(lh, lt)}), branches {bh}/{bt} ({_pct(bh, bt)})")
 
+        if probe_stats:
+            last = max(probe_stats.items(), key=lambda kv: kv[1]["first_hit"])
+            print("")
+            print(f"Último probe coberto pela primeira vez em t={last[1]['first_hit']} ({last[0]})")
+
         print("")
         print("Uncovered (por arquivo):")
         for file_path, agg in sorted(files.items(), key=lambda kv: kv[0]):
@@ -827,11 +1077,24 @@ def main(argv: list[str]) -> int:
             out_json = (repo_root / args.json).resolve()
             out_json.write_text(json.dumps(report, indent=2), encoding="utf-8")
         if args.html:
-            out_html = (repo_root / args.html).resolve()
-            out_html.write_text(
-                render_html_report(repo_root=repo_root, rtl_files=rtl_files, file_summaries=files, line_cov=line_cov),
-                encoding="utf-8",
+            write_html_report(
+                (repo_root / args.html).resolve(),
+                repo_root=repo_root,
+                rtl_files=rtl_files,
+                file_summaries=files,
+                line_cov=line_cov,
+                sources=sources,
             )
+        if args.db:
+            with CoverageDb((repo_root / args.db).resolve()) as db:
+                probe_set = db.add_probes(all_probes)
+                db.add_run(
+                    args.run_name or tb_path.stem,
+                    hit_probe_names,
+                    source=str(hits_path if args.readout else vcd_path),
+                    probe_stats=probe_stats if args.hit_counts else None,
+                    probe_set=probe_set,
+                )
         return 0
 
     if args.work:
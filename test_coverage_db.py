@@ -0,0 +1,104 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from coverage_db import CoverageDb, ProbeSetError, probe_set_fingerprint
+from rtl_line_branch_coverage import Probe
+
+
+def _probes(*names: str) -> list[Probe]:
+    return [Probe(name=n, kind="line", file="rtl/m.v", line=k + 1, detail="stmt") for k, n in enumerate(names)]
+
+
+def test_v1_database_is_migrated(tmp_path: Path) -> None:
+    path = tmp_path / "v1.db"
+    conn = sqlite3.connect(str(path))
+    conn.executescript(
+        """
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE probes (
+            id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, kind TEXT NOT NULL,
+            file TEXT NOT NULL, line INTEGER NOT NULL, detail TEXT NOT NULL
+        );
+        CREATE TABLE runs (
+            id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, created REAL NOT NULL,
+            source TEXT NOT NULL, n_hit INTEGER NOT NULL, hits BLOB NOT NULL, counts BLOB
+        );
+        INSERT INTO meta VALUES ('schema', '1');
+        INSERT INTO probes VALUES (1, 'p1', 'line', 'rtl/m.v', 1, 'stmt');
+        INSERT INTO runs VALUES (1, 'old', 0, 'old.vcd', 1, x'02', NULL);
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    with CoverageDb(path) as db:
+        assert [(r.name, r.probe_set) for r in db.runs()] == [("old", "")]
+        assert db.names_of(db.merged()) == ["p1"]
+        fp = db.add_probes(_probes("p1", "p2"))
+        db.add_run("new", ["p2"], probe_set=fp)
+    with CoverageDb(path) as db:
+        assert db.conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone() == ("2",)
+        assert [(r.name, r.probe_set) for r in db.runs()] == [("old", ""), ("new", fp)]
+
+
+def test_runs_of_other_probe_sets_are_not_merged(tmp_path: Path) -> None:
+    with CoverageDb(tmp_path / "cov.db") as db:
+        fp1 = db.add_probes(_probes("p1", "p2"))
+        db.add_run("a1", ["p1"], probe_set=fp1)
+        db.add_run("a2", ["p2"], probe_set=fp1)
+        fp2 = db.add_probes(_probes("p2", "p1"))
+        assert fp2 != fp1
+        db.add_run("b1", ["p1"], probe_set=fp2)
+
+        assert db.names_of(db.merged(["a*"])) == ["p1", "p2"]
+        for call in (db.merged, db.rank, db.minimal_set):
+            with pytest.raises(ProbeSetError):
+                call()
+        with pytest.raises(ProbeSetError):
+            db.diff(["a*"], ["b*"])
+
+
+def test_fingerprint_ignores_probe_order() -> None:
+    probes = _probes("p1", "p2", "p3")
+    assert probe_set_fingerprint(probes) == probe_set_fingerprint(probes[::-1])
+
+
+def test_import_remaps_probe_ids(tmp_path: Path) -> None:
+    with CoverageDb(tmp_path / "mine.db") as mine:
+        fp = mine.add_probes(_probes("p1", "p2", "p3"))
+        mine.add_run("local", ["p1"], probe_set=fp)
+    with CoverageDb(tmp_path / "other.db") as other:
+        # Numbered differently: p3 gets id 1 and p4 is unknown to mine.
+        other.add_probes(_probes("p3", "p4"))
+        other.add_probes(_probes("p1", "p2"))
+        stats = {"p3": {"hits": 7}, "p4": {"hits": 2}, "p1": {"hits": 5}}
+        other.add_run("ci", ["p3", "p4", "p1"], probe_stats=stats, source="ci.vcd", probe_set="x")
+
+    with CoverageDb(tmp_path / "mine.db") as mine:
+        assert mine.import_db(tmp_path / "other.db", prefix="ci/") == 1
+        assert mine.probe_ids()["p4"] == 4
+        assert sorted(mine.names_of(mine.bitmaps(["ci/*"])["ci/ci"])) == ["p1", "p3", "p4"]
+        assert mine.hit_counts("ci/ci") == {"p1": 5, "p3": 7, "p4": 2}
+        (run,) = mine.runs(["ci/*"])
+        assert (run.source, run.n_hit, run.probe_set) == ("ci.vcd", 3, "x")
+
+
+def test_minimal_set_greedy_cover_and_ties(tmp_path: Path) -> None:
+    with CoverageDb(tmp_path / "cov.db") as db:
+        fp = db.add_probes(_probes("p1", "p2", "p3", "p4", "p5", "p6"))
+        runs = {
+            "wide": ["p1", "p2", "p3", "p4"],
+            "x": ["p1", "p2"],
+            "y": ["p3", "p4", "p5"],
+            "z": ["p5", "p6"],
+            "narrow": ["p5", "p6"],
+            "broad": ["p1", "p5", "p6"],
+        }
+        for name, hits in runs.items():
+            db.add_run(name, hits, probe_set=fp)
+        # After "wide", z, narrow and broad all add two probes: broad hits
+        # more in total, and narrow comes before z by name.
+        assert db.minimal_set() == [("wide", 4), ("narrow", 2)]
+        assert db.minimal_set(["x", "y", "z"]) == [("y", 3), ("x", 2), ("z", 1)]
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+from lockstep import check_dump
+from mips_asm import assemble, write_memh
+from mips_model import MipsModel
+
+_PROGRAM = """\
+ADDI $1, $0, 5
+ADDI $2, $0, 10
+ADD $3, $1, $2
+SUB $4, $2, $1
+ORI $5, $1, 0xF0
+end: J end
+"""
+
+
+def _write_dump(path: Path, program: Path, *, bad_cycle: int = 0, bad_value: int = 0) -> None:
+    # The signals of tb_mips_top the checker follows, driven from the model:
+    # reset is released at t=20, the clock rises every 10 from t=25, and the
+    # writeback of each edge settles in the same timestamp. The writeback of
+    # edge `bad_cycle` (1-based) is replaced by `bad_value`.
+    lines = [
+        "$timescale 1ns $end",
+        "$scope module tb_mips_top $end",
+        "$var reg 1 ! clk $end",
+        "$scope module uut $end",
+        "$var wire 1 \" reset $end",
+        "$var wire 32 # program_counter [31:0] $end",
+        "$var wire 32 $ instruction [31:0] $end",
+        "$var wire 5 % dest [4:0] $end",
+        "$var wire 32 & writeback [31:0] $end",
+        "$upscope $end",
+        "$upscope $end",
+        "$enddefinitions $end",
+    ]
+    model = MipsModel.from_hex(program)
+    steps = model.run(100)
+    first = steps[0]
+    lines += [
+        "#0", "$dumpvars", "0!", "0\"", f"b{first.pc:b} #", f"b{first.instruction:b} $",
+        f"b{first.dest:b} %", "bx &", "$end",
+        "#5", "1!", "#10", "0!", "#15", "1!", "#20", "0!", "1\"",
+    ]
+    t = 25
+    for n, (step, nxt) in enumerate(zip(steps, steps[1:] + [steps[-1]]), 1):
+        wb = bad_value if n == bad_cycle else step.writeback
+        lines += [f"#{t}", "1!", f"b{step.next_pc:b} #", f"b{nxt.instruction:b} $", f"b{nxt.dest:b} %", f"b{wb:b} &"]
+        lines += [f"#{t + 5}", "0!"]
+        t += 10
+    path.write_text("\n".join(lines) + "\n", encoding="ascii")
+
+
+def test_lockstep_reports_the_diverging_cycle(tmp_path: Path) -> None:
+    program = tmp_path / "prog.hex"
+    write_memh(program, assemble(_PROGRAM))
+    ok = tmp_path / "ok.vcd"
+    _write_dump(ok, program)
+    good = check_dump(ok, program)
+    assert good.divergence is None
+    assert good.cycles == 6
+
+    bad = tmp_path / "bad.vcd"
+    _write_dump(bad, program, bad_cycle=3, bad_value=0x10)
+    checker = check_dump(bad, program)
+    d = checker.divergence
+    assert d is not None
+    assert (d.cycle, d.time, d.field, d.expected, d.actual) == (3, 45, "writeback", 15, 0x10)
+    assert [s.pc for s in d.history] == [0, 1, 2]
@@ -0,0 +1,100 @@
+from array import array
+from pathlib import Path
+
+import pytest
+
+import mips_asm
+from mips_asm import AsmError, assemble, disassemble, format_memh, parse_memh, read_memh, write_memh
+
+_ROOT = Path(__file__).resolve().parent
+
+# Every instruction of INSTRUCTIONS, labels, numeric offsets and raw words.
+_PROGRAM = """\
+start:
+  ADD $1, $2, $3
+  ADDU $4, $5, $6
+  SUB $7, $8, $9
+  SUBU $10, $11, $12
+  AND $13, $14, $15
+  OR $16, $17, $18
+  XOR $19, $20, $21
+  NOR $22, $23, $24
+  SLT $25, $26, $27
+  SLTU $28, $29, $30
+  SLL $1, $2, 31
+  SRL $3, $4, 1
+  SRA $5, $6, 7
+  SLLV $7, $8, $9
+  SRLV $10, $11, $12
+  SRAV $13, $14, $15
+  JR $31
+  JALR $30, $29
+  JALR $28
+  ADDI $1, $0, -1
+  ADDIU $2, $1, 100
+  SLTI $3, $2, -32768
+  SLTIU $4, $3, 5
+  ANDI $5, $4, 0xFFFF
+  ORI $6, $5, 0xF0
+  XORI $7, $6, 255
+loop: LUI $8, 0x1234
+  LW $9, 4($10)
+  SW $11, -8($12)
+  BEQ $1, $2, loop
+  BNE $3, $4, 2
+  BLEZ $5, start
+  BGTZ $6, end
+  BLTZ $7, -1
+  BGEZ $8, loop
+  J end
+  JAL 120
+  .word 0xDEADBEEF
+  NOP
+end: J end
+"""
+
+
+def test_assemble_disassemble_round_trip() -> None:
+    words = assemble(_PROGRAM)
+    assert len(words) == 40
+    text = disassemble(words)
+    assert text[0] == "ADD $1, $2, $3"
+    assert assemble("\n".join(text)) == words
+    # Words no instruction encodes to come back as .word.
+    assert text[37].upper().startswith(".WORD")
+
+
+def test_testbench_program_round_trip() -> None:
+    words, defined = read_memh(_ROOT / "intruction.hex", 256)
+    n = max(i + 1 for i, d in enumerate(defined) if d)
+    program = words[:n]
+    assert assemble("\n".join(disassemble(program))) == program
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_memh_round_trip(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, use_numpy: bool) -> None:
+    if use_numpy and mips_asm.np is None:
+        pytest.skip("numpy não instalado")
+    if not use_numpy:
+        monkeypatch.setattr(mips_asm, "np", None)
+    words = array("I", [0, 1, 0xFFFFFFFF, 0x8C150004, 0x0000ABCD] * 7)
+    defined = bytearray(b"\x01" * len(words))
+    defined[3] = 0
+    expected = array("I", words)
+    expected[3] = 0
+
+    for comments in (None, [f"w{i}" for i in range(len(words))]):
+        path = tmp_path / "mem.hex"
+        write_memh(path, words, defined, comments)
+        got, got_defined = read_memh(path, 64)
+        assert got[: len(words)] == expected
+        assert got_defined[: len(words)] == defined
+        assert not any(got[len(words) :]) and not any(got_defined[len(words) :])
+
+    # Addresses, underscores, x digits and words past the depth.
+    got, got_defined = parse_memh("// c\n@2 0000_0001 /* c */ 1x\n@6 a b c", 8)
+    assert list(got) == [0, 0, 1, 0, 0, 0, 10, 11]
+    assert list(got_defined) == [0, 0, 1, 0, 0, 0, 1, 1]
+    assert format_memh([1, 2], bytearray(b"\x00\x01")) == "// 0x00000000\nxxxxxxxx\n00000002\n"
+    with pytest.raises(AsmError):
+        parse_memh("@zz 1", 4)
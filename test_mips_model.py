@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from mips_model import MipsModel
+
+_ROOT = Path(__file__).resolve().parent
+
+# The writebacks tb/tb_mips_top.v checks, in program order: ADDI .. SLTIU,
+# then the two loads.
+_TB_WRITEBACKS = [
+    0x00000005, 0x0000000A, 0x0000000F, 0xFFFFFFFF,
+    0x0000000F, 0x0000000F, 0x00000005, 0x0000000A,
+    0x00000000, 0x0000000F, 0x0000000F, 0xFFFFFFF0,
+    0x00000069, 0x0000000A, 0x000000FA, 0x000000F5,
+    0x12340000, 0x00000001, 0x00000000,
+]
+
+
+def test_model_runs_the_testbench_program() -> None:
+    model = MipsModel.from_hex(_ROOT / "intruction.hex")
+    trace = model.run(1000)
+    by_pc = {s.pc: s for s in trace}
+
+    assert [s.writeback for s in trace[:19]] == _TB_WRITEBACKS
+    assert [s.dest for s in trace[:19]] == list(range(1, 20))
+    # SW then LW of mem[0] and mem[4].
+    assert (model.dmem[0], model.dmem[4]) == (5, 10)
+    assert [(by_pc[pc].dest, by_pc[pc].writeback) for pc in (21, 22)] == [(20, 5), (21, 10)]
+
+    # Branch and jump targets the testbench checks on the PC.
+    assert {pc: by_pc[pc].next_pc for pc in (23, 27, 32, 36, 40, 47)} == {
+        23: 26, 27: 29, 32: 34, 36: 38, 40: 45, 47: 48,
+    }
+    assert (by_pc[31].dest, by_pc[31].writeback) == (24, 0xFFFFFFFE)
+    assert (by_pc[45].dest, by_pc[45].writeback) == (29, 7)
+    assert (by_pc[49].dest, by_pc[49].writeback) == (31, 1)
+    assert [by_pc[pc].writeback for pc in (50, 51, 53, 54, 55)] == [1, 0, 0x1E, 7, 7]
+
+    # JAL links the next PC into $31 and ends the program at 120.
+    jal = trace[-1]
+    assert (jal.pc, jal.next_pc, jal.dest, jal.writeback) == (56, 120, 31, 57)
+    assert model.halted
+    assert [model.regs[r] for r in (1, 2, 3, 4, 5, 17, 20, 21)] == [
+        0x00000005, 0x0000000A, 0x0000000F, 0xFFFFFFFF, 0x0000000F, 0x12340000, 0x00000005, 0x0000000A,
+    ]
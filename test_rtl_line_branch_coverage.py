@@ -0,0 +1,179 @@
+from pathlib import Path
+
+import pytest
+
+from rtl_line_branch_coverage import ProbeHits, instrument_verilog_file, probe_id_bases
+from vcd_reader import read_vcd, read_vcd_chunked
+from vcd_trace import convert_vcd, read_trace
+
+# A counter probe (count=True) hit on three clock edges, and a plain one.
+_COUNTER_VCD = (
+    "$timescale 1ps $end\n"
+    "$scope module tb $end\n"
+    "$var reg 1 ! clk $end\n"
+    "$scope module uut $end\n"
+    "$var reg 32 # __cov_L000000001 [31:0] $end\n"
+    "$var reg 1 $ __cov_B000000002 $end\n"
+    "$upscope $end\n"
+    "$upscope $end\n"
+    "$enddefinitions $end\n"
+    "#0\n"
+    "$dumpvars\n"
+    "0!\n"
+    "b0 #\n"
+    "0$\n"
+    "$end\n"
+    "#10\n"
+    "1!\n"
+    "b1 #\n"
+    "#15\n"
+    "0!\n"
+    "#20\n"
+    "1!\n"
+    "b10 #\n"
+    "1$\n"
+    "#25\n"
+    "0!\n"
+    "#30\n"
+    "1!\n"
+    "b11 #\n"
+    "#35\n"
+    "0!\n"
+)
+
+
+def _probe_hits() -> list[ProbeHits]:
+    return [ProbeHits(probe_names={"__cov_L000000001", "__cov_B000000002"}, count_hits=True)]
+
+
+def test_counter_probe_counts_every_hit(tmp_path: Path) -> None:
+    vcd = tmp_path / "counter.vcd"
+    vcd.write_text(_COUNTER_VCD, encoding="ascii")
+    trace = tmp_path / "counter.vtrace"
+    convert_vcd(vcd, trace)
+
+    single = _probe_hits()
+    read_vcd(vcd, single)
+    _header, chunked = read_vcd_chunked(vcd, _probe_hits, jobs=2)
+    columnar = _probe_hits()
+    read_trace(trace, columnar)
+    for hits in (single, chunked, columnar):
+        assert hits[0].probe_stats() == {
+            "__cov_L000000001": {"first_hit": 10, "hits": 3},
+            "__cov_B000000002": {"first_hit": 20},
+        }
+
+
+def _instrument(tmp_path: Path, src: str, **kw: bool) -> tuple[list, str]:
+    path = tmp_path / "m.v"
+    path.write_text(src, encoding="utf-8")
+    out = tmp_path / "m_cov.v"
+    probes, _n = instrument_verilog_file(path, out, probe_start_id=0, **kw)
+    text = out.read_text(encoding="utf-8")
+    # Probes go on the lines of the statements they cover.
+    assert len(text.splitlines()) == len(src.splitlines())
+    return probes, text
+
+
+def _kinds(probes: list) -> list[tuple[str, int, str]]:
+    return [(p.kind, p.line, p.detail) for p in probes]
+
+
+_PROCEDURAL = """\
+module m(input clk, input a, input [1:0] s, output reg y, output reg [3:0] z);
+  // begin ; end in a comment
+  always @(posedge clk) begin
+    if (a)
+      y <= 1'b1;
+    else
+      y <= 1'b0;
+    case (s)
+      2'b00: z <= 4'd1;
+      2'b01: begin
+        z <= 4'd2;
+        if (a) begin
+          z <= 4'd3;
+        end
+      end
+      default: z <= 4'd0;
+    endcase
+    $display("begin; end");
+  end
+endmodule
+"""
+
+
+def test_instrument_if_else_case_and_nested_blocks(tmp_path: Path) -> None:
+    probes, text = _instrument(tmp_path, _PROCEDURAL)
+    assert _kinds(probes) == [
+        ("line", 4, "if"),
+        ("branch", 4, "if_true"),
+        ("line", 5, "stmt"),
+        ("branch", 6, "else"),
+        ("line", 7, "stmt"),
+        ("line", 8, "case"),
+        ("branch", 9, "case_item"),
+        ("line", 9, "stmt"),
+        ("branch", 10, "case_item"),
+        ("line", 11, "stmt"),
+        ("line", 12, "if"),
+        ("branch", 12, "if_true"),
+        ("line", 13, "stmt"),
+        ("branch", 16, "case_item"),
+        ("line", 16, "stmt"),
+        ("line", 18, "stmt"),
+    ]
+    lines = text.splitlines()
+    # Single statements of if/else and case items are wrapped in begin/end.
+    assert lines[4].split() == ["begin", "__cov_B000000002", "=", "1'b1;", "y", "<=", "1'b1;", "end"]
+    assert lines[15].strip() == "default: begin __cov_B000000014 = 1'b1; z <= 4'd0; end"
+    # Comments and strings are left alone.
+    assert lines[1] == "  // begin ; end in a comment"
+    assert lines[17].endswith('$display("begin; end");')
+    # Probes of a straight-line run share the reg of its first probe.
+    by_name = {p.name: p for p in probes}
+    assert by_name["__cov_L000000011"].block == "__cov_B000000009"
+    assert "reg __cov_L000000011;" not in lines[0]
+
+
+def test_counting_probes_increment(tmp_path: Path) -> None:
+    probes, text = _instrument(tmp_path, _PROCEDURAL, count=True)
+    lines = text.splitlines()
+    assert "reg [31:0] __cov_B000000002 = 0;" in lines[0]
+    assert "__cov_B000000002 = __cov_B000000002 + 1;" in lines[4]
+
+
+_CONTINUOUS = """\
+module g #(parameter N = 2) (input [3:0] a, input b, output [3:0] y, output c, output [7:0] w);
+  assign {c, y[3:1]} = {b, a[2:0]};
+  assign y[0] = a[3] ^ b;
+  assign w[N-1:0] = a[1:0]; /* ; begin */
+  genvar i;
+  generate
+    for (i = 2; i < 8; i = i + 1) begin : gen_w
+      assign w[i] = a[i % 4];
+    end
+  endgenerate
+endmodule
+"""
+
+
+def test_instrument_assign_and_generate(tmp_path: Path) -> None:
+    probes, text = _instrument(tmp_path, _CONTINUOUS)
+    assert _kinds(probes) == [("line", n, "assign") for n in (2, 3, 4, 8)]
+    lines = text.splitlines()
+    # An assign is hit when one of its targets changes; indices are not targets.
+    assert lines[1].endswith("always @(c or y) begin __cov_L000000001 = 1'b1; end")
+    assert lines[2].endswith("always @(y) begin __cov_L000000002 = 1'b1; end")
+    assert lines[3].endswith("always @(w) begin __cov_L000000003 = 1'b1; end /* ; begin */")
+    assert lines[7].endswith("always @(w) begin __cov_L000000004 = 1'b1; end")
+
+
+def test_probe_id_bases_depend_on_file_names_only(tmp_path: Path) -> None:
+    a, b = tmp_path / "alu.v", tmp_path / "regs.v"
+    bases = probe_id_bases([a, b])
+    assert probe_id_bases([b, a]) == bases[::-1]
+    assert probe_id_bases([tmp_path / "x" / "alu.v"]) == bases[:1]
+    assert len(set(bases)) == 2
+    with pytest.raises(RuntimeError):
+        probe_id_bases([a, tmp_path / "x" / "alu.v"])
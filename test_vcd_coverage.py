@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import pytest
+
+from vcd_coverage import analyze_vcd, np
+
+# Value lines with the blanks other writers emit: indentation, tabs, CRLF,
+# repeated and trailing separators.
+_IRREGULAR_VCD = (
+    "$timescale 1ps $end\n"
+    "$scope module tb $end\n"
+    "$var reg 1 ! clk $end\n"
+    "$scope module uut $end\n"
+    "$var reg 8 # data [7:0] $end\n"
+    "$var reg 4 $ nib [3:0] $end\n"
+    "$var reg 1 % en $end\n"
+    "$upscope $end\n"
+    "$upscope $end\n"
+    "$enddefinitions $end\n"
+    "#0\n"
+    "$dumpvars\n"
+    "  0!\n"
+    "\tb00000000 #\n"
+    "b0000\t$\n"
+    "0% \n"
+    "$end\n"
+    "#5\n"
+    "    1!\n"
+    "  b11110000   #\r\n"
+    "b1010 $ \r\n"
+    "\t1%\n"
+    "#10\n"
+    "0!\n"
+    "b00001111 #\n"
+    "\tb0101\t\t$\n"
+)
+
+
+@pytest.mark.skipif(np is None, reason="numpy não instalado")
+def test_numpy_engine_matches_python_on_irregular_blanks(tmp_path: Path) -> None:
+    vcd = tmp_path / "irregular.vcd"
+    vcd.write_bytes(_IRREGULAR_VCD.encode("ascii"))
+    results = {
+        engine: analyze_vcd(vcd, include_tb=True, engine=engine)
+        for engine in ("python", "numpy")
+    }
+    python_cov = results["python"]["coverage_by_code"]
+    numpy_cov = results["numpy"]["coverage_by_code"]
+    assert {c: (v.seen0, v.seen1) for c, v in numpy_cov.items()} == {
+        c: (v.seen0, v.seen1) for c, v in python_cov.items()
+    }
+    # Every bit of every signal toggled in the dump.
+    assert all(v.covered_bits() == v.total_bits() for v in python_cov.values())
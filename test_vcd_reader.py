@@ -0,0 +1,145 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from vcd_coverage import ToggleCoverage
+from vcd_reader import VcdConsumer, VcdHeader, index_path, load_index, read_vcd, read_vcd_chunked
+
+# Cycles of the generated dump: enough for a few index regions.
+_CYCLES = 30000
+
+
+def _write_vcd(path: Path, cycles: int, *, rare_at: tuple[int, ...], probe_at: int) -> None:
+    # A clocked dump shaped like tb_mips_top's: the clock and two vectors
+    # change every cycle, `rare` only at `rare_at` and the probe once.
+    lines = [
+        "$timescale 1ps $end",
+        "$scope module tb $end",
+        "$var reg 1 ! clk $end",
+        "$scope module uut $end",
+        "$var reg 32 # program_counter [31:0] $end",
+        "$var reg 32 $ instruction [31:0] $end",
+        "$var reg 1 % rare $end",
+        "$var reg 1 & __cov_L000000001 $end",
+        "$upscope $end",
+        "$upscope $end",
+        "$enddefinitions $end",
+        "#0",
+        "$dumpvars",
+        "0!",
+        "b0 #",
+        "b0 $",
+        "0%",
+        "0&",
+        "$end",
+    ]
+    rare = 0
+    for n in range(1, cycles + 1):
+        lines.append(f"#{n * 10}")
+        lines.append("1!")
+        lines.append(f"b{n * 4:b} #")
+        lines.append(f"b{(n * 2654435761) & 0xFFFFFFFF:b} $")
+        if n in rare_at:
+            rare ^= 1
+            lines.append(f"{rare}%")
+        if n == probe_at:
+            lines.append("1&")
+        lines.append(f"#{n * 10 + 5}")
+        lines.append("0!")
+    path.write_text("\n".join(lines) + "\n", encoding="ascii")
+
+
+class _Recorder(VcdConsumer):
+    # Every delivered change of the named signals with its timestamp.
+    timed = True
+
+    def __init__(self, names: set[str]) -> None:
+        self.names = names
+        self.log: list[tuple[int, str, str]] = []
+
+    def begin(self, header: VcdHeader) -> None:
+        self.codes = {c for c, v in header.vars_by_code.items() if v.name.split(".")[-1] in self.names}
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        self.log.append((self.now, code, ch))
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        self.log.append((self.now, code, value.decode("ascii")))
+
+    def merge(self, other: "_Recorder") -> None:
+        self.log.extend(other.log)
+
+
+def _consumers() -> list[VcdConsumer]:
+    return [ToggleCoverage(), _Recorder({"rare", "__cov_L000000001"}), _Recorder({"clk", "program_counter"})]
+
+
+def _results(consumers: list[VcdConsumer]) -> tuple:
+    toggle, rare, clocked = consumers
+    cov = {c: (v.seen0, v.seen1) for c, v in toggle.coverage_by_code().items()}  # type: ignore[attr-defined]
+    return cov, rare.log, clocked.log  # type: ignore[attr-defined]
+
+
+@pytest.fixture(scope="module")
+def dump(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    path = tmp_path_factory.mktemp("vcd") / "dump.vcd"
+    _write_vcd(path, _CYCLES, rare_at=(3, 12000, 29000), probe_at=21000)
+    return path
+
+
+@pytest.fixture(scope="module")
+def single(dump: Path) -> tuple:
+    consumers = _consumers()
+    read_vcd(dump, consumers)
+    return _results(consumers)
+
+
+def test_single_read_sees_every_change(single: tuple) -> None:
+    _cov, rare, clocked = single
+    assert rare == [(0, "%", "0"), (0, "&", "0"), (30, "%", "1"), (120000, "%", "0"), (210000, "&", "1"), (290000, "%", "1")]
+    assert len(clocked) == 2 + 3 * _CYCLES
+    assert clocked[-3:] == [(_CYCLES * 10, "!", "1"), (_CYCLES * 10, "#", f"{_CYCLES * 4:b}"), (_CYCLES * 10 + 5, "!", "0")]
+
+
+@pytest.mark.parametrize("jobs", [2, 3, 8])
+def test_chunked_read_matches_single_process(dump: Path, single: tuple, jobs: int) -> None:
+    _header, consumers = read_vcd_chunked(dump, _consumers, jobs=jobs)
+    assert _results(consumers) == single
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_indexed_read_matches_plain_read(tmp_path: Path, dump: Path, single: tuple, jobs: int) -> None:
+    vcd = tmp_path / "dump.vcd"
+    vcd.write_bytes(dump.read_bytes())
+    # The first read builds the index, the second seeks with it.
+    for _ in range(2):
+        _header, consumers = read_vcd_chunked(vcd, _consumers, jobs=jobs, use_index=True)
+        assert _results(consumers) == single
+    index = load_index(vcd)
+    assert index is not None and len(index.region_offsets) > 1
+    # A read of the rare signals alone skips the regions where they do not change.
+    regions = index.regions_for({"%", "&"}, index.data_start, index.size)
+    assert len(regions) < len(index.region_offsets)
+
+
+@pytest.mark.parametrize("same_size", [True, False])
+def test_stale_index_is_rebuilt(tmp_path: Path, same_size: bool) -> None:
+    vcd = tmp_path / "dump.vcd"
+    _write_vcd(vcd, _CYCLES, rare_at=(3, 12000, 29000), probe_at=21000)
+    read_vcd(vcd, _consumers(), use_index=True)
+    assert index_path(vcd).exists()
+    old = vcd.stat()
+
+    # Rewritten in place: other change times, same or different length.
+    _write_vcd(vcd, _CYCLES if same_size else _CYCLES // 2, rare_at=(5, 7000, 9000), probe_at=8000)
+    if same_size:
+        assert vcd.stat().st_size == old.st_size
+        os.utime(vcd, ns=(old.st_atime_ns, old.st_mtime_ns + 1_000_000))
+    assert load_index(vcd) is None
+
+    fresh = _consumers()
+    read_vcd(vcd, fresh)
+    _header, consumers = read_vcd_chunked(vcd, _consumers, jobs=2, use_index=True)
+    assert _results(consumers) == _results(fresh)
+    assert load_index(vcd) is not None
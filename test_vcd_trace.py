@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import pytest
+
+from rtl_line_branch_coverage import ProbeHits
+from vcd_coverage import analyze_vcd
+from vcd_reader import VcdConsumer, VcdHeader, read_vcd
+from vcd_trace import convert_vcd, read_trace, zstandard
+
+
+def _write_vcd(path: Path, cycles: int) -> None:
+    # The clock, PC and instruction of tb_mips_top plus a vector that goes
+    # through x/z and scalar-form values, and two probes.
+    lines = [
+        "$timescale 1ps $end",
+        "$scope module tb_mips_top $end",
+        "$var reg 1 ! clk $end",
+        "$scope module uut $end",
+        "$var wire 32 # program_counter [31:0] $end",
+        "$var wire 32 $ instruction [31:0] $end",
+        "$var wire 4 % bus [3:0] $end",
+        "$var reg 1 & __cov_L000000001 $end",
+        "$var reg 1 ' __cov_B000000002 $end",
+        "$upscope $end",
+        "$upscope $end",
+        "$enddefinitions $end",
+        "#0",
+        "$dumpvars",
+        "0!",
+        "bx #",
+        "bx $",
+        "bz %",
+        "0&",
+        "0'",
+        "$end",
+    ]
+    for n in range(1, cycles + 1):
+        lines.append(f"#{n * 10}")
+        lines.append("1!")
+        lines.append(f"b{n * 4:b} #")
+        lines.append(f"b{(n * 0x01234567) & 0xFFFFFFFF:b} $")
+        lines.append(("b1x0z %", "x%", f"b{n & 15:b} %", "1%")[n % 4])
+        if n == 7:
+            lines.append("1&")
+        if n == cycles - 1:
+            lines.append("1'")
+        lines.append(f"#{n * 10 + 5}")
+        lines.append("0!")
+    path.write_text("\n".join(lines) + "\n", encoding="ascii")
+
+
+class _Recorder(VcdConsumer):
+    # Every delivered change of the named signals with its timestamp.
+    timed = True
+
+    def __init__(self, names: set[str]) -> None:
+        self.names = names
+        self.log: list[tuple[int, str, str]] = []
+
+    def begin(self, header: VcdHeader) -> None:
+        self.codes = {c for c, v in header.vars_by_code.items() if v.name.split(".")[-1] in self.names}
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        self.log.append((self.now, code, ch))
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        self.log.append((self.now, code, value.decode("ascii")))
+
+
+def _summary(result: dict) -> tuple:
+    return (
+        {c: (v.seen0, v.seen1) for c, v in result["coverage_by_code"].items()},
+        result["sample_count"],
+        list(result["executed_pcs"]),
+        list(result["executed_instrs"]),
+        result["opcode_hist"],
+        result["funct_hist"],
+    )
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_trace_reads_like_the_vcd(tmp_path: Path, codec: str) -> None:
+    if codec == "zstd" and zstandard is None:
+        pytest.skip("zstandard não instalado")
+    vcd = tmp_path / "dump.vcd"
+    trace = tmp_path / "dump.vtrace"
+    _write_vcd(vcd, 200)
+    convert_vcd(vcd, trace, codec=codec)
+
+    assert _summary(analyze_vcd(trace, include_tb=True, keep_samples=True)) == _summary(
+        analyze_vcd(vcd, include_tb=True, keep_samples=True)
+    )
+
+    logs = {}
+    for path, read in ((vcd, read_vcd), (trace, read_trace)):
+        recorder = _Recorder({"clk", "bus", "__cov_B000000002"})
+        hits = ProbeHits(probe_names={"__cov_L000000001", "__cov_B000000002"})
+        read(path, [recorder, hits])
+        logs[path] = (recorder.log, hits.probe_stats())
+    assert logs[trace] == logs[vcd]
+    assert len(logs[vcd][0]) == 3 + 3 * 200 + 1
+    assert logs[vcd][1] == {"__cov_L000000001": {"first_hit": 70}, "__cov_B000000002": {"first_hit": 1990}}
@@ -1,123 +1,101 @@
 import argparse
+import re
 import sys
+from array import array
 from collections import defaultdict
 from dataclasses import dataclass
+from functools import partial, reduce
+from operator import and_, or_
 from pathlib import Path
+from typing import Iterable, Iterator
 
+from functional_coverage import Covergroup, FunctionalCoverage, load_spec
+from vcd_reader import VcdConsumer, VcdHeader, find_signal_code
+from vcd_trace import TraceColumn, is_trace, read_dump
 
-@dataclass(frozen=True)
-class VcdVar:
-    code: str
-    name: str
-    width: int
-
-
-@dataclass
-class BitCoverage:
-    seen0: bool = False
-    seen1: bool = False
+try:
+    import numpy as np
+except ImportError:  # only needed by --engine numpy
+    np = None
 
-    def add(self, ch: str) -> None:
-        if ch == "0":
-            self.seen0 = True
-        elif ch == "1":
-            self.seen1 = True
 
-    def covered(self) -> bool:
-        return self.seen0 and self.seen1
+_SCALAR_DIGITS = list(b"01xzXZ")
+# Blanks the vectorized parser does not expect: tabs, indentation, trailing,
+# repeated or lone \r separators.
+_IRREGULAR_BLANKS = re.compile(rb"[\t\v\f]|\r(?!\n)|^ | \r| $|  ", re.M)
+_ONES = bytes.maketrans(b"0xzXZ", b"00000")
+_ZEROS = bytes.maketrans(b"01xzXZ", b"100000")
+_MAX_BINS_SHOWN = 32
 
 
 @dataclass
 class VarCoverage:
-    bits: list[BitCoverage]
+    # Toggle state packed as two bitmasks (bit 0 = LSB of the signal).
+    width: int
+    seen0: int = 0
+    seen1: int = 0
 
     @classmethod
     def for_width(cls, width: int) -> "VarCoverage":
-        return cls(bits=[BitCoverage() for _ in range(width)])
+        return cls(width=width)
 
     def add_scalar(self, ch: str) -> None:
-        self.bits[0].add(ch)
+        if ch == "0":
+            self.seen0 |= 1
+        elif ch == "1":
+            self.seen1 |= 1
+
+    def add_vector(self, value: bytes) -> None:
+        full = (1 << self.width) - 1
+        try:
+            ones = int(value, 2) & full
+        except ValueError:
+            # x/z digits: neither seen0 nor seen1 for those bits. Short values
+            # are zero-extended, as before.
+            n = min(len(value), self.width)
+            value = value[-n:] if n else b"0"
+            ones = int(value.translate(_ONES), 2)
+            zeros = int(value.translate(_ZEROS), 2) | (full ^ ((1 << n) - 1))
+            self.seen1 |= ones
+            self.seen0 |= zeros
+            return
+        self.seen1 |= ones
+        self.seen0 |= full ^ ones
+
+    def add_ints(self, values: set[int]) -> None:
+        # Binary vector values already parsed: OR of the values gives the
+        # ones, NOT of their AND the zeros.
+        if not values:
+            return
+        full = (1 << self.width) - 1
+        self.seen1 |= reduce(or_, values) & full
+        self.seen0 |= full & ~reduce(and_, values)
 
-    def add_vector(self, binstr: str) -> None:
-        s = binstr.strip().lower()
-        if len(s) < len(self.bits):
-            s = s.zfill(len(self.bits))
-        if len(s) > len(self.bits):
-            s = s[-len(self.bits) :]
-        for i, ch in enumerate(s):
-            self.bits[i].add(ch)
+    def add_values(self, values: "Iterable[str | bytes]") -> None:
+        for value in values:
+            if value.__class__ is str:
+                self.add_scalar(value)
+            else:
+                self.add_vector(value)
 
     def covered_bits(self) -> int:
-        return sum(1 for b in self.bits if b.covered())
+        return (self.seen0 & self.seen1).bit_count()
 
     def total_bits(self) -> int:
-        return len(self.bits)
+        return self.width
 
     def covered(self) -> bool:
         return self.covered_bits() == self.total_bits()
 
+    def merge(self, other: "VarCoverage") -> None:
+        self.seen0 |= other.seen0
+        self.seen1 |= other.seen1
 
-def _hier_join(stack: list[str], ref: str) -> str:
-    if not stack:
-        return ref
-    return ".".join(stack + [ref])
-
-
-def parse_vcd_definitions(vcd_path: Path) -> tuple[dict[str, VcdVar], dict[str, str]]:
-    vars_by_code: dict[str, VcdVar] = {}
-    code_to_scope: dict[str, str] = {}
-    scope_stack: list[str] = []
-
-    with vcd_path.open("r", encoding="utf-8", errors="replace") as f:
-        for raw in f:
-            line = raw.strip()
-            if not line:
-                continue
-            if line.startswith("$scope"):
-                parts = line.split()
-                if len(parts) >= 3:
-                    scope_stack.append(parts[2])
-                continue
-            if line.startswith("$upscope"):
-                if scope_stack:
-                    scope_stack.pop()
-                continue
-            if line.startswith("$var"):
-                parts = line.split()
-                if len(parts) < 5:
-                    continue
-                width = int(parts[2])
-                code = parts[3]
-                ref = parts[4]
-                full_name = _hier_join(scope_stack, ref)
-                vars_by_code[code] = VcdVar(code=code, name=full_name, width=width)
-                code_to_scope[code] = ".".join(scope_stack)
-                continue
-            if line.startswith("$enddefinitions"):
-                break
 
-    return vars_by_code, code_to_scope
-
-
-def find_signal_code(vars_by_code: dict[str, VcdVar], suffix: str) -> str | None:
-    matches = [v.code for v in vars_by_code.values() if v.name.endswith(suffix)]
-    if len(matches) == 1:
-        return matches[0]
-    if not matches:
-        return None
-    matches_sorted = sorted(
-        matches,
-        key=lambda c: len(vars_by_code[c].name),
-    )
-    return matches_sorted[0]
-
-
-def decode_u32(binstr: str) -> int | None:
-    s = binstr.strip().lower()
-    if any(ch in "xz" for ch in s):
-        return None
+def decode_u32(binstr: str | bytes) -> int | None:
+    # int() already rejects x/z digits and tolerates surrounding whitespace.
     try:
-        return int(s, 2)
+        return int(binstr, 2)
     except ValueError:
         return None
 
@@ -150,96 +128,357 @@ def is_probably_constant_symbol(full_name: str) -> bool:
     return any(ch.isupper() for ch in leaf)
 
 
-def should_ignore_for_coverage(scope: str, full_name: str, include_tb: bool) -> bool:
-    if not include_tb and not scope.startswith("tb_mips_top.uut"):
+def should_ignore_for_coverage(scope: str, full_name: str, include_tb: bool, top: str = "tb_mips_top") -> bool:
+    if not include_tb and not scope.startswith(f"{top}.uut"):
         return True
-    if scope.startswith("tb_mips_top.check_"):
+    if scope.startswith(f"{top}.check_"):
         return True
     if is_probably_constant_symbol(full_name):
         return True
     return False
 
 
-def analyze_vcd(vcd_path: Path, *, include_tb: bool) -> dict[str, object]:
-    vars_by_code, code_to_scope = parse_vcd_definitions(vcd_path)
-    cov_by_code: dict[str, VarCoverage] = {c: VarCoverage.for_width(v.width) for c, v in vars_by_code.items()}
-
-    clk_code = find_signal_code(vars_by_code, ".clk")
-    pc_code = find_signal_code(vars_by_code, ".uut.program_counter")
-    instr_code = find_signal_code(vars_by_code, ".uut.instruction")
-
-    last_scalar: dict[str, str] = {}
-    last_vector: dict[str, str] = {}
-
-    clk_prev = None
-    executed_pcs: list[int] = []
-    executed_instrs: list[int] = []
-    opcode_hist = defaultdict(int)
-    funct_hist = defaultdict(int)
-    regimm_rt_hist = defaultdict(int)
-
-    def sample_on_rising_edge() -> None:
-        if pc_code is None or instr_code is None:
+class ToggleCoverage(VcdConsumer):
+    def __init__(self) -> None:
+        self.cov_by_code: dict[str, VarCoverage] = {}
+
+    def begin(self, header: VcdHeader) -> None:
+        self.cov_by_code = {c: VarCoverage.for_width(v.width) for c, v in header.vars_by_code.items()}
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        self.cov_by_code[code].add_scalar(ch)
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        self.cov_by_code[code].add_vector(value)
+
+    def on_signal(self, code: str, column: TraceColumn) -> None:
+        ints, others = column.distinct_parts()
+        vc = self.cov_by_code[code]
+        vc.add_ints(ints)
+        vc.add_values(others)
+
+    def coverage_by_code(self) -> dict[str, VarCoverage]:
+        return self.cov_by_code
+
+    def merge(self, other: "ToggleCoverage") -> None:
+        for code, vc in other.cov_by_code.items():
+            self.cov_by_code[code].merge(vc)
+
+
+class NumpyToggleCoverage(VcdConsumer):
+    # Batch backend: every dump block is parsed with vectorized NumPy ops into
+    # (signal index, ones, zeros) arrays that are OR-reduced per signal, so
+    # there is no Python work per value change. Signals wider than 64 bits or
+    # with id codes longer than 8 bytes stay on the per-line VarCoverage path.
+    _MAX_KEY_BYTES = 8
+
+    def __init__(self) -> None:
+        self.slow_cov: dict[str, VarCoverage] = {}
+        self.packed_codes: list[str] = []
+        self.widths: list[int] = []
+
+    def begin(self, header: VcdHeader) -> None:
+        packed: list[tuple[int, str, int]] = []
+        for code, v in header.vars_by_code.items():
+            raw = code.encode("utf-8")
+            if 0 < v.width <= 64 and len(raw) <= self._MAX_KEY_BYTES:
+                packed.append((int.from_bytes(raw, "little"), code, v.width))
+            else:
+                self.slow_cov[code] = VarCoverage.for_width(v.width)
+        packed.sort()
+        self.codes = set(self.slow_cov)
+        self.packed_codes = [c for _k, c, _w in packed]
+        self.widths = [w for _k, _c, w in packed]
+        self._max_code_len = max((len(c.encode("utf-8")) for c in self.packed_codes), default=0)
+        self._keys = np.array([k for k, _c, _w in packed], dtype=np.uint64)
+        self._width = np.array(self.widths, dtype=np.int64)
+        self._full = self._low_mask(self._width)
+        self._seen0 = np.zeros(len(packed), dtype=np.uint64)
+        self._seen1 = np.zeros(len(packed), dtype=np.uint64)
+
+    @staticmethod
+    def _low_mask(n: "np.ndarray") -> "np.ndarray":
+        # (1 << n) - 1 for n in [0, 64] without shifting a uint64 by 64.
+        shifted = np.left_shift(np.uint64(1), np.minimum(n, 63).astype(np.uint64)) - np.uint64(1)
+        return np.where(n >= 64, ~np.uint64(0), shifted)
+
+    def _lookup(self, a: "np.ndarray", cs: "np.ndarray", ce: "np.ndarray") -> tuple["np.ndarray", "np.ndarray"]:
+        # Packs each id code (little endian, up to 8 bytes) and binary
+        # searches it in the sorted key table.
+        length = ce - cs
+        key = np.zeros(cs.size, dtype=np.uint64)
+        for k in range(self._max_code_len):
+            valid = length > k
+            d = a[np.where(valid, cs + k, 0)].astype(np.uint64)
+            key |= np.where(valid, d, np.uint64(0)) << np.uint64(8 * k)
+        pos = np.minimum(np.searchsorted(self._keys, key), self._keys.size - 1)
+        found = (length >= 1) & (length <= self._max_code_len) & (self._keys[pos] == key)
+        return pos, found
+
+    @staticmethod
+    def _canonical(block: bytes) -> bytes:
+        # Rewrites the value lines the way vcd_reader reads them: stripped,
+        # with the scalar id code trimmed and the vector value and id code
+        # separated by one space.
+        out: list[bytes] = []
+        for line in block.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] in _SCALAR_DIGITS:
+                out.append(line[:1] + line[1:].strip())
+            elif line[0] == 0x62 or line[0] == 0x42:
+                parts = line.split()
+                if len(parts) == 2:
+                    out.append(b" ".join(parts))
+            else:
+                out.append(line)
+        return b"\n".join(out)
+
+    def on_block(self, block: bytes) -> None:
+        if not self._keys.size or not block:
+            return
+        if _IRREGULAR_BLANKS.search(block):
+            block = self._canonical(block)
+            if not block:
+                return
+        a = np.frombuffer(block, dtype=np.uint8)
+        ends = np.flatnonzero(a == 0x0A)
+        if a[-1] != 0x0A:
+            ends = np.append(ends, a.size)
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        ends = ends - ((ends > starts) & (a[ends - 1] == 0x0D))
+        keep = ends > starts
+        starts = starts[keep]
+        ends = ends[keep]
+        first = a[starts]
+
+        sm = np.isin(first, _SCALAR_DIGITS)
+        if sm.any():
+            sig, found = self._lookup(a, starts[sm] + 1, ends[sm])
+            d = first[sm][found]
+            sig = sig[found]
+            np.bitwise_or.at(self._seen1, sig, (d == 0x31).astype(np.uint64))
+            np.bitwise_or.at(self._seen0, sig, (d == 0x30).astype(np.uint64))
+
+        vm = (first == 0x62) | (first == 0x42)
+        if not vm.any():
+            return
+        vs = starts[vm]
+        ve = ends[vm]
+        spaces = np.flatnonzero(a == 0x20)
+        i = np.searchsorted(spaces, vs)
+        ok = i < spaces.size
+        vs, ve, i = vs[ok], ve[ok], i[ok]
+        sp = spaces[i]
+        ok = sp < ve
+        vs, ve, sp = vs[ok], ve[ok], sp[ok]
+        sig, found = self._lookup(a, sp + 1, ve)
+        vs, sp, sig = vs[found], sp[found], sig[found]
+        if not sig.size:
             return
-        pc_bin = last_vector.get(pc_code)
-        instr_bin = last_vector.get(instr_code)
-        if pc_bin is None or instr_bin is None:
+
+        # Digits are read right to left; values longer than the signal are
+        # truncated and shorter ones zero-extended, like VarCoverage.
+        take = np.minimum(sp - (vs + 1), self._width[sig])
+        ones = np.zeros(sig.size, dtype=np.uint64)
+        zeros = np.zeros(sig.size, dtype=np.uint64)
+        for k in range(int(take.max())):
+            valid = take > k
+            d = a[np.where(valid, sp - 1 - k, 0)]
+            bit = np.uint64(k)
+            ones |= ((d == 0x31) & valid).astype(np.uint64) << bit
+            zeros |= ((d == 0x30) & valid).astype(np.uint64) << bit
+        zeros |= self._full[sig] & ~self._low_mask(take)
+        np.bitwise_or.at(self._seen1, sig, ones)
+        np.bitwise_or.at(self._seen0, sig, zeros)
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        self.slow_cov[code].add_scalar(ch)
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        self.slow_cov[code].add_vector(value)
+
+    def merge(self, other: "NumpyToggleCoverage") -> None:
+        self._seen0 |= other._seen0
+        self._seen1 |= other._seen1
+        for code, vc in other.slow_cov.items():
+            self.slow_cov[code].merge(vc)
+
+    def coverage_by_code(self) -> dict[str, VarCoverage]:
+        cov = dict(self.slow_cov)
+        for i, code in enumerate(self.packed_codes):
+            cov[code] = VarCoverage(width=self.widths[i], seen0=int(self._seen0[i]), seen1=int(self._seen1[i]))
+        return cov
+
+
+class PcBitmap:
+    # Set of sampled PCs as 32 Ki-bit pages, so memory follows the program's
+    # footprint and not the number of cycles.
+    _PAGE_BITS = 15
+
+    def __init__(self) -> None:
+        self.pages: dict[int, bytearray] = {}
+
+    def add(self, pc: int) -> None:
+        page = self.pages.get(pc >> self._PAGE_BITS)
+        if page is None:
+            page = self.pages[pc >> self._PAGE_BITS] = bytearray(1 << (self._PAGE_BITS - 3))
+        off = pc & ((1 << self._PAGE_BITS) - 1)
+        page[off >> 3] |= 1 << (off & 7)
+
+    def merge(self, other: "PcBitmap") -> None:
+        for key, page in other.pages.items():
+            mine = self.pages.get(key)
+            if mine is None:
+                self.pages[key] = bytearray(page)
+            else:
+                self.pages[key] = bytearray((int.from_bytes(mine, "little") | int.from_bytes(page, "little")).to_bytes(len(page), "little"))
+
+    def __len__(self) -> int:
+        return sum(int.from_bytes(page, "little").bit_count() for page in self.pages.values())
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self.pages):
+            bits = int.from_bytes(self.pages[key], "little")
+            base = key << self._PAGE_BITS
+            while bits:
+                low = bits & -bits
+                yield base + low.bit_length() - 1
+                bits ^= low
+
+    def min(self) -> int:
+        return next(iter(self))
+
+    def max(self) -> int:
+        key = max(self.pages)
+        bits = int.from_bytes(self.pages[key], "little")
+        return (key << self._PAGE_BITS) + bits.bit_length() - 1
+
+
+class InstructionSampler(VcdConsumer):
+    # Samples PC and instruction on each rising clock edge. Only the current
+    # values of the two watched vectors are kept, as integers; samples are
+    # streamed into the histograms and the PC bitmap, and only recorded in
+    # order when `keep_samples` is set.
+    def __init__(self, *, keep_samples: bool = False) -> None:
+        self.clk_code: str | None = None
+        self.pc_code: str | None = None
+        self.instr_code: str | None = None
+        self.keep_samples = keep_samples
+        self.pc: int | None = None
+        self.instr: int | None = None
+        self.clk_prev: str | None = None
+        self.sample_count = 0
+        self.executed_pcs = array("I")
+        self.executed_instrs = array("I")
+        self.unique_pcs = PcBitmap()
+        self.opcode_hist = [0] * 64
+        self.funct_hist = [0] * 64
+        self.regimm_rt_hist = [0] * 32
+
+    def begin(self, header: VcdHeader) -> None:
+        vars_by_code = header.vars_by_code
+        self.clk_code = find_signal_code(vars_by_code, ".clk")
+        self.pc_code = find_signal_code(vars_by_code, ".uut.program_counter")
+        self.instr_code = find_signal_code(vars_by_code, ".uut.instruction")
+        self.codes = {c for c in (self.clk_code, self.pc_code, self.instr_code) if c is not None}
+        self.initial_codes = self.codes
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        if code != self.clk_code:
             return
-        pc_val = decode_u32(pc_bin)
-        instr_val = decode_u32(instr_bin)
+        ch = ch.lower()
+        if self.clk_prev == "0" and ch == "1":
+            self.sample_on_rising_edge()
+        self.clk_prev = ch
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        # x/z values decode to None and suppress sampling until resolved.
+        val = decode_u32(value)
+        if val is not None:
+            val &= 0xFFFFFFFF
+        if code == self.pc_code:
+            self.pc = val
+        if code == self.instr_code:
+            self.instr = val
+
+    def sample_on_rising_edge(self) -> None:
+        pc_val = self.pc
+        instr_val = self.instr
         if pc_val is None or instr_val is None:
             return
-        executed_pcs.append(pc_val)
-        executed_instrs.append(instr_val)
-        fields = instr_fields(instr_val)
-        op = fields["opcode"]
-        opcode_hist[op] += 1
+        self.sample_count += 1
+        if self.keep_samples:
+            self.executed_pcs.append(pc_val)
+            self.executed_instrs.append(instr_val)
+        self.unique_pcs.add(pc_val)
+        op = instr_val >> 26
+        self.opcode_hist[op] += 1
         if op == 0:
-            funct_hist[fields["funct"]] += 1
-        if op == 1:
-            regimm_rt_hist[fields["rt"]] += 1
-
-    with vcd_path.open("r", encoding="utf-8", errors="replace") as f:
-        in_dump = False
-        for raw in f:
-            line = raw.strip()
-            if not line:
-                continue
-            if not in_dump:
-                if line.startswith("$enddefinitions"):
-                    in_dump = True
-                continue
-            if line.startswith("$"):
-                continue
-            if line[0] == "#":
-                continue
-
-            if line[0] in "01xz":
-                ch = line[0].lower()
-                code = line[1:].strip()
-                if code in cov_by_code:
-                    cov_by_code[code].add_scalar(ch)
-                    last_scalar[code] = ch
-                if code == clk_code:
-                    if clk_prev is None:
-                        clk_prev = ch
-                    else:
-                        if clk_prev == "0" and ch == "1":
-                            sample_on_rising_edge()
-                        clk_prev = ch
-                continue
-
-            if line[0] in "bB":
-                try:
-                    _, rest = line[0], line[1:].strip()
-                    value, code = rest.split(None, 1)
-                except ValueError:
-                    continue
-                code = code.strip()
-                if code in cov_by_code:
-                    cov_by_code[code].add_vector(value)
-                    last_vector[code] = value
-                continue
+            self.funct_hist[instr_val & 0x3F] += 1
+        elif op == 1:
+            self.regimm_rt_hist[(instr_val >> 16) & 0x1F] += 1
+
+    def merge(self, other: "InstructionSampler") -> None:
+        self.sample_count += other.sample_count
+        self.executed_pcs.extend(other.executed_pcs)
+        self.executed_instrs.extend(other.executed_instrs)
+        self.unique_pcs.merge(other.unique_pcs)
+        for hist, other_hist in (
+            (self.opcode_hist, other.opcode_hist),
+            (self.funct_hist, other.funct_hist),
+            (self.regimm_rt_hist, other.regimm_rt_hist),
+        ):
+            for k, cnt in enumerate(other_hist):
+                hist[k] += cnt
+        self.pc = other.pc
+        self.instr = other.instr
+        self.clk_prev = other.clk_prev
+
+
+def _histogram(counts: list[int]) -> dict[int, int]:
+    return {k: cnt for k, cnt in enumerate(counts) if cnt}
+
+
+def _analysis_consumers(
+    engine: str,
+    keep_samples: bool = False,
+    groups: tuple[Covergroup, ...] = (),
+) -> list[VcdConsumer]:
+    toggle = NumpyToggleCoverage() if engine == "numpy" else ToggleCoverage()
+    consumers: list[VcdConsumer] = [toggle, InstructionSampler(keep_samples=keep_samples)]
+    if groups:
+        consumers.append(FunctionalCoverage(list(groups)))
+    return consumers
+
+
+def analyze_vcd(
+    vcd_path: Path,
+    *,
+    include_tb: bool,
+    engine: str = "python",
+    jobs: int = 1,
+    use_index: bool = False,
+    keep_samples: bool = False,
+    spec: list[Covergroup] | None = None,
+) -> dict[str, object]:
+    if is_trace(vcd_path):
+        # Binary traces have no text blocks to vectorize; ToggleCoverage
+        # already works on each column's distinct values.
+        engine = "python"
+    header, consumers = read_dump(
+        vcd_path,
+        partial(_analysis_consumers, engine, keep_samples, tuple(spec or ())),
+        jobs=jobs, use_index=use_index)
+    toggle: ToggleCoverage | NumpyToggleCoverage = consumers[0]  # type: ignore[assignment]
+    sampler: InstructionSampler = consumers[1]  # type: ignore[assignment]
+    functional: FunctionalCoverage | None = consumers[2] if spec else None  # type: ignore[assignment]
+    vars_by_code = header.vars_by_code
+    code_to_scope = header.code_to_scope
+    cov_by_code = toggle.coverage_by_code()
 
     per_scope_bits = defaultdict(lambda: {"covered": 0, "total": 0})
     per_var = []
@@ -261,14 +500,18 @@ def analyze_vcd(vcd_path: Path, *, include_tb: bool) -> dict[str, object]:
         "coverage_by_code": cov_by_code,
         "per_scope_bits": per_scope_bits,
         "per_var_sorted": per_var,
-        "clk_code": clk_code,
-        "pc_code": pc_code,
-        "instr_code": instr_code,
-        "executed_pcs": executed_pcs,
-        "executed_instrs": executed_instrs,
-        "opcode_hist": dict(opcode_hist),
-        "funct_hist": dict(funct_hist),
-        "regimm_rt_hist": dict(regimm_rt_hist),
+        "clk_code": sampler.clk_code,
+        "pc_code": sampler.pc_code,
+        "instr_code": sampler.instr_code,
+        "sample_count": sampler.sample_count,
+        "unique_pcs": sampler.unique_pcs,
+        "executed_pcs": sampler.executed_pcs,
+        "executed_instrs": sampler.executed_instrs,
+        "opcode_hist": _histogram(sampler.opcode_hist),
+        "funct_hist": _histogram(sampler.funct_hist),
+        "regimm_rt_hist": _histogram(sampler.regimm_rt_hist),
+        "functional": functional.report() if functional is not None else {},
+        "functional_missing": functional.missing if functional is not None else [],
     }
 
 
@@ -278,12 +521,53 @@ def format_percent(num: int, den: int) -> str:
     return f"{(100.0 * num / den):.2f}%"
 
 
+def _bin_label(label: object) -> str:
+    if isinstance(label, tuple):
+        return "x".join(_bin_label(part) for part in label)
+    return f"{label:x}" if isinstance(label, int) else str(label)
+
+
+def print_functional_report(report: dict[str, dict], missing: list[str]) -> None:
+    print("")
+    print("=================================================================")
+    print("Cobertura funcional (spec)")
+    print("=================================================================")
+    for name in missing:
+        print(f"Aviso: sinal não encontrado no VCD: {name}")
+    for group_name, g in report.items():
+        print(f"[{group_name}] amostras: {g['samples']}")
+        for kind, items in (("coverpoint", g["coverpoints"]), ("cross", g["crosses"])):
+            for item_name, item in items.items():
+                total = item["total"]
+                pct = format_percent(item["hit"], total) if total is not None else "n/a"
+                print(f"  {kind} {item_name}: {item['hit']}/{total if total is not None else '?'} bins ({pct})")
+                if not item["bins"]:
+                    continue
+                try:
+                    bins = sorted(item["bins"].items())
+                except TypeError:
+                    bins = list(item["bins"].items())
+                shown = " ".join(f"{_bin_label(label)}[{cnt}]" for label, cnt in bins[:_MAX_BINS_SHOWN])
+                if len(bins) > _MAX_BINS_SHOWN:
+                    shown += f" ... (+{len(bins) - _MAX_BINS_SHOWN})"
+                print("    " + shown)
+
+
 def main(argv: list[str]) -> int:
     ap = argparse.ArgumentParser(description="Cobertura por toggle (VCD) + histogramas de instrução (MIPS).")
-    ap.add_argument("--vcd", default="tb_mips_top.vcd", help="Caminho para o arquivo .vcd")
+    ap.add_argument("--vcd", default="tb_mips_top.vcd", help="Caminho para o arquivo .vcd (ou trace binário .vtrace)")
     ap.add_argument("--include-tb", action="store_true", help="Inclui sinais do testbench na cobertura toggle")
     ap.add_argument("--top-uncovered", type=int, default=30, help="Quantidade de sinais menos cobertos a listar")
     ap.add_argument("--scopes", type=int, default=20, help="Quantidade de scopes a listar")
+    ap.add_argument(
+        "--engine",
+        choices=("python", "numpy"),
+        default="python",
+        help="Backend da cobertura toggle (numpy: processamento vetorizado em blocos)",
+    )
+    ap.add_argument("--jobs", type=int, default=1, help="Processos para analisar o VCD em blocos paralelos")
+    ap.add_argument("--no-index", action="store_true", help="Não usa nem grava o índice <vcd>.idx")
+    ap.add_argument("--spec", default="", help="Spec JSON/YAML de cobertura funcional (covergroups, bins, crosses)")
     args = ap.parse_args(argv)
 
     vcd_path = Path(args.vcd)
@@ -291,7 +575,27 @@ def main(argv: list[str]) -> int:
         print(f"Arquivo VCD não encontrado: {vcd_path}", file=sys.stderr)
         return 2
 
-    r = analyze_vcd(vcd_path, include_tb=args.include_tb)
+    spec: list[Covergroup] | None = None
+    if args.spec:
+        try:
+            spec = load_spec(Path(args.spec))
+        except (OSError, ValueError) as e:
+            print(f"Spec inválida ({args.spec}): {e}", file=sys.stderr)
+            return 2
+
+    engine = args.engine
+    if engine == "numpy" and np is None:
+        print("Aviso: numpy não disponível, usando backend python", file=sys.stderr)
+        engine = "python"
+
+    r = analyze_vcd(
+        vcd_path,
+        include_tb=args.include_tb,
+        engine=engine,
+        jobs=args.jobs,
+        use_index=not args.no_index,
+        spec=spec,
+    )
     per_scope_bits: dict[str, dict[str, int]] = r["per_scope_bits"]  # type: ignore[assignment]
     per_var_sorted: list[tuple[int, int, str, str]] = r["per_var_sorted"]  # type: ignore[assignment]
 
@@ -330,16 +634,15 @@ def main(argv: list[str]) -> int:
     if clk_code is None or pc_code is None or instr_code is None:
         print("Não consegui localizar automaticamente clk/pc/instruction no VCD.")
     else:
-        executed_pcs: list[int] = r["executed_pcs"]  # type: ignore[assignment]
-        executed_instrs: list[int] = r["executed_instrs"]  # type: ignore[assignment]
+        sample_count: int = r["sample_count"]  # type: ignore[assignment]
+        unique_pcs: PcBitmap = r["unique_pcs"]  # type: ignore[assignment]
         opcode_hist: dict[int, int] = r["opcode_hist"]  # type: ignore[assignment]
         funct_hist: dict[int, int] = r["funct_hist"]  # type: ignore[assignment]
         regimm_rt_hist: dict[int, int] = r["regimm_rt_hist"]  # type: ignore[assignment]
 
-        print(f"Instrucões amostradas: {len(executed_instrs)}")
-        if executed_pcs:
-            uniq_pcs = sorted(set(executed_pcs))
-            print(f"PCs únicos: {len(uniq_pcs)} (min={min(uniq_pcs)}, max={max(uniq_pcs)})")
+        print(f"Instrucões amostradas: {sample_count}")
+        if sample_count:
+            print(f"PCs únicos: {len(unique_pcs)} (min={unique_pcs.min()}, max={unique_pcs.max()})")
 
         opcodes_sorted = sorted(opcode_hist.items(), key=lambda kv: kv[0])
         print("")
@@ -358,6 +661,9 @@ def main(argv: list[str]) -> int:
             print("REGIMM rt executados (bin/dec):")
             print(" ".join(f"{rt:05b}({rt})[{cnt}]" for rt, cnt in rt_sorted))
 
+    if spec:
+        print_functional_report(r["functional"], r["functional_missing"])  # type: ignore[arg-type]
+
     return 0
 
 
@@ -0,0 +1,754 @@
+import base64
+import json
+import mmap
+import os
+import re
+import zlib
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+if TYPE_CHECKING:
+    from vcd_trace import TraceColumn
+
+_BLOCK_SIZE = 1 << 24
+_WHITESPACE = frozenset(b" \t\r")
+_SCALAR_VALUES = {ord(c): c for c in "01xzXZ"}
+
+_INDEX_VERSION = 1
+_INDEX_REGION = 1 << 20
+_RE_CHANGE_CODE = re.compile(rb"^[ \t]*(?:[01xzXZ]|[bBrR]\S+[ \t]+)(\S+)", re.MULTILINE)
+_RE_TIMESTAMP = re.compile(rb"^#(\d+)", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class VcdVar:
+    code: str
+    name: str
+    width: int
+
+
+@dataclass
+class VcdHeader:
+    vars_by_code: dict[str, VcdVar]
+    code_to_scope: dict[str, str]
+
+
+@dataclass
+class VcdIndex:
+    # Sidecar index of a VCD: the parsed header plus the dump section cut
+    # into ~1 MiB regions, each with its first timestamp (-1 before the
+    # first one) and a bitmask, over header order, of the signals that
+    # change inside it.
+    size: int
+    mtime_ns: int
+    data_start: int
+    header: VcdHeader
+    region_offsets: list[int]
+    region_times: list[int]
+    changed: list[int]
+
+    def region_end(self, i: int) -> int:
+        return self.region_offsets[i + 1] if i + 1 < len(self.region_offsets) else self.size
+
+    def regions_for(self, codes: Iterable[str], start: int, end: int) -> list[tuple[int, int]]:
+        # Byte ranges inside [start, end) where any of `codes` changes,
+        # adjacent regions coalesced.
+        order = {c: i for i, c in enumerate(self.header.vars_by_code)}
+        mask = 0
+        for c in codes:
+            if c in order:
+                mask |= 1 << order[c]
+        out: list[tuple[int, int]] = []
+        for i, off in enumerate(self.region_offsets):
+            lo = max(off, start)
+            hi = min(self.region_end(i), end)
+            if lo >= hi or not (self.changed[i] & mask):
+                continue
+            if out and out[-1][1] == lo:
+                out[-1] = (out[-1][0], hi)
+            else:
+                out.append((lo, hi))
+        return out
+
+    def offset_for_time(self, t: int) -> int:
+        # Start of the region holding the last `#timestamp` <= t. Regions
+        # without a timestamp repeat the previous one, so the list is sorted.
+        i = bisect_right(self.region_times, t) - 1
+        while i > 0 and self.region_times[i - 1] == self.region_times[i]:
+            i -= 1
+        return self.region_offsets[i] if i >= 0 else self.data_start
+
+
+class VcdConsumer:
+    # Subscribers override only the callbacks they need. `codes` limits which
+    # value changes are delivered (None = every signal); it is read after
+    # `begin`, so consumers can resolve their signals from the header.
+    codes: set[str] | None = None
+    # Codes whose current value must be replayed when a chunked read starts
+    # in the middle of the dump (see read_vcd_chunked).
+    initial_codes: set[str] = set()
+    # Timed consumers find the timestamp of the change being delivered in
+    # `now` (-1 before the first timestamp). Filtered reads look it up only
+    # for delivered changes, so timestamp lines are still skipped.
+    timed: bool = False
+    now: int = -1
+
+    def begin(self, header: VcdHeader) -> None:
+        pass
+
+    def on_time(self, t: int) -> None:
+        pass
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        pass
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        pass
+
+    def on_block(self, block: bytes) -> None:
+        pass
+
+    def on_signal(self, code: str, column: "TraceColumn") -> None:
+        # Binary traces only (see vcd_trace.read_trace): all changes of one
+        # signal at once, for consumers that do not depend on their order.
+        pass
+
+    def done(self) -> bool:
+        return False
+
+    def merge(self, other: "VcdConsumer") -> None:
+        # Folds the state of the same consumer run over the following chunk.
+        raise NotImplementedError(f"{type(self).__name__} does not support chunked reads")
+
+
+def _hier_join(stack: list[str], ref: str) -> str:
+    if not stack:
+        return ref
+    return ".".join(stack + [ref])
+
+
+def _parse_header_lines(lines: Iterable[str]) -> VcdHeader:
+    vars_by_code: dict[str, VcdVar] = {}
+    code_to_scope: dict[str, str] = {}
+    scope_stack: list[str] = []
+
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("$scope"):
+            parts = line.split()
+            if len(parts) >= 3:
+                scope_stack.append(parts[2])
+            continue
+        if line.startswith("$upscope"):
+            if scope_stack:
+                scope_stack.pop()
+            continue
+        if line.startswith("$var"):
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            width = int(parts[2])
+            code = parts[3]
+            ref = parts[4]
+            full_name = _hier_join(scope_stack, ref)
+            vars_by_code[code] = VcdVar(code=code, name=full_name, width=width)
+            code_to_scope[code] = ".".join(scope_stack)
+            continue
+        if line.startswith("$enddefinitions"):
+            break
+
+    return VcdHeader(vars_by_code=vars_by_code, code_to_scope=code_to_scope)
+
+
+@contextmanager
+def _mapped(vcd_path: Path) -> Iterator["mmap.mmap | bytes"]:
+    with vcd_path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _header_end(buf: "mmap.mmap | bytes") -> int:
+    # Offset of the first line after `$enddefinitions`.
+    idx = buf.find(b"$enddefinitions")
+    if idx == -1:
+        return len(buf)
+    nl = buf.find(b"\n", idx)
+    return len(buf) if nl == -1 else nl + 1
+
+
+def _decode_header(buf: "mmap.mmap | bytes", end: int) -> list[str]:
+    return buf[:end].decode("utf-8", errors="replace").splitlines()
+
+
+def parse_vcd_definitions(vcd_path: Path) -> tuple[dict[str, VcdVar], dict[str, str]]:
+    header = load_vcd_header(vcd_path)
+    return header.vars_by_code, header.code_to_scope
+
+
+def find_signal_code(vars_by_code: dict[str, VcdVar], suffix: str) -> str | None:
+    matches = [v.code for v in vars_by_code.values() if v.name.endswith(suffix)]
+    if len(matches) == 1:
+        return matches[0]
+    if not matches:
+        return None
+    matches_sorted = sorted(
+        matches,
+        key=lambda c: len(vars_by_code[c].name),
+    )
+    return matches_sorted[0]
+
+
+def _build_dispatch(
+    consumers: list[VcdConsumer],
+    header: VcdHeader,
+    attr: str,
+) -> dict[bytes, tuple[str, list[Callable]]]:
+    # Keyed by the raw id code bytes so the hot loop never decodes a line.
+    by_code: dict[bytes, tuple[str, list[Callable]]] = {}
+    for c in consumers:
+        if getattr(type(c), attr) is getattr(VcdConsumer, attr):
+            continue
+        cb = getattr(c, attr)
+        codes = header.vars_by_code.keys() if c.codes is None else c.codes
+        for code in codes:
+            if code not in header.vars_by_code:
+                continue
+            key = code.encode("utf-8")
+            if key not in by_code:
+                by_code[key] = (code, [])
+            by_code[key][1].append(cb)
+    return by_code
+
+
+def _iter_blocks(buf: "mmap.mmap | bytes", start: int, n: int) -> Iterator[bytes]:
+    # Splits [start, n) in large blocks cut at line boundaries, so memory
+    # use stays flat no matter how big the file is.
+    pos = start
+    while pos < n:
+        end = min(pos + _BLOCK_SIZE, n)
+        if end < n:
+            nl = buf.rfind(b"\n", pos, end)
+            if nl == -1:
+                nl = buf.find(b"\n", end, n)
+            end = n if nl == -1 else nl + 1
+        yield buf[pos:end]
+        pos = end
+
+
+def _codes_alternation(codes: Iterable[bytes]) -> bytes:
+    # Longest first so a code never matches as a prefix of a longer one.
+    ordered = sorted(codes, key=lambda c: (-len(c), c))
+    return b"|".join(re.escape(c) for c in ordered)
+
+
+def _scan_lines(
+    block: bytes,
+    scalar_cbs: dict[bytes, tuple[str, list[Callable]]],
+    vector_cbs: dict[bytes, tuple[str, list[Callable]]],
+    time_cbs: list[Callable[[int], None]],
+    stop: Callable[[], bool] | None,
+) -> bool:
+    for line in block.splitlines():
+        if not line:
+            continue
+        ch = line[0]
+        if ch in _WHITESPACE:
+            line = line.strip()
+            if not line:
+                continue
+            ch = line[0]
+
+        if ch in _SCALAR_VALUES:
+            entry = scalar_cbs.get(line[1:])
+            if entry is None:
+                entry = scalar_cbs.get(line[1:].strip())
+                if entry is None:
+                    continue
+            code, cbs = entry
+            value = _SCALAR_VALUES[ch]
+            for cb in cbs:
+                cb(code, value)
+            continue
+
+        if ch == 0x62 or ch == 0x42:  # b / B
+            parts = line.split()
+            if len(parts) != 2:
+                continue
+            entry = vector_cbs.get(parts[1])
+            if entry is None:
+                continue
+            code, cbs = entry
+            value = parts[0][1:]
+            for cb in cbs:
+                cb(code, value)
+            continue
+
+        if ch == 0x23:  # '#'
+            if stop is not None and stop():
+                return True
+            if time_cbs:
+                try:
+                    t = int(line[1:])
+                except ValueError:
+                    continue
+                for cb in time_cbs:
+                    cb(t)
+            continue
+
+        # `$dumpvars`/`$end` and similar keywords, real values (`r`)
+        # are not used by any consumer.
+    return False
+
+
+def _filter_pattern(
+    scalar_cbs: dict[bytes, tuple[str, list[Callable]]],
+    vector_cbs: dict[bytes, tuple[str, list[Callable]]],
+    time_cbs: list[Callable[[int], None]],
+) -> "re.Pattern[bytes] | None":
+    alts: list[bytes] = []
+    if scalar_cbs:
+        alts.append(rb"(?P<sv>[01xzXZ])(?P<sc>" + _codes_alternation(scalar_cbs) + rb")")
+    if vector_cbs:
+        alts.append(rb"[bB](?P<vv>[01xzXZ]+)[ \t]+(?P<vc>" + _codes_alternation(vector_cbs) + rb")")
+    if time_cbs:
+        alts.append(rb"#(?P<t>\d+)")
+    if not alts:
+        return None
+    return re.compile(rb"^[ \t]*(?:" + b"|".join(alts) + rb")[ \t]*\r?$", re.MULTILINE)
+
+
+def _time_at(buf: "mmap.mmap | bytes", data_start: int, pos: int) -> int:
+    # Timestamp in effect at `pos`: the nearest `#` line before it.
+    i = buf.rfind(b"\n#", max(0, data_start - 1), pos)
+    if i == -1:
+        if buf[data_start : data_start + 1] != b"#" or pos <= data_start:
+            return -1
+        i = data_start - 1
+    m = _RE_TIMESTAMP.match(buf, i + 1)
+    return int(m.group(1)) if m is not None else -1
+
+
+# Replay helpers, also used by the trace reader of vcd_trace.py.
+def set_now(consumers: list[VcdConsumer], t: int) -> None:
+    for c in consumers:
+        c.now = t
+
+
+def all_done(consumers: list[VcdConsumer]) -> bool:
+    return all(c.done() for c in consumers)
+
+
+def _scan_matches(
+    pat: "re.Pattern[bytes]",
+    block: bytes,
+    scalar_cbs: dict[bytes, tuple[str, list[Callable]]],
+    vector_cbs: dict[bytes, tuple[str, list[Callable]]],
+    time_cbs: list[Callable[[int], None]],
+    stop: Callable[[], bool] | None,
+    timed: Callable[[int], None] | None = None,
+) -> bool:
+    # Every consumer named its signals, so the regex engine skips all other
+    # value changes without handing a single line to Python.
+    for m in pat.finditer(block):
+        kind = m.lastgroup
+        if timed is not None and kind != "t":
+            timed(m.start())
+        if kind == "sc":
+            code, cbs = scalar_cbs[m.group("sc")]
+            value = _SCALAR_VALUES[m.group("sv")[0]]
+            for cb in cbs:
+                cb(code, value)
+        elif kind == "vc":
+            code, cbs = vector_cbs[m.group("vc")]
+            value = m.group("vv")
+            for cb in cbs:
+                cb(code, value)
+        else:
+            t = int(m.group("t"))
+            for cb in time_cbs:
+                cb(t)
+            continue
+        if stop is not None and stop():
+            return True
+    return False
+
+
+class _TimeCursor:
+    # Sets `now` for the timed consumers at the delivered changes of a
+    # filtered read. Positions only grow during a scan, so each lookup
+    # searches back to the previous one only: one pass over the bytes in
+    # all, however many changes share one timestamp.
+    def __init__(self, buf: "mmap.mmap | bytes", data_start: int, consumers: list[VcdConsumer]) -> None:
+        self.buf = buf
+        self.data_start = data_start
+        self.consumers = consumers
+        self.pos = -1
+        self.time = -1
+
+    def mark(self, block_start: int, offset: int) -> None:
+        pos = block_start + offset
+        if self.pos < 0 or pos < self.pos:
+            self.time = _time_at(self.buf, self.data_start, pos)
+        else:
+            i = self.buf.rfind(b"\n#", self.pos, pos)
+            if i != -1:
+                m = _RE_TIMESTAMP.match(self.buf, i + 1)
+                self.time = int(m.group(1)) if m is not None else -1
+        self.pos = pos
+        set_now(self.consumers, self.time)
+
+
+class _IndexBuilder(VcdConsumer):
+    # Rides along a full read and records the regions of [start, end).
+    def __init__(self, start: int) -> None:
+        self.pos = start
+        self.last_time = -1
+        self.region_offsets: list[int] = []
+        self.region_times: list[int] = []
+        self.changed: list[int] = []
+
+    def begin(self, header: VcdHeader) -> None:
+        self.codes = set()
+        self._bit = {c.encode("utf-8"): 1 << i for i, c in enumerate(header.vars_by_code)}
+
+    def on_block(self, block: bytes) -> None:
+        n = len(block)
+        lo = 0
+        while lo < n:
+            hi = -1 if n - lo <= _INDEX_REGION else block.find(b"\n#", lo + _INDEX_REGION)
+            hi = n if hi == -1 else hi + 1
+            mask = 0
+            for code in set(_RE_CHANGE_CODE.findall(block, lo, hi)):
+                mask |= self._bit.get(code, 0)
+            m = _RE_TIMESTAMP.search(block, lo, hi)
+            if m is not None:
+                self.last_time = int(m.group(1))
+            self.region_offsets.append(self.pos + lo)
+            self.region_times.append(self.last_time)
+            self.changed.append(mask)
+            lo = hi
+        self.pos += n
+
+    def merge(self, other: "_IndexBuilder") -> None:
+        self.region_offsets.extend(other.region_offsets)
+        for t in other.region_times:
+            self.region_times.append(t if t >= 0 or not self.region_times else self.region_times[-1])
+        self.changed.extend(other.changed)
+        self.pos = other.pos
+
+    def build(self, st: os.stat_result, data_start: int, header: VcdHeader) -> VcdIndex:
+        return VcdIndex(
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            data_start=data_start,
+            header=header,
+            region_offsets=self.region_offsets,
+            region_times=self.region_times,
+            changed=self.changed,
+        )
+
+
+def index_path(vcd_path: Path) -> Path:
+    return vcd_path.with_name(vcd_path.name + ".idx")
+
+
+def save_index(vcd_path: Path, index: VcdIndex) -> None:
+    nbytes = (len(index.header.vars_by_code) + 7) // 8
+    doc = {
+        "version": _INDEX_VERSION,
+        "size": index.size,
+        "mtime_ns": index.mtime_ns,
+        "data_start": index.data_start,
+        "vars": [
+            [v.code, v.name, v.width, index.header.code_to_scope.get(v.code, "")]
+            for v in index.header.vars_by_code.values()
+        ],
+        "region_offsets": index.region_offsets,
+        "region_times": index.region_times,
+        "changed": base64.b64encode(b"".join(m.to_bytes(nbytes, "little") for m in index.changed)).decode("ascii"),
+    }
+    try:
+        index_path(vcd_path).write_bytes(zlib.compress(json.dumps(doc).encode("utf-8")))
+    except OSError:
+        # Read-only location: the index is only a cache.
+        pass
+
+
+def load_index(vcd_path: Path, st: os.stat_result | None = None) -> VcdIndex | None:
+    # Returns None when there is no index or it no longer matches the VCD's
+    # size and mtime.
+    try:
+        if st is None:
+            st = vcd_path.stat()
+        doc = json.loads(zlib.decompress(index_path(vcd_path).read_bytes()))
+    except (OSError, ValueError, zlib.error):
+        return None
+    if doc.get("version") != _INDEX_VERSION or doc.get("size") != st.st_size or doc.get("mtime_ns") != st.st_mtime_ns:
+        return None
+
+    vars_by_code: dict[str, VcdVar] = {}
+    code_to_scope: dict[str, str] = {}
+    for code, name, width, scope in doc["vars"]:
+        vars_by_code[code] = VcdVar(code=code, name=name, width=width)
+        code_to_scope[code] = scope
+    nbytes = (len(vars_by_code) + 7) // 8
+    packed = base64.b64decode(doc["changed"])
+    if nbytes:
+        changed = [int.from_bytes(packed[i : i + nbytes], "little") for i in range(0, len(packed), nbytes)]
+    else:
+        changed = [0] * len(doc["region_offsets"])
+    return VcdIndex(
+        size=doc["size"],
+        mtime_ns=doc["mtime_ns"],
+        data_start=doc["data_start"],
+        header=VcdHeader(vars_by_code=vars_by_code, code_to_scope=code_to_scope),
+        region_offsets=doc["region_offsets"],
+        region_times=doc["region_times"],
+        changed=changed,
+    )
+
+
+def _initial_values(
+    buf: "mmap.mmap | bytes",
+    data_start: int,
+    pos: int,
+    scalar_cbs: dict[bytes, tuple[str, list[Callable]]],
+    vector_cbs: dict[bytes, tuple[str, list[Callable]]],
+    codes: set[str],
+) -> list[tuple[bool, bytes, bytes]]:
+    # Value each code holds at `pos`, found by scanning backwards in growing
+    # windows from `pos` until every code's last change has been seen.
+    want_s = {k: v for k, v in scalar_cbs.items() if v[0] in codes}
+    want_v = {k: v for k, v in vector_cbs.items() if v[0] in codes}
+    pat = _filter_pattern(want_s, want_v, [])
+    if pat is None:
+        return []
+    found: dict[bytes, tuple[bool, bytes, bytes]] = {}
+    total = len(want_s.keys() | want_v.keys())
+    hi = pos
+    window = 1 << 16
+    while hi > data_start and len(found) < total:
+        lo = max(data_start, hi - window)
+        if lo > data_start:
+            lo = buf.find(b"\n", lo, hi) + 1 or hi
+        last: dict[bytes, tuple[bool, bytes, bytes]] = {}
+        for m in pat.finditer(buf[lo:hi]):
+            if m.lastgroup == "sc":
+                last[m.group("sc")] = (True, m.group("sc"), m.group("sv"))
+            else:
+                last[m.group("vc")] = (False, m.group("vc"), m.group("vv"))
+        for key, item in last.items():
+            found.setdefault(key, item)
+        hi = lo
+        window *= 2
+    return list(found.values())
+
+
+def _scan_range(
+    buf: "mmap.mmap | bytes",
+    header: VcdHeader,
+    consumers: list[VcdConsumer],
+    data_start: int,
+    start: int,
+    end: int,
+    index: VcdIndex | None = None,
+) -> None:
+    for c in consumers:
+        c.begin(header)
+
+    scalar_cbs = _build_dispatch(consumers, header, "on_scalar")
+    vector_cbs = _build_dispatch(consumers, header, "on_vector")
+    time_cbs = [c.on_time for c in consumers if type(c).on_time is not VcdConsumer.on_time]
+    block_cbs = [c.on_block for c in consumers if type(c).on_block is not VcdConsumer.on_block]
+
+    # A chunk that starts mid-dump first replays the values its consumers
+    # need to carry across the boundary (e.g. the clock level).
+    carried: set[str] = set()
+    for c in consumers:
+        carried |= c.initial_codes
+    if start > data_start and carried:
+        for is_scalar, key, value in _initial_values(buf, data_start, start, scalar_cbs, vector_cbs, carried):
+            if is_scalar:
+                code, cbs = scalar_cbs[key]
+                ch = _SCALAR_VALUES[value[0]]
+                for cb in cbs:
+                    cb(code, ch)
+            else:
+                code, cbs = vector_cbs[key]
+                for cb in cbs:
+                    cb(code, value)
+
+    # Early exit only when every consumer can tell it has seen enough.
+    stop: Callable[[], bool] | None = None
+    if consumers and all(type(c).done is not VcdConsumer.done for c in consumers):
+        stop = partial(all_done, consumers)
+        if stop():
+            return
+
+    pat: "re.Pattern[bytes] | None" = None
+    filtered = all(c.codes is not None for c in consumers)
+    timed = [c for c in consumers if c.timed]
+    lazy_time = bool(timed) and filtered and not time_cbs
+    if timed and not lazy_time:
+        time_cbs.append(partial(set_now, timed))
+    if filtered:
+        pat = _filter_pattern(scalar_cbs, vector_cbs, time_cbs)
+        if pat is None and not block_cbs:
+            return
+
+    # With an index, a read that only follows named signals seeks straight
+    # to the regions where those signals change.
+    cursor = _TimeCursor(buf, data_start, timed) if lazy_time else None
+    regions = [(start, end)]
+    if index is not None and filtered and not time_cbs and not block_cbs:
+        subscribed = {code for code, _cbs in scalar_cbs.values()} | {code for code, _cbs in vector_cbs.values()}
+        regions = index.regions_for(subscribed, start, end)
+
+    for lo, hi in regions:
+        pos = lo
+        if cursor is not None:
+            # Seeking past skipped regions: look the time up afresh.
+            cursor.pos = -1
+        for block in _iter_blocks(buf, lo, hi):
+            for bcb in block_cbs:
+                bcb(block)
+            if not filtered:
+                stopped = _scan_lines(block, scalar_cbs, vector_cbs, time_cbs, stop)
+            elif pat is not None:
+                mark: Callable[[int], None] | None = None
+                if cursor is not None:
+                    mark = partial(cursor.mark, pos)
+                stopped = _scan_matches(pat, block, scalar_cbs, vector_cbs, time_cbs, stop, mark)
+            else:
+                stopped = stop is not None and stop()
+            if stopped:
+                return
+            pos += len(block)
+
+
+def _open_header(
+    buf: "mmap.mmap | bytes",
+    vcd_path: Path,
+    st: os.stat_result,
+    use_index: bool,
+) -> tuple[int, VcdHeader, VcdIndex | None]:
+    index = load_index(vcd_path, st) if use_index else None
+    if index is not None:
+        return index.data_start, index.header, index
+    data_start = _header_end(buf)
+    return data_start, _parse_header_lines(_decode_header(buf, data_start)), None
+
+
+def load_vcd_header(vcd_path: Path) -> VcdHeader:
+    # Header from a valid sidecar index when there is one, else parsed.
+    index = load_index(vcd_path)
+    if index is not None:
+        return index.header
+    with _mapped(vcd_path) as buf:
+        return _parse_header_lines(_decode_header(buf, _header_end(buf)))
+
+
+def read_vcd(vcd_path: Path, consumers: list[VcdConsumer], *, use_index: bool = False) -> VcdHeader:
+    # Header and value changes are read in one pass over the memory-mapped
+    # file; every subscribed consumer sees the same stream of changes. Value
+    # changes are matched as raw bytes: scalar values reach consumers as a
+    # one-char `str`, vector values as the `bytes` digits without the `b`.
+    # Consumers overriding `on_block` get the raw dump blocks instead and
+    # only receive per-line callbacks for the codes they list.
+    # With `use_index`, a valid sidecar index replaces header parsing and
+    # lets filtered reads skip regions; a missing or stale one is rebuilt
+    # during this pass.
+    st = vcd_path.stat()
+    with _mapped(vcd_path) as buf:
+        data_start, header, index = _open_header(buf, vcd_path, st, use_index)
+        builder = _IndexBuilder(data_start) if use_index and index is None else None
+        run = consumers + [builder] if builder is not None else consumers
+        _scan_range(buf, header, run, data_start, data_start, len(buf), index)
+    if builder is not None:
+        save_index(vcd_path, builder.build(st, data_start, header))
+    return header
+
+
+def _split_points(buf: "mmap.mmap | bytes", data_start: int, parts: int) -> list[int]:
+    # Chunk boundaries fall on `#timestamp` lines so no chunk starts in the
+    # middle of a time step.
+    n = len(buf)
+    points = [data_start]
+    step = max(1, (n - data_start) // max(1, parts))
+    for k in range(1, parts):
+        pos = buf.find(b"\n#", max(points[-1], data_start + k * step))
+        if pos == -1:
+            break
+        points.append(pos + 1)
+    points.append(n)
+    return points
+
+
+def _read_chunk(
+    vcd_path: Path,
+    make_consumers: Callable[[], list[VcdConsumer]],
+    start: int,
+    end: int,
+    index: VcdIndex | None,
+    build_index: bool,
+) -> tuple[list[VcdConsumer], _IndexBuilder | None]:
+    consumers = make_consumers()
+    with _mapped(vcd_path) as buf:
+        if index is not None:
+            data_start, header = index.data_start, index.header
+        else:
+            data_start = _header_end(buf)
+            header = _parse_header_lines(_decode_header(buf, data_start))
+        builder = _IndexBuilder(start) if build_index else None
+        run = consumers + [builder] if builder is not None else consumers
+        _scan_range(buf, header, run, data_start, start, end, index)
+    return consumers, builder
+
+
+def read_vcd_chunked(
+    vcd_path: Path,
+    make_consumers: Callable[[], list[VcdConsumer]],
+    *,
+    jobs: int,
+    use_index: bool = False,
+) -> tuple[VcdHeader, list[VcdConsumer]]:
+    # Splits the dump at timestamp boundaries and runs one set of consumers
+    # per chunk in a process pool. Partial results are merged in file order
+    # with `merge`, so consumers must be picklable and their state must
+    # combine exactly (OR-reductions, counters, ordered concatenation).
+    if jobs <= 1:
+        consumers = make_consumers()
+        header = read_vcd(vcd_path, consumers, use_index=use_index)
+        return header, consumers
+
+    st = vcd_path.stat()
+    with _mapped(vcd_path) as buf:
+        data_start, header, index = _open_header(buf, vcd_path, st, use_index)
+        points = _split_points(buf, data_start, jobs * 4)
+    build_index = use_index and index is None
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(_read_chunk, vcd_path, make_consumers, lo, hi, index, build_index)
+            for lo, hi in zip(points[:-1], points[1:])
+        ]
+        merged, builder = futures[0].result()
+        for fut in futures[1:]:
+            parts, part_builder = fut.result()
+            for acc, part in zip(merged, parts):
+                acc.merge(part)
+            if builder is not None and part_builder is not None:
+                builder.merge(part_builder)
+    if builder is not None:
+        save_index(vcd_path, builder.build(st, data_start, header))
+    return header, merged
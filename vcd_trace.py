@@ -0,0 +1,462 @@
+import argparse
+import json
+import mmap
+import sys
+import zlib
+from dataclasses import dataclass, field
+from functools import cached_property, partial
+from itertools import accumulate, repeat
+from operator import itemgetter
+from pathlib import Path
+from typing import Callable
+
+from vcd_reader import VcdConsumer, VcdHeader, VcdVar, all_done, read_vcd, read_vcd_chunked, set_now
+
+try:
+    import numpy as np
+except ImportError:  # varint columns are then decoded in pure Python
+    np = None
+
+try:
+    import zstandard
+except ImportError:  # only needed for --compress zstd
+    zstandard = None
+
+
+# Layout: magic, u32 LE length of a zlib-compressed JSON directory, then the
+# column blobs. The directory holds the VCD header, the time table and, per
+# signal that changes, the (offset, length) of each of its columns.
+TRACE_MAGIC = b"VCDTRACE\x01\n"
+_KIND_INT = 0  # binary vector digits stored as an integer
+_KIND_RAW = 1  # vector digits with x/z stored verbatim in the raw column
+_KIND_SCALAR = 2  # scalar-form change of a signal that also has vectors
+
+
+def _encode_varints(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varints(data: bytes) -> list[int]:
+    if not data:
+        return []
+    if max(data) < 0x80:
+        return list(data)
+    if np is not None:
+        a = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(a < 0x80)
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        lengths = ends - starts + 1
+        # Up to 9 bytes (63 bits) fits the uint64 reduction below.
+        if int(lengths.max()) <= 9:
+            pos = np.arange(a.size) - np.repeat(starts, lengths)
+            parts = (a & 0x7F).astype(np.uint64) << (pos * 7).astype(np.uint64)
+            return np.add.reduceat(parts, starts).tolist()
+    out: list[int] = []
+    value = 0
+    shift = 0
+    for b in data:
+        value |= (b & 0x7F) << shift
+        if b < 0x80:
+            out.append(value)
+            value = 0
+            shift = 0
+        else:
+            shift += 7
+    return out
+
+
+def _compress(codec: str, blob: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=9).compress(blob)
+    if codec == "zlib":
+        return zlib.compress(blob, 6)
+    return blob
+
+
+def _decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("trace comprimido com zstd, mas o módulo zstandard não está instalado")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if codec == "zlib":
+        return zlib.decompress(blob)
+    return blob
+
+
+@dataclass
+class _SignalBuffer:
+    # Columns of one signal while converting: timestamps and global change
+    # sequence numbers (both delta varints), then the values.
+    times: bytearray = field(default_factory=bytearray)
+    seqs: bytearray = field(default_factory=bytearray)
+    scalars: bytearray = field(default_factory=bytearray)
+    headers: bytearray = field(default_factory=bytearray)
+    ints: bytearray = field(default_factory=bytearray)
+    raw: bytearray = field(default_factory=bytearray)
+    count: int = 0
+    last_time: int = 0
+    last_seq: int = 0
+    vector: bool = False
+
+    def _to_vector(self) -> None:
+        # A vector change in a scalar-only signal: earlier scalars become
+        # scalar-form entries of the vector column.
+        for ch in self.scalars:
+            _encode_varints(self.headers, (1 << 2) | _KIND_SCALAR)
+            self.raw.append(ch)
+        self.scalars.clear()
+        self.vector = True
+
+
+class _TraceWriter(VcdConsumer):
+    def __init__(self) -> None:
+        self.signals: dict[str, _SignalBuffer] = {}
+        self.time_values = bytearray()
+        self.time_seqs = bytearray()
+        self.time_count = 0
+        self._last_time = 0
+        self._last_time_seq = 0
+        self.now = 0
+        self.seq = 0
+
+    def on_time(self, t: int) -> None:
+        _encode_varints(self.time_values, t - self._last_time)
+        _encode_varints(self.time_seqs, self.seq - self._last_time_seq)
+        self._last_time = t
+        self._last_time_seq = self.seq
+        self.time_count += 1
+        self.now = t
+
+    def _signal(self, code: str) -> _SignalBuffer:
+        sig = self.signals.get(code)
+        if sig is None:
+            sig = self.signals[code] = _SignalBuffer()
+        _encode_varints(sig.times, self.now - sig.last_time)
+        _encode_varints(sig.seqs, self.seq - sig.last_seq)
+        sig.last_time = self.now
+        sig.last_seq = self.seq
+        sig.count += 1
+        self.seq += 1
+        return sig
+
+    def on_scalar(self, code: str, ch: str) -> None:
+        sig = self._signal(code)
+        if sig.vector:
+            _encode_varints(sig.headers, (1 << 2) | _KIND_SCALAR)
+            sig.raw += ch.encode("ascii")
+        else:
+            sig.scalars += ch.encode("ascii")
+
+    def on_vector(self, code: str, value: bytes) -> None:
+        sig = self._signal(code)
+        if not sig.vector:
+            sig._to_vector()
+        try:
+            number = int(value, 2)
+        except ValueError:
+            _encode_varints(sig.headers, (len(value) << 2) | _KIND_RAW)
+            sig.raw += value
+            return
+        _encode_varints(sig.headers, (len(value) << 2) | _KIND_INT)
+        _encode_varints(sig.ints, number)
+
+
+def convert_vcd(vcd_path: Path, out_path: Path, *, codec: str = "zlib") -> None:
+    writer = _TraceWriter()
+    header = read_vcd(vcd_path, [writer])
+
+    blobs: list[bytes] = []
+    offset = 0
+
+    def put(blob: bytes) -> list[int]:
+        nonlocal offset
+        blob = _compress(codec, bytes(blob))
+        blobs.append(blob)
+        span = [offset, len(blob)]
+        offset += len(blob)
+        return span
+
+    signals = []
+    for code, sig in writer.signals.items():
+        entry: dict[str, object] = {
+            "code": code,
+            "count": sig.count,
+            "vector": sig.vector,
+            "times": put(sig.times),
+            "seqs": put(sig.seqs),
+        }
+        if sig.vector:
+            entry["headers"] = put(sig.headers)
+            entry["ints"] = put(sig.ints)
+            entry["raw"] = put(sig.raw)
+        else:
+            entry["scalars"] = put(sig.scalars)
+        signals.append(entry)
+
+    directory = {
+        "codec": codec,
+        "changes": writer.seq,
+        "vars": [
+            [v.code, v.name, v.width, header.code_to_scope.get(v.code, "")] for v in header.vars_by_code.values()
+        ],
+        "time_count": writer.time_count,
+        "time_values": put(writer.time_values),
+        "time_seqs": put(writer.time_seqs),
+        "signals": signals,
+    }
+    packed = zlib.compress(json.dumps(directory).encode("utf-8"))
+    with out_path.open("wb") as f:
+        f.write(TRACE_MAGIC)
+        f.write(len(packed).to_bytes(4, "little"))
+        f.write(packed)
+        for blob in blobs:
+            f.write(blob)
+
+
+def is_trace(path: Path) -> bool:
+    try:
+        with path.open("rb") as f:
+            return f.read(len(TRACE_MAGIC)) == TRACE_MAGIC
+    except OSError:
+        return False
+
+
+class TraceColumn:
+    # The value changes of one signal, decoded on first access. Scalar
+    # values are one-char `str`, vector values the `bytes` digits, exactly
+    # as read_vcd delivers them.
+    def __init__(self, trace: "Trace", entry: dict) -> None:
+        self._trace = trace
+        self._entry = entry
+        self.code: str = entry["code"]
+        self.count: int = entry["count"]
+
+    def _varints(self, name: str) -> list[int]:
+        return _decode_varints(self._trace.blob(self._entry[name]))
+
+    @cached_property
+    def times(self) -> list[int]:
+        return list(accumulate(self._varints("times")))
+
+    @cached_property
+    def seqs(self) -> list[int]:
+        return list(accumulate(self._varints("seqs")))
+
+    @cached_property
+    def _vector_parts(self) -> tuple[list[int], list[tuple[int, int]], "list[str | bytes]"]:
+        # Headers, (header, integer) pairs of the binary values, and the
+        # x/z and scalar-form values in order.
+        headers = self._varints("headers")
+        pairs = list(zip((h for h in headers if not h & 3), self._varints("ints")))
+        special: list[str | bytes] = []
+        raw = self._trace.blob(self._entry["raw"])
+        if raw:
+            pos = 0
+            for h in headers:
+                if h & 3 == _KIND_RAW:
+                    n = h >> 2
+                    special.append(raw[pos : pos + n])
+                    pos += n
+                elif h & 3 == _KIND_SCALAR:
+                    special.append(chr(raw[pos]))
+                    pos += 1
+        return headers, pairs, special
+
+    @staticmethod
+    def _digits(pair: tuple[int, int]) -> bytes:
+        return format(pair[1], f"0{pair[0] >> 2}b").encode("ascii")
+
+    @cached_property
+    def values(self) -> "list[str | bytes]":
+        if not self._entry["vector"]:
+            return list(self._trace.blob(self._entry["scalars"]).decode("ascii"))
+        headers, pairs, special = self._vector_parts
+        # Each distinct value is formatted once and shared.
+        digits = {p: self._digits(p) for p in set(pairs)}
+        binary = map(digits.__getitem__, pairs)
+        if not special:
+            return list(binary)
+        rest = iter(special)
+        return [next(rest) if h & 3 else next(binary) for h in headers]
+
+    def distinct_values(self) -> "set[str | bytes]":
+        # Order-free consumers (OR-reductions) only need each value once.
+        if not self._entry["vector"]:
+            return set(self._trace.blob(self._entry["scalars"]).decode("ascii"))
+        _headers, pairs, special = self._vector_parts
+        return {self._digits(p) for p in set(pairs)} | set(special)
+
+    def distinct_parts(self) -> "tuple[set[int], set[str | bytes]]":
+        # Like distinct_values, but binary vector values stay integers; the
+        # second set holds scalars and x/z digits.
+        if not self._entry["vector"]:
+            return set(), self.distinct_values()
+        _headers, pairs, special = self._vector_parts
+        return {v for _h, v in pairs}, set(special)
+
+
+class Trace:
+    def __init__(self, path: Path) -> None:
+        with path.open("rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        base = len(TRACE_MAGIC)
+        if self._buf[:base] != TRACE_MAGIC:
+            raise ValueError(f"{path}: não é um trace binário")
+        size = int.from_bytes(self._buf[base : base + 4], "little")
+        self._dir = json.loads(zlib.decompress(self._buf[base + 4 : base + 4 + size]))
+        self._data = base + 4 + size
+        self.codec: str = self._dir["codec"]
+
+        vars_by_code: dict[str, VcdVar] = {}
+        code_to_scope: dict[str, str] = {}
+        for code, name, width, scope in self._dir["vars"]:
+            vars_by_code[code] = VcdVar(code=code, name=name, width=width)
+            code_to_scope[code] = scope
+        self.header = VcdHeader(vars_by_code=vars_by_code, code_to_scope=code_to_scope)
+        self.columns = {e["code"]: TraceColumn(self, e) for e in self._dir["signals"]}
+
+    def close(self) -> None:
+        self._buf.close()
+
+    def blob(self, span: list[int]) -> bytes:
+        off, n = span
+        return _decompress(self.codec, self._buf[self._data + off : self._data + off + n])
+
+    def time_table(self) -> tuple[list[int], list[int]]:
+        # Timestamps and the sequence number of the first change after each.
+        times = list(accumulate(_decode_varints(self.blob(self._dir["time_values"]))))
+        seqs = list(accumulate(_decode_varints(self.blob(self._dir["time_seqs"]))))
+        return times, seqs
+
+
+def _replay(trace: Trace, consumers: list[VcdConsumer]) -> None:
+    # Merges the columns the consumers subscribed to back into file order:
+    # every change carries its global sequence number, so one sort of the
+    # already-sorted runs restores the interleaving read_vcd would produce.
+    vars_by_code = trace.header.vars_by_code
+    scalar_cbs: dict[str, list[Callable]] = {}
+    vector_cbs: dict[str, list[Callable]] = {}
+    for c in consumers:
+        codes = vars_by_code.keys() if c.codes is None else c.codes
+        for attr, table in (("on_scalar", scalar_cbs), ("on_vector", vector_cbs)):
+            if getattr(type(c), attr) is getattr(VcdConsumer, attr):
+                continue
+            cb = getattr(c, attr)
+            for code in codes:
+                if code in trace.columns:
+                    table.setdefault(code, []).append(cb)
+    time_cbs = [c.on_time for c in consumers if type(c).on_time is not VcdConsumer.on_time]
+    timed = [c for c in consumers if c.timed]
+    if timed:
+        time_cbs.append(partial(set_now, timed))
+
+    stop: Callable[[], bool] | None = None
+    if all(type(c).done is not VcdConsumer.done for c in consumers):
+        stop = partial(all_done, consumers)
+        if stop():
+            return
+
+    # Keys are 2 * seq (+1 for changes) so a timestamp sorts before the
+    # changes that follow it.
+    events: list[tuple[int, str | None, object]] = []
+    if time_cbs:
+        times, seqs = trace.time_table()
+        events.extend(zip((2 * s for s in seqs), repeat(None), times))
+    for code in scalar_cbs.keys() | vector_cbs.keys():
+        col = trace.columns[code]
+        events.extend(zip((2 * s + 1 for s in col.seqs), repeat(code), col.values))
+    events.sort(key=itemgetter(0))
+
+    empty: list[Callable] = []
+    for _key, code, value in events:
+        if code is None:
+            for cb in time_cbs:
+                cb(value)
+        else:
+            table = scalar_cbs if value.__class__ is str else vector_cbs
+            for cb in table.get(code, empty):
+                cb(code, value)
+        if stop is not None and stop():
+            return
+
+
+def read_trace(trace_path: Path, consumers: list[VcdConsumer]) -> VcdHeader:
+    # Same consumer protocol as read_vcd. Consumers overriding `on_signal`
+    # get whole columns (order-free work such as toggle coverage or probe
+    # hits); the others see the merged change stream of the signals they
+    # subscribed to.
+    trace = Trace(trace_path)
+    try:
+        header = trace.header
+        for c in consumers:
+            c.begin(header)
+        columnar = [c for c in consumers if type(c).on_signal is not VcdConsumer.on_signal]
+        for c in columnar:
+            codes = header.vars_by_code.keys() if c.codes is None else c.codes
+            for code in codes:
+                col = trace.columns.get(code)
+                if col is not None:
+                    c.on_signal(code, col)
+                if c.done():
+                    break
+        ordered = [c for c in consumers if type(c).on_signal is VcdConsumer.on_signal]
+        if ordered:
+            _replay(trace, ordered)
+        return header
+    finally:
+        trace.close()
+
+
+def read_dump(
+    path: Path,
+    make_consumers: Callable[[], list[VcdConsumer]],
+    *,
+    jobs: int = 1,
+    use_index: bool = False,
+) -> tuple[VcdHeader, list[VcdConsumer]]:
+    # One entry point for both formats. A binary trace is read in a single
+    # process; `jobs` and `use_index` only apply to text VCDs.
+    if is_trace(path):
+        consumers = make_consumers()
+        return read_trace(path, consumers), consumers
+    return read_vcd_chunked(path, make_consumers, jobs=jobs, use_index=use_index)
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description="Converte um VCD para o trace binário colunar.")
+    ap.add_argument("--vcd", default="tb_mips_top.vcd", help="VCD de entrada")
+    ap.add_argument("--out", default="", help="Trace de saída (padrão: <vcd>.vtrace)")
+    ap.add_argument(
+        "--compress",
+        choices=("none", "zlib", "zstd"),
+        default="zlib",
+        help="Compressão de cada coluna",
+    )
+    args = ap.parse_args(argv)
+
+    vcd_path = Path(args.vcd)
+    if not vcd_path.exists():
+        print(f"Arquivo VCD não encontrado: {vcd_path}", file=sys.stderr)
+        return 2
+    out_path = Path(args.out) if args.out else vcd_path.with_suffix(".vtrace")
+
+    codec = args.compress
+    if codec == "zstd" and zstandard is None:
+        print("Aviso: zstandard não disponível, usando zlib", file=sys.stderr)
+        codec = "zlib"
+
+    convert_vcd(vcd_path, out_path, codec=codec)
+    in_size = vcd_path.stat().st_size
+    out_size = out_path.stat().st_size
+    ratio = in_size / out_size if out_size else 0.0
+    print(f"{out_path}: {out_size} bytes ({ratio:.1f}x menor que o VCD)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,414 @@
+import re
+from dataclasses import dataclass, field
+
+# Tokenizer and statement parser for the synthesizable Verilog subset used in
+# rtl/ (plus the behavioural constructs of the testbenches). Comments and
+# whitespace are not tokens, but every token keeps its character offsets, so
+# tools can edit the original text by inserting at token boundaries.
+
+_DIRECTIVES = (
+    "define",
+    "undef",
+    "include",
+    "timescale",
+    "ifdef",
+    "ifndef",
+    "elsif",
+    "else",
+    "endif",
+    "default_nettype",
+    "resetall",
+    "celldefine",
+    "endcelldefine",
+)
+
+_TOKEN_RE = re.compile(
+    "|".join(
+        [
+            r"(?P<ws>\s+)",
+            r"(?P<comment>//[^\n]*|/\*.*?\*/)",
+            # Whole-line preprocessor directives (with \-continued defines).
+            r"(?P<directive>`(?:" + "|".join(_DIRECTIVES) + r")\b(?:\\\n|[^\n])*)",
+            r"(?P<macro>`[A-Za-z_][A-Za-z0-9_$]*)",
+            r'(?P<str>"(?:\\.|[^"\\\n])*")',
+            r"(?P<num>(?:\d[\d_]*\s*)?'[sS]?[bBoOdDhH]\s*[0-9a-fA-FxXzZ?_]+"
+            r"|\d[\d_]*(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?)",
+            r"(?P<sys>\$[A-Za-z_][A-Za-z0-9_$]*)",
+            r"(?P<id>[A-Za-z_][A-Za-z0-9_$]*|\\\S+)",
+            r"(?P<op><<<=|>>>=|<<<|>>>|===|!==|<<=|>>=|<=|>=|==|!=|&&|\|\||\*\*|<<|>>|->|~&|~\||~\^|\^~|\+:|-:|.)",
+        ]
+    ),
+    re.S,
+)
+
+_OPEN = {"(": ")", "[": "]", "{": "}"}
+_CLOSE = {")", "]", "}"}
+
+_DECL_KEYWORDS = frozenset(
+    ("reg", "wire", "integer", "real", "time", "realtime", "logic", "bit", "genvar", "event", "parameter", "localparam")
+)
+_PROCESS_KEYWORDS = frozenset(("always", "always_comb", "always_ff", "always_latch", "initial", "final"))
+
+
+class VerilogSyntaxError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str  # id | sys | num | str | macro | op
+    text: str
+    start: int
+    end: int
+    line: int
+
+
+def tokenize(text: str) -> list[Token]:
+    # One regex pass; line numbers are counted incrementally, so the cost
+    # stays linear in the file size.
+    tokens: list[Token] = []
+    line = 1
+    pos = 0
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        start = m.start()
+        line += text.count("\n", pos, start)
+        pos = start
+        if kind in ("ws", "comment", "directive"):
+            continue
+        tokens.append(Token(kind=kind or "op", text=m.group(), start=start, end=m.end(), line=line))
+    return tokens
+
+
+# --- statements ------------------------------------------------------------
+
+
+@dataclass
+class Stmt:
+    # Token index range [first, last] (inclusive) of the whole statement.
+    first: int
+    last: int
+
+
+@dataclass
+class NullStmt(Stmt):
+    pass
+
+
+@dataclass
+class SimpleStmt(Stmt):
+    # Assignments, task/system calls, disable, event triggers: up to ';'.
+    pass
+
+
+@dataclass
+class Block(Stmt):
+    # begin/end (or fork/join). `body_start` is the index of the first token
+    # after the label and the leading declarations, where statements begin.
+    stmts: list[Stmt] = field(default_factory=list)
+    label: str | None = None
+    body_start: int = 0
+    parallel: bool = False
+
+
+@dataclass
+class IfStmt(Stmt):
+    cond_last: int = 0  # index of the ')' closing the condition
+    then: Stmt | None = None
+    else_tok: int | None = None
+    else_: Stmt | None = None
+
+
+@dataclass
+class CaseItem:
+    first: int  # first label token (or 'default')
+    colon: int | None
+    stmt: Stmt
+
+
+@dataclass
+class CaseStmt(Stmt):
+    expr_last: int = 0
+    items: list[CaseItem] = field(default_factory=list)
+
+
+@dataclass
+class LoopStmt(Stmt):
+    # for/while/repeat/forever; `header_last` ends the loop header.
+    header_last: int = 0
+    body: Stmt | None = None
+
+
+@dataclass
+class TimedStmt(Stmt):
+    # @(...), #delay or wait(...) in front of a statement (or of ';').
+    control_last: int = 0
+    body: Stmt | None = None
+
+
+# --- module items ----------------------------------------------------------
+
+
+@dataclass
+class ContinuousAssign:
+    first: int
+    last: int
+    lhs: list[str]
+
+
+@dataclass
+class Process:
+    kind: str
+    first: int
+    stmt: Stmt
+
+
+@dataclass
+class Module:
+    name: str
+    first: int  # 'module'
+    header_last: int  # ';' ending the module header
+    last: int  # 'endmodule'
+    assigns: list[ContinuousAssign] = field(default_factory=list)
+    processes: list[Process] = field(default_factory=list)
+
+
+class _Parser:
+    def __init__(self, tokens: list[Token]) -> None:
+        self.toks = tokens
+        self.n = len(tokens)
+
+    def text(self, i: int) -> str:
+        return self.toks[i].text if i < self.n else ""
+
+    def error(self, i: int, msg: str) -> VerilogSyntaxError:
+        line = self.toks[min(i, self.n - 1)].line if self.n else 0
+        return VerilogSyntaxError(f"linha {line}: {msg}")
+
+    def match_group(self, i: int) -> int:
+        # `i` is an opening bracket; returns the index of its partner.
+        depth = 0
+        for j in range(i, self.n):
+            t = self.toks[j].text
+            if t in _OPEN:
+                depth += 1
+            elif t in _CLOSE:
+                depth -= 1
+                if depth == 0:
+                    return j
+        raise self.error(i, f"'{self.text(i)}' sem fechamento")
+
+    def skip_to_semicolon(self, i: int) -> int:
+        # Index of the ';' ending the construct that starts at `i`.
+        j = i
+        while j < self.n:
+            t = self.toks[j].text
+            if t in _OPEN:
+                j = self.match_group(j) + 1
+                continue
+            if t == ";":
+                return j
+            j += 1
+        raise self.error(i, "falta ';'")
+
+    def skip_to_keyword(self, i: int, end_kw: str) -> int:
+        j = i
+        while j < self.n and not (self.toks[j].kind == "id" and self.toks[j].text == end_kw):
+            j += 1
+        if j == self.n:
+            raise self.error(i, f"falta '{end_kw}'")
+        return j
+
+    # statements
+
+    def statement(self, i: int) -> Stmt:
+        tok = self.toks[i] if i < self.n else None
+        if tok is None:
+            raise self.error(i, "fim inesperado do arquivo")
+        t = tok.text
+        if t == ";":
+            return NullStmt(i, i)
+        if tok.kind == "id":
+            if t in ("begin", "fork"):
+                return self.block(i)
+            if t == "if":
+                return self.if_stmt(i)
+            if t in ("case", "casez", "casex"):
+                return self.case_stmt(i)
+            if t in ("for", "while", "repeat"):
+                header_last = self.match_group(i + 1)
+                body = self.statement(header_last + 1)
+                return LoopStmt(i, body.last, header_last=header_last, body=body)
+            if t == "forever":
+                body = self.statement(i + 1)
+                return LoopStmt(i, body.last, header_last=i, body=body)
+            if t == "wait":
+                return self.timed(i, self.match_group(i + 1))
+        if t == "@":
+            nxt = self.text(i + 1)
+            if nxt == "(":
+                return self.timed(i, self.match_group(i + 1))
+            return self.timed(i, i + 1)  # @* or @event
+        if t == "#":
+            nxt = self.text(i + 1)
+            if nxt == "(":
+                return self.timed(i, self.match_group(i + 1))
+            return self.timed(i, i + 1)
+        return SimpleStmt(i, self.skip_to_semicolon(i))
+
+    def timed(self, i: int, control_last: int) -> TimedStmt:
+        body = self.statement(control_last + 1)
+        return TimedStmt(i, body.last, control_last=control_last, body=body)
+
+    def block(self, i: int) -> Block:
+        parallel = self.toks[i].text == "fork"
+        ends = ("join", "join_any", "join_none") if parallel else ("end",)
+        j = i + 1
+        label = None
+        if self.text(j) == ":":
+            label = self.text(j + 1)
+            j += 2
+        while j < self.n and self.toks[j].kind == "id" and self.text(j) in _DECL_KEYWORDS:
+            j = self.skip_to_semicolon(j) + 1
+        body_start = j
+        stmts: list[Stmt] = []
+        while j < self.n and not (self.toks[j].kind == "id" and self.text(j) in ends):
+            s = self.statement(j)
+            stmts.append(s)
+            j = s.last + 1
+        if j >= self.n:
+            raise self.error(i, f"'{self.text(i)}' sem '{ends[0]}'")
+        last = j
+        if self.text(j + 1) == ":" and j + 2 < self.n:
+            last = j + 2  # end : label
+        return Block(i, last, stmts=stmts, label=label, body_start=body_start, parallel=parallel)
+
+    def if_stmt(self, i: int) -> IfStmt:
+        if self.text(i + 1) != "(":
+            raise self.error(i, "'if' sem '('")
+        cond_last = self.match_group(i + 1)
+        then = self.statement(cond_last + 1)
+        last = then.last
+        else_tok = None
+        else_ = None
+        if self.text(then.last + 1) == "else":
+            else_tok = then.last + 1
+            else_ = self.statement(else_tok + 1)
+            last = else_.last
+        return IfStmt(i, last, cond_last=cond_last, then=then, else_tok=else_tok, else_=else_)
+
+    def case_stmt(self, i: int) -> CaseStmt:
+        if self.text(i + 1) != "(":
+            raise self.error(i, "'case' sem '('")
+        expr_last = self.match_group(i + 1)
+        j = expr_last + 1
+        items: list[CaseItem] = []
+        while j < self.n and self.text(j) != "endcase":
+            first = j
+            colon: int | None
+            if self.text(j) == "default":
+                j += 1
+                colon = None
+                if self.text(j) == ":":
+                    colon = j
+                    j += 1
+            else:
+                while j < self.n and self.text(j) != ":":
+                    if self.text(j) in _OPEN:
+                        j = self.match_group(j)
+                    j += 1
+                colon = j
+                j += 1
+            stmt = self.statement(j)
+            items.append(CaseItem(first=first, colon=colon, stmt=stmt))
+            j = stmt.last + 1
+        if j >= self.n:
+            raise self.error(i, "'case' sem 'endcase'")
+        return CaseStmt(i, j, expr_last=expr_last, items=items)
+
+    # module items
+
+    def module(self, i: int) -> Module:
+        name = self.text(i + 1)
+        header_last = self.skip_to_semicolon(i + 1)
+        mod = Module(name=name, first=i, header_last=header_last, last=header_last)
+        j = header_last + 1
+        while j < self.n:
+            tok = self.toks[j]
+            t = tok.text
+            if tok.kind != "id":
+                j = self.skip_to_semicolon(j) + 1 if t != ";" else j + 1
+                continue
+            if t == "endmodule":
+                mod.last = j
+                return mod
+            if t == "assign":
+                last = self.skip_to_semicolon(j)
+                mod.assigns.append(ContinuousAssign(first=j, last=last, lhs=self.assign_lhs(j + 1, last)))
+                j = last + 1
+            elif t in _PROCESS_KEYWORDS:
+                stmt = self.statement(j + 1)
+                mod.processes.append(Process(kind=t, first=j, stmt=stmt))
+                j = stmt.last + 1
+            elif t in ("function", "task"):
+                j = self.skip_to_keyword(j, "end" + t) + 1
+            elif t in ("generate", "endgenerate", "begin", "end", "else"):
+                # Generate regions are walked through for the items inside.
+                j += 1
+                if self.text(j) == ":":
+                    j += 2
+            elif t in ("if", "for", "case") and self.text(j + 1) == "(":
+                j = self.match_group(j + 1) + 1
+            else:
+                j = self.skip_to_semicolon(j) + 1
+        raise self.error(i, f"módulo {name} sem 'endmodule'")
+
+    def assign_lhs(self, i: int, last: int) -> list[str]:
+        # Nets on the left of the first '=' (after an optional delay); the
+        # parameters and genvars of their bit and part selects are not.
+        j = i
+        if self.text(j) == "#":
+            j = self.match_group(j + 1) + 1 if self.text(j + 1) == "(" else j + 2
+        names: list[str] = []
+        while j < last and self.text(j) != "=":
+            tok = self.toks[j]
+            if tok.text == "[":
+                j = self.match_group(j)
+            elif tok.kind == "id" and tok.text not in names:
+                names.append(tok.text)
+            j += 1
+        return names
+
+
+def parse_modules(tokens: list[Token]) -> list[Module]:
+    p = _Parser(tokens)
+    modules: list[Module] = []
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok.kind == "id" and tok.text in ("module", "macromodule"):
+            mod = p.module(i)
+            modules.append(mod)
+            i = mod.last + 1
+        else:
+            i += 1
+    return modules
+
+
+def system_calls(tokens: list[Token], names: set[str]) -> list[tuple[int, int]]:
+    # Character spans of the `$name(...);` statements calling the given
+    # system tasks.
+    p = _Parser(tokens)
+    spans: list[tuple[int, int]] = []
+    for i, tok in enumerate(tokens):
+        if tok.kind == "sys" and tok.text in names:
+            spans.append((tok.start, tokens[p.skip_to_semicolon(i)].end))
+    return spans
+
+
+def string_argument(tokens: list[Token], name: str) -> str | None:
+    # First argument of the first `name("...")` call, when it is a literal.
+    for i, tok in enumerate(tokens[:-2]):
+        if tok.kind == "sys" and tok.text == name and tokens[i + 1].text == "(" and tokens[i + 2].kind == "str":
+            return tokens[i + 2].text[1:-1]
+    return None